@@ -1,7 +1,21 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask
 from config.base_config import Config as BaseConfig
 from .routes import bpm_bp
+from .cache import LRUCache
+from .pipeline import ProcessedSeries, load_series
+from .interpolation import InterpolationResult
+from .outliers import is_default_outliers, outlier_options
+from .prefetch import Prefetcher
+from .feature_store import HeartRateStore
+from .subject_index import SubjectIndex
+import os
+import time
 import pandas as pd
+from utils.analysis.dictionaries import resolve_itemids
+from utils.analysis.filtering import VITALS, vital_column
+from utils.analysis.filters.file_filter import get_file_filter
 
 def load_subject_ids(app):
     """Load subject IDs from CSV into memory."""
@@ -11,7 +25,9 @@ def load_subject_ids(app):
             df = pd.read_csv(csv_path)
             if 'subject_id' in df.columns:
                 app.config['SUBJECT_IDS'] = df['subject_id'].tolist()
+                app.config['SUBJECT_ID_SET'] = frozenset(app.config['SUBJECT_IDS'])
                 print(f"[BPM App] Loaded {len(app.config['SUBJECT_IDS'])} subject IDs.")
+                load_hr_subject_ids(app, df)
             else:
                 print("[BPM App] Error: 'subject_id' column not found in CSV.")
                 app.config['SUBJECT_IDS'] = []
@@ -22,6 +38,133 @@ def load_subject_ids(app):
         print(f"[BPM App] Error loading subject IDs: {e}")
         app.config['SUBJECT_IDS'] = []
 
+def set_hr_subject_ids(app, subject_ids):
+    """Subjects known to have heart rate data: a list for random draws and a set for lookups."""
+    app.config['HR_SUBJECT_IDS'] = list(subject_ids)
+    app.config['HR_SUBJECT_ID_SET'] = frozenset(app.config['HR_SUBJECT_IDS'])
+
+def load_hr_subject_ids(app, df):
+    """
+    Read heart rate availability from the lookup table's has_<vital> column, if indexed.
+
+    The column is only used when it was indexed for the itemids the app selects (VITALS
+    holds both, but heart rate itemids are resolved from d_items at startup); otherwise
+    subjects with readings under other itemids would be rejected without a read.
+    """
+    vital = app.config.get('AVAILABILITY_VITAL')
+    column = vital_column(vital)
+    if column not in df.columns:
+        return
+    indexed = set(VITALS[vital]['itemids'])
+    selected = set(app.config.get('VITAL_ITEMIDS', {}).get(vital) or [])
+    if selected != indexed:
+        print(f"[BPM App] {column} was indexed for itemids {sorted(indexed)}, but the app selects "
+              f"{sorted(selected) or 'valueuom == bpm'}. Not limiting subjects to it.")
+        return
+    set_hr_subject_ids(app, df.loc[df[column] == 1, 'subject_id'])
+    print(f"[BPM App] {len(app.config['HR_SUBJECT_IDS'])} subjects have heart rate data.")
+
+def load_heart_rate_itemids(app):
+    """Resolve the heart rate label to chartevents itemids via d_items, and the itemids of every vital."""
+    label = app.config.get('HEART_RATE_LABEL')
+    itemids = resolve_itemids(label) if label else []
+    app.config['HEART_RATE_ITEMIDS'] = itemids
+    if itemids:
+        print(f"[BPM App] Resolved '{label}' to itemids {itemids}.")
+    else:
+        print("[BPM App] Heart rate itemids unavailable. Falling back to valueuom == 'bpm'.")
+    # Heart rate follows the resolved selection (empty = the valueuom fallback)
+    vital_itemids = {vital: spec['itemids'] for vital, spec in app.config.get('VITAL_SERIES', {}).items()}
+    vital_itemids['heart_rate'] = itemids
+    app.config['VITAL_ITEMIDS'] = vital_itemids
+
+def init_series_cache(app):
+    """Create the server-side caches of processed subject series, interpolations and data tables.
+
+    Persisted series live in a subdirectory named after a hash of DATA_VERSION, so a
+    restart with other itemids, outlier settings or source data never reads series
+    cleaned under the old ones. Interpolations are keyed by a hash of their input series
+    and need no versioning.
+    """
+    series_dir = app.config.get('SERIES_CACHE_DIR')
+    if series_dir:
+        version_hash = hashlib.blake2b(app.config['DATA_VERSION'].encode(), digest_size=8).hexdigest()
+        series_dir = os.path.join(series_dir, version_hash)
+    app.config['SERIES_CACHE'] = LRUCache(
+        app.config.get('SERIES_CACHE_MAX_BYTES'),
+        disk_dir=series_dir,
+        value_type=ProcessedSeries
+    )
+    app.config['INTERP_CACHE'] = LRUCache(
+        app.config.get('INTERP_CACHE_MAX_BYTES'),
+        disk_dir=app.config.get('INTERP_CACHE_DIR'),
+        value_type=InterpolationResult
+    )
+    app.config['TABLE_CACHE'] = LRUCache(app.config.get('TABLE_CACHE_MAX_BYTES'))
+
+def init_batch_executor(app):
+    """Thread pool that processes subjects read together by batch requests."""
+    app.config['BATCH_EXECUTOR'] = ThreadPoolExecutor(
+        max_workers=app.config.get('BATCH_WORKERS'),
+        thread_name_prefix='bpm-batch'
+    )
+
+def load_hr_store(app):
+    """Open the precomputed heart rate store, if it has been built with the configured outlier cleaning."""
+    store = HeartRateStore.open(app.config.get('HR_STORE_DIR'), app.config.get('HEART_RATE_ITEMIDS'))
+    if store is not None and not is_default_outliers(app.config.get('OUTLIERS')):
+        print("[BPM App] OUTLIERS differs from the IQR cleaning the heart rate store was built with. Ignoring the store.")
+        store = None
+    app.config['HR_STORE'] = store
+    if store is not None:
+        print(f"[BPM App] Serving {len(store.subjects)} subjects from heart rate store.")
+        # The store lists exactly the subjects with heart rate data
+        if app.config.get('HR_SUBJECT_IDS') is None:
+            set_hr_subject_ids(app, store.subjects.index)
+
+def init_prefetcher(app):
+    """Background prefetcher of likely-next subjects, unless PREFETCH_WORKERS is 0."""
+    workers = app.config.get('PREFETCH_WORKERS')
+    if not workers:
+        app.config['PREFETCHER'] = None
+        return
+    hr_itemids = app.config.get('HEART_RATE_ITEMIDS')
+    outliers = app.config.get('OUTLIERS')
+    candidates = app.config.get('HR_SUBJECT_IDS')
+    # Prefetches decode through their own gzip handles, so a foreground load never waits
+    # behind a speculative read that a newer navigation has made pointless
+    prefetch_filter = get_file_filter("chartevents").with_own_handles(workers)
+    app.config['PREFETCHER'] = Prefetcher(
+        lambda subject_id: load_series(subject_id, hr_itemids=hr_itemids, outliers=outliers, file_filter=prefetch_filter),
+        max_workers=workers,
+        max_bytes=app.config.get('PREFETCH_MAX_BYTES'),
+        candidates=candidates if candidates is not None else app.config.get('SUBJECT_IDS', [])
+    )
+
+def init_data_version(app):
+    """Version of the data behind API responses, part of their ETags.
+
+    The heart rate store's build time when it is used, otherwise the chartevents file's
+    modification time and size; the itemids of every vital and the outlier settings are
+    included either way.
+    """
+    store = app.config.get('HR_STORE')
+    if store is not None:
+        source = store.version
+    else:
+        try:
+            stat = os.stat(get_file_filter("chartevents").file_path)
+            source = f"{stat.st_mtime_ns}-{stat.st_size}"
+        except Exception as e:
+            print(f"[BPM App] Could not stat chartevents ({e}). ETags will change on restart.")
+            source = f"started-{time.time()}"
+    vital_itemids = sorted((vital, list(itemids or [])) for vital, itemids in app.config.get('VITAL_ITEMIDS', {}).items())
+    app.config['DATA_VERSION'] = f"{source}:{vital_itemids}:{sorted(outlier_options(app.config.get('OUTLIERS')).items())}"
+
+def build_subject_index(app):
+    """Build the sorted subject ID index behind the typeahead search."""
+    app.config['SUBJECT_INDEX'] = SubjectIndex(app.config.get('SUBJECT_IDS', []), app.config.get('HR_SUBJECT_IDS'))
+
 def create_bpm_app():
     """Create and configure the BPM Flask application.
     
@@ -39,6 +182,13 @@ def create_bpm_app():
     
     # Load data
     with app.app_context():
+        load_heart_rate_itemids(app)
         load_subject_ids(app)
+        init_batch_executor(app)
+        load_hr_store(app)
+        init_data_version(app)
+        init_series_cache(app)
+        init_prefetcher(app)
+        build_subject_index(app)
     
     return app
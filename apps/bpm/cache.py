@@ -0,0 +1,88 @@
+"""Server-side caches for the BPM Flask Application."""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by the total size of its values.
+
+    Values must expose an `nbytes` attribute. If `disk_dir` is set, values are also
+    written there with `value.save(path)` and read back with `value_type.load(path)`
+    on a memory miss, so they survive restarts and can be shared between processes.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, value_type=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.value_type = value_type
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return os.path.join(self.disk_dir, '_'.join(str(p) for p in parts) + '.npz')
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        if self.disk_dir and self.value_type is not None:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    value = self.value_type.load(path)
+                except Exception as e:
+                    print(f"[BPM Cache] Failed to read {path}: {e}")
+                    return None
+                self._store(key, value)
+                return value
+        return None
+
+    def put(self, key, value, persist=True):
+        """Insert `value`, evicting least recently used entries beyond `max_bytes`.
+
+        With `persist=False` the value is kept in memory only, even if `disk_dir` is set.
+        """
+        self._store(key, value)
+        if self.disk_dir and persist:
+            path = self._disk_path(key)
+            tmp_path = path + '.tmp.npz'
+            try:
+                value.save(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"[BPM Cache] Failed to write {path}: {e}")
+
+    def _store(self, key, value):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = value
+            self.nbytes += value.nbytes
+            # Always keep the newest entry, even if it alone exceeds the budget
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,52 @@
+"""Plotly chart specs for the BPM Flask Application.
+
+Figures are built as plain Plotly JSON dicts holding NumPy arrays instead of
+`go.Figure` objects, which skips plotly's property validation, and API responses
+are encoded once with orjson, which serializes the arrays natively. The encoded
+response is JSON-equivalent to what `go.Figure` + `PlotlyJSONEncoder` + `jsonify`
+produced (sorted keys, compact separators, NaN as null): it parses to the same values,
+but floats may be spelled differently (orjson writes 1e-05 as 0.00001 and 1e+16 as 1e16,
+for example), so the bytes are not identical.
+"""
+
+import json
+from functools import lru_cache
+
+import plotly.io as pio
+import plotly.utils
+from flask import current_app
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+@lru_cache(maxsize=1)
+def default_template():
+    """The default Plotly template, which go.Figure embeds in every layout."""
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def scatter(**props):
+    """Scatter trace spec; props use Plotly's nested JSON form (e.g. line=dict(color=...))."""
+    return dict(props, type='scatter')
+
+
+def figure(traces, layout):
+    """Figure spec with the default template applied, as go.Figure serializes it."""
+    return {'data': traces, 'layout': dict(layout, template=default_template())}
+
+
+def dumps(payload):
+    """Encode a response payload as JSON bytes (sorted keys, compact, NaN as null)."""
+    if HAS_ORJSON:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, cls=plotly.utils.PlotlyJSONEncoder, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Flask JSON response for a payload that may contain chart specs and NumPy arrays."""
+    # jsonify ends its body with a newline
+    return current_app.response_class(dumps(payload) + b'\n', status=status, mimetype=current_app.json.mimetype)
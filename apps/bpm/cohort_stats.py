@@ -0,0 +1,149 @@
+"""Cohort-wide vital sign statistics for the BPM Flask Application.
+
+Computes the statistics block /api/load-data shows for one subject (count, mean,
+median, min, max and std of the IQR-cleaned, duplicate-averaged series) for every
+subject of a cohort, plus optional extras:
+
+    time_in_range   hours covered and the fraction of time below, inside and above a range
+    variability     coefficient of variation, RMSSD of successive readings and IQR
+    percentiles     p<q> for each requested percentile
+
+Subjects are processed in byte-offset shards (see feature_store.plan_shards). The result
+is one Parquet table with a row per subject (subjects without data have count 0).
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils.analysis.filters.file_filter import get_file_filter
+from .feature_store import STAT_COLUMNS, plan_shards
+from .pipeline import ProcessedSeries, process_vitals
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.getcwd(), 'data', 'apps', 'bpm', 'stats')
+EXTRAS = ('time_in_range', 'variability', 'percentiles')
+DEFAULT_PERCENTILES = (5, 25, 75, 95)
+# Normal adult resting heart rate, in BPM
+DEFAULT_RANGE = (60, 100)
+# Readings further apart than this don't count towards time-based statistics
+MAX_GAP_MINUTES = 60
+# Shards per worker process, so shards of slow subjects don't leave workers idle
+SHARDS_PER_WORKER = 8
+
+
+def stat_columns(extras=EXTRAS, percentiles=DEFAULT_PERCENTILES):
+    """Columns of the statistics table for the selected extras."""
+    columns = ['subject_id'] + STAT_COLUMNS
+    if 'time_in_range' in extras:
+        columns += ['hours', 'time_below', 'time_in_range', 'time_above']
+    if 'variability' in extras:
+        columns += ['cv', 'rmssd', 'iqr']
+    if 'percentiles' in extras:
+        columns += [f"p{q:g}" for q in percentiles]
+    return columns
+
+
+def series_statistics(series, extras=EXTRAS, percentiles=DEFAULT_PERCENTILES, value_range=DEFAULT_RANGE, max_gap_minutes=MAX_GAP_MINUTES):
+    """
+    Statistics of one ProcessedSeries: the app's summary plus the selected extras.
+
+    Time in range weights each reading by the time until the next one (capped at
+    `max_gap_minutes`), so dense stretches of monitoring don't dominate.
+    """
+    row = {'subject_id': series.subject_id, **series.stats()}
+    values = np.asarray(series.values, dtype=np.float64)
+
+    if 'time_in_range' in extras:
+        gaps = np.diff(series.times) / np.timedelta64(1, 'h')
+        gaps = np.minimum(gaps, max_gap_minutes / 60.0)
+        hours = gaps.sum()
+        low, high = value_range
+        start_values = values[:-1]
+        row['hours'] = round(hours, 2)
+        if hours > 0:
+            row['time_below'] = round(gaps[start_values < low].sum() / hours, 4)
+            row['time_in_range'] = round(gaps[(start_values >= low) & (start_values <= high)].sum() / hours, 4)
+            row['time_above'] = round(gaps[start_values > high].sum() / hours, 4)
+
+    if 'variability' in extras:
+        mean = values.mean()
+        row['cv'] = round(values.std(ddof=1) / mean, 4) if len(values) > 1 and mean else np.nan
+        row['rmssd'] = round(np.sqrt(np.mean(np.diff(values) ** 2)), 2) if len(values) > 1 else np.nan
+        q1, q3 = np.percentile(values, [25, 75])
+        row['iqr'] = round(q3 - q1, 1)
+
+    if 'percentiles' in extras:
+        for q, value in zip(percentiles, np.percentile(values, percentiles)):
+            row[f"p{q:g}"] = round(value, 1)
+    return row
+
+
+def _stats_shard(subject_ids, vital, itemids, outliers, options):
+    """Worker: statistics rows for a contiguous run of subjects."""
+    ff = get_file_filter("chartevents")
+    rows = []
+    for subject_id, df in ff.search_subjects(subject_ids):
+        series = process_vitals(subject_id, df, {vital: itemids}, outliers)[vital]
+        if isinstance(series, ProcessedSeries):
+            rows.append(series_statistics(series, **options))
+    return rows
+
+
+def compute_cohort_statistics(subject_ids=None, output_path=None, vital='heart_rate', itemids=None, extras=EXTRAS,
+                              percentiles=DEFAULT_PERCENTILES, value_range=DEFAULT_RANGE, max_gap_minutes=MAX_GAP_MINUTES,
+                              outliers=None, workers=None, logger=None):
+    """
+    Compute per-subject statistics of a vital for a cohort and write them to Parquet.
+
+    Args:
+        subject_ids (list): Subjects to include (default: every subject in the lookup table).
+        output_path (str): Parquet file (default: data/apps/bpm/stats/<vital>_stats.parquet).
+        vital (str): Vital to summarize.
+        itemids (list): The vital's itemids (heart rate falls back to valueuom == 'bpm' if empty).
+        extras (list): Any of EXTRAS.
+        percentiles (list): Percentiles for the 'percentiles' extra.
+        value_range (tuple): (low, high) bounds for the 'time_in_range' extra.
+        max_gap_minutes (float): Longest interval between readings counted as covered time.
+        outliers (dict): Outlier detection settings (see outliers.py; default IQR).
+        workers (int): Number of worker processes (default: CPU count).
+        logger: Optional LoggerWrapper instance.
+
+    Returns:
+        str: Path of the Parquet file.
+    """
+    log = logger.info if logger else print
+    unknown = [e for e in extras if e not in EXTRAS]
+    if unknown:
+        raise ValueError(f"Unknown statistics {', '.join(unknown)}. Choose from {', '.join(EXTRAS)}.")
+    workers = workers or os.cpu_count() or 1
+    output_path = output_path or os.path.join(DEFAULT_OUTPUT_DIR, f"{vital}_stats.parquet")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    ff = get_file_filter("chartevents")
+    subject_ids = ff.lookup_df.index if subject_ids is None else subject_ids
+    ranges = ff.get_byte_ranges(subject_ids)
+    shards = plan_shards(ranges, min(len(ranges), workers * SHARDS_PER_WORKER)) if len(ranges) else []
+    log(f"Computing {vital} statistics for {len(ranges)} subjects in {len(shards)} shards with {workers} workers")
+
+    options = {'extras': extras, 'percentiles': percentiles, 'value_range': value_range, 'max_gap_minutes': max_gap_minutes}
+    rows = []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_stats_shard, shard, vital, itemids, outliers, options) for shard in shards]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows.extend(future.result())
+            log(f"Statistics for {len(rows)} subjects with {vital} data [{done}/{len(futures)} shards]")
+
+    # Every requested subject gets a row; those without data keep count 0
+    columns = stat_columns(extras, percentiles)
+    table = pd.DataFrame(rows, columns=columns).set_index('subject_id')
+    table = table.reindex(pd.Index(pd.unique(pd.Series(list(subject_ids), dtype='int64')), name='subject_id'))
+    table['count'] = table['count'].fillna(0).astype('int64')
+    table.sort_index().reset_index().to_parquet(output_path, index=False)
+
+    with_data = int((table['count'] > 0).sum())
+    log(f"Statistics written to {output_path}: {with_data}/{len(table)} subjects with {vital} data in {time.time() - start_time:.2f}s")
+    return output_path
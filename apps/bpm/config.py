@@ -2,6 +2,17 @@
 
 import os
 from config.base_config import Config as BaseConfig
+from utils.analysis.filtering import VITALS
+
+# Theme of the app's charts, shared by the web plot (routes.py) and exported figures (export.py)
+BG_COLOR = '#111827'
+TEXT_PRIMARY = '#F9FAFB'
+TEXT_SECONDARY = '#9CA3AF'
+GRID_COLOR = '#374151'
+SPINE_COLOR = '#D1D5DB'
+PRIMARY_COLOR = '#2563EB'
+ACCENT_COLOR = '#10B981'
+BIN_COLOR = '#8B5CF6'
 
 class Config(BaseConfig):
     """BPM app specific configuration.
@@ -15,3 +26,83 @@ class Config(BaseConfig):
     # ==================== Data Paths ====================
     # Path to the unique subject IDs CSV
     SUBJECT_IDS_FILE = os.path.join(os.getcwd(), 'data', 'icu_unique_subject_ids.csv')
+
+    # ==================== Heart Rate Selection ====================
+    # d_items label resolved to itemids at startup; falls back to valueuom == 'bpm'
+    # if the dictionary table is unavailable
+    HEART_RATE_LABEL = 'Heart Rate'
+    # Vital whose has_<vital> lookup column (written by --optimize-index chartevents)
+    # limits random selection to subjects that have heart rate data
+    AVAILABILITY_VITAL = 'heart_rate'
+
+    # ==================== Vitals ====================
+    # Series the app can show. A subject's decoded chartevents range is split into all
+    # of them in one pass and each is cleaned like heart rate; heart rate itemids come
+    # from HEART_RATE_LABEL when d_items is available. Itemids come from VITALS in
+    # utils/analysis/filtering.py, which indexing records has_<vital> columns for.
+    # `range` is the normal adult range used for time-in-range by --cohort-stats
+    VITAL_SERIES = {
+        'heart_rate': {'label': 'Heart Rate', 'unit': 'BPM', 'itemids': VITALS['heart_rate']['itemids'], 'range': (60, 100)},
+        'respiratory_rate': {'label': 'Respiratory Rate', 'unit': 'insp/min', 'itemids': VITALS['respiratory_rate']['itemids'], 'range': (12, 20)},
+        'spo2': {'label': 'SpO2', 'unit': '%', 'itemids': VITALS['spo2']['itemids'], 'range': (95, 100)},
+        'temperature': {'label': 'Temperature', 'unit': '°F', 'itemids': VITALS['temperature']['itemids'], 'range': (97.0, 99.5)},
+        'nbp_systolic': {'label': 'Non-Invasive BP (Systolic)', 'unit': 'mmHg', 'itemids': VITALS['nbp_systolic']['itemids'], 'range': (90, 120)},
+        'nbp_diastolic': {'label': 'Non-Invasive BP (Diastolic)', 'unit': 'mmHg', 'itemids': VITALS['nbp_diastolic']['itemids'], 'range': (60, 80)},
+        'abp_systolic': {'label': 'Arterial BP (Systolic)', 'unit': 'mmHg', 'itemids': VITALS['abp_systolic']['itemids'], 'range': (90, 120)},
+        'abp_diastolic': {'label': 'Arterial BP (Diastolic)', 'unit': 'mmHg', 'itemids': VITALS['abp_diastolic']['itemids'], 'range': (60, 80)},
+    }
+
+    # ==================== Outlier Detection ====================
+    # Readings removed before duplicates are averaged: 'iqr' (1.5 * IQR of the stay),
+    # 'mad' (3.5 scaled MADs from the median) or 'rolling_mad' (3.5 scaled MADs within a
+    # trailing window). Optional keys: threshold, window_minutes, min_points. The heart
+    # rate store is only used with the default IQR cleaning it was built with
+    OUTLIERS = {'method': 'iqr'}
+
+    # ==================== Series Cache ====================
+    # Processed per-subject series kept server-side so re-interpolation doesn't
+    # need the client to post data back
+    SERIES_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Optional on-disk cache directory (e.g. os.path.join(os.getcwd(), 'data', 'apps', 'bpm', 'cache')),
+    # with one subdirectory per data version
+    SERIES_CACHE_DIR = os.environ.get('BPM_SERIES_CACHE_DIR')
+    # Data tables (per subject and interpolation setting) served a page at a time
+    TABLE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # Memoized interpolation results (per series, method, bins and grid size); with a
+    # directory set they are also shared between server workers and restarts
+    INTERP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    INTERP_CACHE_DIR = os.environ.get('BPM_INTERP_CACHE_DIR')
+
+    # ==================== Prefetch ====================
+    # After each load, the neighbouring subject IDs and the next random subject are
+    # decoded in the background (0 workers disables prefetching)
+    PREFETCH_WORKERS = 2
+    PREFETCH_MAX_BYTES = 64 * 1024 * 1024
+
+    # ==================== Feature Store ====================
+    # Precomputed heart rate series built with `python main.py --build-hr-store`
+    HR_STORE_DIR = os.path.join(os.getcwd(), 'data', 'apps', 'bpm', 'hr_store')
+
+    # ==================== Plot Downsampling ====================
+    # Traces are reduced with LTTB to a point budget derived from the chart width the
+    # client reports; the interpolation grid is capped to the same budget
+    PLOT_POINTS_PER_PIXEL = 2
+    PLOT_MIN_POINTS = 200
+    PLOT_MAX_POINTS = 4000
+    # /api/load-data/stream: points in the first-paint overview, and readings per
+    # full-resolution segment that follows it
+    STREAM_OVERVIEW_POINTS = 300
+    STREAM_SEGMENT_POINTS = 5000
+
+    # ==================== Subject Comparison ====================
+    # Maximum subjects per /api/compare request, and threads cleaning their series while
+    # chartevents is read (this overlaps I/O with cleaning, not cleaning with cleaning)
+    COMPARE_MAX_SUBJECTS = 50
+    BATCH_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+    # ==================== HTTP Caching & Compression ====================
+    # Responses at least this large are gzip or brotli compressed if the client accepts it
+    COMPRESS_MIN_BYTES = 1024
+    COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/javascript', 'application/javascript')
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5
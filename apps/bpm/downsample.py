@@ -0,0 +1,104 @@
+"""Plot downsampling for the BPM Flask Application.
+
+Long ICU stays have tens of thousands of readings, far more than a chart has pixels.
+Traces are reduced to a point budget derived from the chart width with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the visual shape of the series
+(peaks, troughs, gaps) instead of simply decimating it. Series compared side by side
+are instead averaged onto one shared time grid sized to the same budget.
+"""
+
+import numpy as np
+
+
+def point_budget(width, points_per_pixel, min_points, max_points):
+    """Number of points worth drawing in a chart `width` pixels wide."""
+    try:
+        width = float(width)
+    except (TypeError, ValueError):
+        return max_points
+    return int(min(max_points, max(min_points, width * points_per_pixel)))
+
+
+def lttb(x, y, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. The interior is split into n_out - 2
+    buckets, and from each the point forming the largest triangle with the previously
+    kept point and the average of the next bucket is kept.
+    `x` must be sorted.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 non-empty buckets over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Each bucket looks ahead to the next bucket's average; the last looks at the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def visible_indices(x, y, max_points=None, x_range=None):
+    """
+    Indices of the points to draw for a trace.
+
+    Restricts sorted `x` to `x_range` (plus one neighbour on each side, so lines run to
+    the chart edges), then downsamples with LTTB if more than `max_points` remain.
+    """
+    x = np.asarray(x)
+    lo, hi = 0, len(x)
+    if x_range is not None:
+        lo = max(0, int(np.searchsorted(x, x_range[0], side='left')) - 1)
+        hi = min(len(x), int(np.searchsorted(x, x_range[1], side='right')) + 1)
+    idx = np.arange(lo, hi)
+    if max_points and len(idx) > max_points:
+        idx = idx[lttb(x[lo:hi], np.asarray(y)[lo:hi], max_points)]
+    return idx
+
+
+def align_to_grid(hours, values, max_points):
+    """
+    Resample several series onto one shared time grid.
+
+    `hours` and `values` are lists of per-series arrays (hours from each series' own
+    start). The grid step is a whole number of minutes chosen so that the longest
+    series fits in `max_points` buckets; each bucket holds the mean of the readings
+    falling in it, or NaN if there are none.
+
+    Returns:
+        tuple: (grid_hours, aligned, bin_minutes), where `aligned` has one row per series.
+    """
+    longest = max((h[-1] for h in hours if len(h)), default=0.0)
+    bin_minutes = max(1, int(np.ceil(longest * 60.0 / max_points)))
+    n_buckets = int(longest * 60.0 // bin_minutes) + 1
+
+    aligned = np.full((len(hours), n_buckets), np.nan)
+    for row, (h, v) in enumerate(zip(hours, values)):
+        if len(h) == 0:
+            continue
+        buckets = (np.asarray(h) * 60.0 // bin_minutes).astype(np.int64)
+        counts = np.bincount(buckets, minlength=n_buckets)
+        sums = np.bincount(buckets, weights=v, minlength=n_buckets)
+        with np.errstate(invalid='ignore'):
+            aligned[row] = sums / counts
+    grid_hours = np.arange(n_buckets) * bin_minutes / 60.0
+    return grid_hours, aligned, bin_minutes
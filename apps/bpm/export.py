@@ -0,0 +1,236 @@
+"""Batch graph export for the BPM Flask Application.
+
+Renders the BPM plot of every subject in a cohort, for one or more interpolation
+methods, server-side with matplotlib instead of saving browser screenshots one at a time
+(/api/save-graph). Series go through the same pipeline as /api/load-data (the heart rate
+store when it has the subject, otherwise chartevents with IQR cleaning and duplicate
+averaging), followed by the same interpolation and LTTB downsampling:
+
+    <output_dir>/
+        <method>_<subject_id>.png|svg     # one figure per subject and method
+        _progress.json                    # subjects without data for the vital
+
+Subjects are processed in byte-offset shards (see feature_store.plan_shards). Figures are
+written atomically and existing ones are skipped, so an interrupted export resumes where
+it stopped.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from utils.analysis.filters.file_filter import get_file_filter
+from .config import ACCENT_COLOR, BG_COLOR, BIN_COLOR, GRID_COLOR, PRIMARY_COLOR, SPINE_COLOR, TEXT_PRIMARY, TEXT_SECONDARY
+from .downsample import visible_indices
+from .feature_store import HeartRateStore
+from .interpolation import METHODS, apply_interpolation
+from .outliers import is_default_outliers
+from .pipeline import ProcessedSeries, process_vitals
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.getcwd(), 'data', 'apps', 'bpm', 'export')
+PROGRESS_FILE = "_progress.json"
+FORMATS = ('png', 'svg')
+# Figure size in inches and resolution of PNG output
+FIGURE_SIZE = (12, 5)
+DPI = 120
+# Maximum subjects per worker task
+SHARD_SUBJECTS = 25
+
+
+def graph_path(output_dir, subject_id, method, fmt):
+    """Path of one exported figure, named like /api/save-graph names saved graphs."""
+    return os.path.join(output_dir, f"{method}_{subject_id}.{fmt}")
+
+
+def render_graph(series, method, path, fmt='png', bin_size=0, bin_unit='points', max_points=4000, vital_label='Heart Rate', unit='BPM'):
+    """
+    Plot a ProcessedSeries (and its interpolation, unless `method` is 'none') to `path`.
+
+    Returns:
+        bool: False if the interpolation failed and nothing was written.
+    """
+    hours = (series.times - series.times[0]) / np.timedelta64(1, 'h')
+    interpolated = None
+    if method != 'none':
+        y_new, t_new, y_binned, t_binned = apply_interpolation(
+            series.values, series.times, method, bin_size=bin_size, bin_unit=bin_unit, grid_points=max_points
+        )
+        if y_new is None:
+            return False
+        start = series.times[0]
+        interpolated = (
+            (t_new - start) / np.timedelta64(1, 'h'), y_new,
+            (t_binned - start) / np.timedelta64(1, 'h'), y_binned
+        )
+
+    fig = Figure(figsize=FIGURE_SIZE, facecolor=BG_COLOR)
+    ax = fig.add_subplot()
+    ax.set_facecolor(BG_COLOR)
+
+    idx = visible_indices(hours, series.values, max_points)
+    if interpolated is None:
+        ax.plot(hours[idx], series.values[idx], color=PRIMARY_COLOR, linewidth=1.5, marker='o', markersize=3, label='Original Data')
+    else:
+        ax.plot(hours[idx], series.values[idx], linestyle='none', color=PRIMARY_COLOR, marker='o', markersize=3, label='Original Data')
+        interp_hours, interp_values, binned_hours, binned_values = interpolated
+        if bin_size > 0:
+            bin_label = f"{bin_size} min" if bin_unit == 'minutes' else f"n={bin_size}"
+            b_idx = visible_indices(binned_hours, binned_values, max_points)
+            ax.plot(binned_hours[b_idx], binned_values[b_idx], linestyle='none', color=BIN_COLOR, marker='D', markersize=4, label=f'Bin Average ({bin_label})')
+        i_idx = visible_indices(interp_hours, interp_values, max_points)
+        ax.plot(interp_hours[i_idx], interp_values[i_idx], color=ACCENT_COLOR, linewidth=2, label=f"Interpolated ({method})")
+
+    title = f"{vital_label} Over Time (Subject {series.subject_id})"
+    if bin_size > 0 and method != 'none':
+        title += f" - Bin Size: {bin_size} min" if bin_unit == 'minutes' else f" - Bin Size: {bin_size}"
+    ax.set_title(title, color=TEXT_PRIMARY, fontsize=14, fontweight='bold')
+    ax.set_xlabel("Time (Hours from Start)", color=TEXT_PRIMARY)
+    ax.set_ylabel(unit, color=TEXT_PRIMARY)
+    ax.tick_params(colors=TEXT_SECONDARY, labelsize=9)
+    ax.grid(color=GRID_COLOR, linewidth=0.5)
+    for spine in ax.spines.values():
+        spine.set_color(SPINE_COLOR)
+        spine.set_linewidth(0.8)
+    legend = ax.legend(loc='upper right', facecolor=BG_COLOR, edgecolor=GRID_COLOR, framealpha=0.7)
+    for text in legend.get_texts():
+        text.set_color(TEXT_PRIMARY)
+    fig.tight_layout()
+
+    # Written under a temporary name first: a figure that exists is complete
+    tmp_path = f"{path}.tmp.{fmt}"
+    fig.savefig(tmp_path, format=fmt, dpi=DPI, facecolor=BG_COLOR)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _export_shard(jobs, output_dir, fmt, vital, itemids, outliers, options, store_dir):
+    """
+    Worker: load the series of a run of subjects and render their pending figures.
+
+    Args:
+        jobs (dict): subject_id -> methods still to render.
+
+    Returns:
+        tuple: (figures written, subject_ids without data, [(subject_id, method, error)])
+    """
+    store = HeartRateStore.open(store_dir, itemids) if store_dir else None
+    series_by_subject = {}
+    for subject_id in jobs:
+        series = store.get(subject_id) if store is not None else None
+        if series is not None:
+            series_by_subject[subject_id] = series
+
+    remaining = [sid for sid in jobs if sid not in series_by_subject]
+    if remaining:
+        ff = get_file_filter("chartevents")
+        for subject_id, df in ff.search_subjects(remaining):
+            series_by_subject[subject_id] = process_vitals(subject_id, df, {vital: itemids}, outliers)[vital]
+
+    written, no_data, failed = 0, [], []
+    for subject_id, methods in jobs.items():
+        series = series_by_subject.get(subject_id)
+        if not isinstance(series, ProcessedSeries):
+            no_data.append(subject_id)
+            continue
+        for method in methods:
+            try:
+                if render_graph(series, method, graph_path(output_dir, subject_id, method, fmt), fmt=fmt, **options):
+                    written += 1
+                else:
+                    failed.append((subject_id, method, 'interpolation failed'))
+            except Exception as e:
+                failed.append((subject_id, method, str(e)))
+    return written, no_data, failed
+
+
+def export_graphs(subject_ids, methods, output_dir=None, fmt='png', vital='heart_rate', itemids=None, bin_size=0, bin_unit='points',
+                  max_points=4000, vital_label='Heart Rate', unit='BPM', outliers=None, store_dir=None, workers=None, logger=None):
+    """
+    Render BPM graphs for a cohort of subjects and interpolation methods.
+
+    Args:
+        subject_ids (list): Subjects to export.
+        methods (list): Interpolation methods ('none' plots the cleaned series only).
+        output_dir (str): Output directory (default: data/apps/bpm/export/<vital>).
+        fmt (str): 'png' or 'svg'.
+        vital (str): Vital to plot.
+        itemids (list): The vital's itemids (heart rate falls back to valueuom == 'bpm' if empty).
+        bin_size (int): Bin size passed to the interpolation.
+        bin_unit (str): 'points' or 'minutes'.
+        max_points (int): Points per trace after LTTB, and interpolation grid size.
+        vital_label (str): Chart title label.
+        unit (str): Y axis label.
+        outliers (dict): Outlier detection settings (see outliers.py; default IQR).
+        store_dir (str): Heart rate store to read heart rate series from, if built.
+        workers (int): Number of worker processes (default: CPU count - 1).
+        logger: Optional LoggerWrapper instance.
+
+    Returns:
+        dict: Counts of figures written, skipped and failed, and subjects without data.
+    """
+    log = logger.info if logger else print
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}. Choose one of {', '.join(FORMATS)}.")
+    unknown = [m for m in methods if m not in METHODS]
+    if unknown:
+        raise ValueError(f"Unknown interpolation method(s) {', '.join(unknown)}. Choose from {', '.join(METHODS)}.")
+    # Checked once here, so workers don't each report a store built for another selection
+    if vital != 'heart_rate' or not is_default_outliers(outliers) or HeartRateStore.open(store_dir, itemids) is None:
+        store_dir = None
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    output_dir = output_dir or os.path.join(DEFAULT_OUTPUT_DIR, vital)
+    os.makedirs(output_dir, exist_ok=True)
+
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    no_data = set()
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            no_data = set(json.load(f).get('no_data', []))
+
+    # Resume: only figures that don't exist yet are rendered
+    jobs = {}
+    skipped = 0
+    for subject_id in dict.fromkeys(subject_ids):
+        if subject_id in no_data:
+            continue
+        pending = [m for m in methods if not os.path.exists(graph_path(output_dir, subject_id, m, fmt))]
+        skipped += len(methods) - len(pending)
+        if pending:
+            jobs[subject_id] = pending
+
+    ff = get_file_filter("chartevents")
+    ranges = ff.get_byte_ranges(jobs.keys())
+    no_data.update(sid for sid in jobs if sid not in set(ranges['subject_id']))
+    ordered = ranges['subject_id'].tolist()
+    # Small cohorts still get a few shards per worker
+    shard_size = max(1, min(SHARD_SUBJECTS, -(-len(ordered) // (workers * 4))))
+    shards = [ordered[i:i + shard_size] for i in range(0, len(ordered), shard_size)]
+    log(f"Exporting {sum(len(jobs[s]) for s in ordered)} {fmt.upper()} graphs for {len(ordered)} subjects to {output_dir} "
+        f"({skipped} already exported, {len(shards)} shards, {workers} workers)")
+
+    options = {'bin_size': bin_size, 'bin_unit': bin_unit, 'max_points': max_points, 'vital_label': vital_label, 'unit': unit}
+    written, failed = 0, []
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_export_shard, {sid: jobs[sid] for sid in shard}, output_dir, fmt, vital, itemids, outliers, options, store_dir)
+            for shard in shards
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            shard_written, shard_no_data, shard_failed = future.result()
+            written += shard_written
+            failed.extend(shard_failed)
+            no_data.update(shard_no_data)
+            with open(progress_path, 'w') as f:
+                json.dump({'no_data': sorted(int(s) for s in no_data)}, f)
+            log(f"Exported {written} graphs [{done}/{len(futures)} shards]")
+
+    for subject_id, method, error in failed:
+        log(f"Failed to export {method} graph for subject {subject_id}: {error}")
+    log(f"Graph export finished in {time.time() - start_time:.2f}s: {written} written, {skipped} skipped, "
+        f"{len(failed)} failed, {len(no_data)} subjects without {vital_label.lower()} data")
+    return {'written': written, 'skipped': skipped, 'failed': len(failed), 'no_data': len(no_data)}
@@ -0,0 +1,231 @@
+"""Precomputed heart rate feature store for the BPM Flask Application.
+
+An offline job runs the BPM pipeline once for every subject in the lookup table and
+writes the cleaned series, outlier points and summary statistics to a columnar store:
+
+    <store_dir>/
+        times.npy, values.npy, averaged.npy           # cleaned series, all subjects concatenated
+        outlier_times.npy, outlier_values.npy         # removed outliers, concatenated
+        subjects.csv                                  # per-subject slice bounds + statistics
+        manifest.json                                 # build time and heart rate selection
+
+The app memory-maps the arrays, so serving a subject is a slice instead of a gzip decode.
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils.analysis.filters.file_filter import get_file_filter
+from .pipeline import ProcessedSeries, SeriesNotFound, process_subject
+
+ARRAYS = {
+    'times': 'datetime64[ns]',
+    'values': np.float64,
+    'averaged': np.bool_,
+    'outlier_times': 'datetime64[ns]',
+    'outlier_values': np.float64,
+}
+# Layout of the arrays; stores written with another layout are ignored until rebuilt
+# (format 1 stored values as float32, which doesn't round-trip the pipeline's float64)
+STORE_FORMAT = 2
+STAT_COLUMNS = ['count', 'mean', 'median', 'min', 'max', 'std']
+# Fixed shard count, so a resumed build keeps its plan even if --workers changes
+SHARD_COUNT = 256
+
+
+def _selection(hr_itemids):
+    """Description of how heart rate rows were selected, stored in the manifest."""
+    return {'itemids': sorted(int(i) for i in hr_itemids)} if hr_itemids else {'valueuom': 'bpm'}
+
+
+def _build_shard(shard_no, subject_ids, hr_itemids, shard_dir):
+    """Worker: process a contiguous run of subjects and save them as one shard file."""
+    ff = get_file_filter("chartevents")
+    parts = {name: [] for name in ARRAYS}
+    rows = []
+
+    for subject_id, df in ff.search_subjects(subject_ids):
+        try:
+            series = process_subject(subject_id, df, hr_itemids)
+        except SeriesNotFound:
+            continue
+        rows.append({
+            'subject_id': subject_id,
+            'length': len(series.values),
+            'outlier_length': len(series.outlier_values),
+            **series.stats()
+        })
+        for name in ARRAYS:
+            parts[name].append(getattr(series, name))
+
+    arrays = {
+        name: np.concatenate(parts[name]).astype(dtype) if parts[name] else np.empty(0, dtype=dtype)
+        for name, dtype in ARRAYS.items()
+    }
+    shard_path = os.path.join(shard_dir, f"shard-{shard_no:05d}")
+    pd.DataFrame(rows, columns=['subject_id', 'length', 'outlier_length'] + STAT_COLUMNS).to_csv(shard_path + '.csv.tmp', index=False)
+    np.savez(shard_path + '.tmp.npz', **arrays)
+    os.replace(shard_path + '.tmp.npz', shard_path + '.npz')
+    # The CSV is renamed last: its presence marks the shard as complete
+    os.replace(shard_path + '.csv.tmp', shard_path + '.csv')
+    return shard_no, len(rows)
+
+
+def plan_shards(ranges, n_shards):
+    """
+    Split offset-sorted subjects into contiguous shards of roughly equal byte size.
+
+    The offline jobs (this store, graph export and cohort statistics) hand shards to a pool
+    of worker processes. Each worker decodes its shard's contiguous range of chartevents
+    in one forward pass, so the file is read once overall rather than seeked per subject.
+    """
+    sizes = (ranges['end'] - ranges['start']).to_numpy()
+    bounds = np.searchsorted(np.cumsum(sizes), np.linspace(0, sizes.sum(), n_shards + 1)[1:-1])
+    ids = ranges['subject_id'].to_numpy()
+    return [chunk.tolist() for chunk in np.split(ids, bounds) if len(chunk)]
+
+
+def _merge_shards(shard_dir, store_dir, n_shards):
+    """Concatenate shard files into the final memory-mappable arrays, one shard at a time."""
+    tables = [pd.read_csv(os.path.join(shard_dir, f"shard-{i:05d}.csv")) for i in range(n_shards)]
+    subjects = pd.concat(tables, ignore_index=True)
+
+    # Global slice bounds for each subject
+    subjects['stop'] = subjects['length'].cumsum()
+    subjects['start'] = subjects['stop'] - subjects['length']
+    subjects['outlier_stop'] = subjects['outlier_length'].cumsum()
+    subjects['outlier_start'] = subjects['outlier_stop'] - subjects['outlier_length']
+
+    totals = {
+        'times': int(subjects['length'].sum()), 'values': int(subjects['length'].sum()), 'averaged': int(subjects['length'].sum()),
+        'outlier_times': int(subjects['outlier_length'].sum()), 'outlier_values': int(subjects['outlier_length'].sum()),
+    }
+    outputs = {
+        name: np.lib.format.open_memmap(os.path.join(store_dir, f"{name}.npy"), mode='w+', dtype=dtype, shape=(totals[name],))
+        for name, dtype in ARRAYS.items()
+    }
+    positions = dict.fromkeys(ARRAYS, 0)
+    for i in range(n_shards):
+        with np.load(os.path.join(shard_dir, f"shard-{i:05d}.npz")) as npz:
+            for name, out in outputs.items():
+                chunk = npz[name]
+                out[positions[name]:positions[name] + len(chunk)] = chunk
+                positions[name] += len(chunk)
+    for out in outputs.values():
+        out.flush()
+
+    columns = ['subject_id', 'start', 'stop', 'outlier_start', 'outlier_stop'] + STAT_COLUMNS
+    subjects[columns].sort_values('subject_id').to_csv(os.path.join(store_dir, 'subjects.csv'), index=False)
+    return len(subjects), totals['values']
+
+
+def build_feature_store(store_dir, hr_itemids=None, workers=None, logger=None):
+    """Run the BPM pipeline for every indexed subject and write the feature store.
+
+    Subjects are processed in byte-offset shards (see plan_shards). Finished shards are
+    kept in `<store_dir>/_shards` until the merge completes, so an interrupted build
+    resumes where it stopped.
+
+    Args:
+        store_dir (str): Output directory.
+        hr_itemids (list): Heart rate itemids (falls back to valueuom == 'bpm' if empty).
+        workers (int): Number of worker processes (default: CPU count - 1).
+        logger: Optional LoggerWrapper instance.
+    """
+    log = logger.info if logger else print
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    shard_dir = os.path.join(store_dir, '_shards')
+    os.makedirs(shard_dir, exist_ok=True)
+
+    ff = get_file_filter("chartevents")
+    ranges = ff.get_byte_ranges(ff.lookup_df.index)
+    shards = plan_shards(ranges, SHARD_COUNT)
+
+    # A previous run with a different shard plan can't be resumed
+    plan_path = os.path.join(shard_dir, 'plan.json')
+    plan = {'shards': len(shards), 'subjects': len(ranges), 'selection': _selection(hr_itemids)}
+    if os.path.exists(plan_path):
+        with open(plan_path) as f:
+            if json.load(f) != plan:
+                log("Shard plan changed since the last run. Rebuilding all shards.")
+                shutil.rmtree(shard_dir)
+                os.makedirs(shard_dir)
+    with open(plan_path, 'w') as f:
+        json.dump(plan, f)
+
+    pending = [i for i in range(len(shards)) if not os.path.exists(os.path.join(shard_dir, f"shard-{i:05d}.csv"))]
+    log(f"Building heart rate store for {len(ranges)} subjects: {len(pending)}/{len(shards)} shards pending, {workers} workers")
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_build_shard, i, shards[i], hr_itemids, shard_dir) for i in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            shard_no, n_subjects = future.result()
+            log(f"Shard {shard_no} done ({n_subjects} subjects with heart rate) [{done}/{len(futures)}]")
+
+    n_subjects, n_points = _merge_shards(shard_dir, store_dir, len(shards))
+    with open(os.path.join(store_dir, 'manifest.json'), 'w') as f:
+        json.dump({'built_at': time.time(), 'format': STORE_FORMAT, 'subjects': n_subjects, 'points': n_points,
+                   'selection': _selection(hr_itemids)}, f)
+    shutil.rmtree(shard_dir)
+
+    log(f"Heart rate store written to {store_dir}: {n_subjects} subjects, {n_points} points in {time.time() - start_time:.2f}s")
+    return store_dir
+
+
+class HeartRateStore:
+    """Read-only view over a built feature store; arrays are memory-mapped."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.subjects = pd.read_csv(os.path.join(store_dir, 'subjects.csv')).set_index('subject_id')
+        self.arrays = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+
+    @classmethod
+    def open(cls, store_dir, hr_itemids=None):
+        """Open the store if it exists and was built with the same layout and heart rate selection, else None."""
+        if not store_dir or not os.path.exists(os.path.join(store_dir, 'manifest.json')):
+            return None
+        store = cls(store_dir)
+        if store.manifest.get('format', 1) != STORE_FORMAT:
+            print(f"[HeartRateStore] Store at {store_dir} has an outdated layout. Ignoring it; rebuild it with --build-hr-store.")
+            return None
+        if store.manifest.get('selection') != _selection(hr_itemids):
+            print(f"[HeartRateStore] Store at {store_dir} was built with a different heart rate selection. Ignoring it.")
+            return None
+        return store
+
+    @property
+    def version(self):
+        return str(self.manifest.get('built_at'))
+
+    def __contains__(self, subject_id):
+        return subject_id in self.subjects.index
+
+    def get(self, subject_id):
+        """Return the stored ProcessedSeries for a subject, or None if it has no heart rate data."""
+        if subject_id not in self.subjects.index:
+            return None
+        row = self.subjects.loc[subject_id]
+        start, stop = int(row['start']), int(row['stop'])
+        o_start, o_stop = int(row['outlier_start']), int(row['outlier_stop'])
+        return ProcessedSeries(
+            subject_id=int(subject_id),
+            times=self.arrays['times'][start:stop],
+            values=self.arrays['values'][start:stop],
+            averaged=self.arrays['averaged'][start:stop],
+            outlier_times=self.arrays['outlier_times'][o_start:o_stop],
+            outlier_values=self.arrays['outlier_values'][o_start:o_stop],
+            summary={
+                'count': int(row['count']),
+                **{col: float(row[col]) for col in STAT_COLUMNS if col != 'count'}
+            }
+        )
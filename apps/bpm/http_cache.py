@@ -0,0 +1,64 @@
+"""HTTP caching and compression for the BPM Flask Application.
+
+Deterministic API responses carry a weak ETag hashed from the request parameters and
+the data version, so a client revalidating with If-None-Match gets a 304 before the
+subject is loaded or anything is plotted. Responses are gzip or brotli compressed
+according to Accept-Encoding; streamed responses and files are passed through.
+"""
+
+import gzip
+import hashlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+
+def etag_for(*parts):
+    """Content hash of the values a response is computed from."""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 response if the client already holds `etag`, else None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(current_app.response_class(status=304), etag)
+
+
+def with_etag(response, etag):
+    """Tag a response; clients may store it but must revalidate before reuse."""
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+
+def compress_response(response):
+    """Compress a response body with the best encoding the client accepts."""
+    config = current_app.config
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_BYTES']:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if HAS_BROTLI else ['gzip'])
+    if encoding == 'br':
+        data = brotli.compress(data, quality=config['BROTLI_QUALITY'])
+    elif encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical bodies
+        data = gzip.compress(data, compresslevel=config['GZIP_LEVEL'], mtime=0)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,221 @@
+"""Binning and interpolation for the BPM Flask Application.
+
+Interpolation outputs can be memoized in an LRUCache keyed by a hash of the series and
+the interpolation parameters (see cached_interpolation), so switching back to a view
+that was already computed skips the fit and the grid evaluation. Outputs are NumPy
+arrays (float64 values, datetime64 times), as in ProcessedSeries, so a cache hit needs
+no conversion before plotting.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import BarycentricInterpolator, CubicSpline, PchipInterpolator
+
+# Interpolation methods offered by the app ('none' shows the cleaned series only)
+METHODS = ('none', 'lagrange', 'cubic_spline', 'cubic_hermite')
+
+# Bin sizes count either points or minutes
+BIN_UNITS = ('points', 'minutes')
+
+# Lagrange interpolation becomes unstable with many nodes
+LAGRANGE_MAX_NODES = 20
+
+
+def bin_by_count(x, y, bin_size):
+    """Average consecutive runs of `bin_size` points (the last bin may be shorter)."""
+    starts = np.arange(0, len(x), bin_size)
+    counts = np.diff(np.append(starts, len(x)))
+    return np.add.reduceat(x, starts) / counts, np.add.reduceat(y, starts) / counts
+
+
+def bin_by_time(x, y, interval_seconds):
+    """Average points falling in consecutive fixed-width time buckets; empty buckets are skipped.
+
+    `x` must be sorted seconds from the start of the series.
+    """
+    buckets = np.floor_divide(x, interval_seconds)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    counts = np.diff(np.append(starts, len(x)))
+    return np.add.reduceat(x, starts) / counts, np.add.reduceat(y, starts) / counts
+
+
+def bin_windows(x, y, centers, half_bin):
+    """Average a window of +/- `half_bin` points around each center index using cumulative sums."""
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    lo = np.maximum(0, centers - half_bin)
+    hi = np.minimum(len(x), centers + half_bin + 1)
+    n = hi - lo
+    return (cx[hi] - cx[lo]) / n, (cy[hi] - cy[lo]) / n
+
+
+class InterpolationResult:
+    """Memoized output of apply_interpolation: the four arrays it returns."""
+
+    FIELDS = ('values', 'timestamps', 'binned_values', 'binned_timestamps')
+
+    def __init__(self, values, timestamps, binned_values, binned_timestamps):
+        self.values = values
+        self.timestamps = timestamps
+        self.binned_values = binned_values
+        self.binned_timestamps = binned_timestamps
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, field).nbytes for field in self.FIELDS)
+
+    def unpack(self):
+        return self.values, self.timestamps, self.binned_values, self.binned_timestamps
+
+    def save(self, path):
+        np.savez(path, **{field: getattr(self, field) for field in self.FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            return cls(*(npz[field] for field in cls.FIELDS))
+
+
+def interpolation_key(values, timestamps, method, bin_size=0, bin_unit='points', grid_points=None, window=None):
+    """Memo key: a hash of the series' values and times together with every interpolation parameter."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(timestamps, dtype='datetime64[ns]').tobytes())
+    digest.update(repr((method, bin_size, bin_unit, grid_points, window)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_interpolation(cache, values, timestamps, method, bin_size=0, bin_unit='points', grid_points=None, window=None):
+    """
+    apply_interpolation, memoized in `cache` (an LRUCache of InterpolationResult).
+
+    Results for a zoom `window` are kept in memory only, since they are rarely revisited
+    exactly. Failed interpolations are not memoized. Callers must not modify the
+    returned arrays, which are shared with the cache.
+    """
+    if cache is None or not method or method == 'none':
+        return apply_interpolation(values, timestamps, method, bin_size, bin_unit, grid_points, window)
+
+    key = interpolation_key(values, timestamps, method, bin_size, bin_unit, grid_points, window)
+    result = cache.get(key)
+    if result is not None:
+        return result.unpack()
+
+    output = apply_interpolation(values, timestamps, method, bin_size, bin_unit, grid_points, window)
+    if output[0] is not None:
+        cache.put(key, InterpolationResult(*output), persist=window is None)
+    return output
+
+
+def apply_interpolation(values, timestamps, method, bin_size=0, bin_unit='points', grid_points=None, window=None):
+    """
+    Apply interpolation to the data using specified binning.
+
+    `bin_unit` selects whether `bin_size` counts points ('points') or minutes ('minutes').
+    `grid_points` caps the size of the evaluation grid, and `window` (start, end) in
+    seconds from the first reading restricts it to a time window; the fit itself
+    always uses the whole series.
+    Returns:
+        interpolated_values: Array of interpolated Y values
+        interpolated_timestamps: Array of interpolated timestamps (datetime64, whole seconds)
+        binned_values: Array of Y values used for interpolation (binned averages)
+        binned_timestamps: Array of timestamps for binned points (datetime64, whole seconds)
+    """
+    if len(values) == 0 or len(timestamps) == 0:
+        return None, None, None, None
+
+    try:
+        # Create DataFrame to handle duplicates and sorting easily
+        df = pd.DataFrame({'val': values, 'time': pd.to_datetime(timestamps)})
+
+        # Drop rows with missing values
+        df = df.dropna()
+
+        if df.empty:
+            return None, None, None, None
+
+        # Group by time and take mean to handle duplicates (interpolation requires strictly increasing x)
+        df = df.groupby('time')['val'].mean().reset_index()
+        df = df.sort_values('time')
+
+        times = df['time']
+        start_time = times.min()
+
+        # Calculate seconds from start
+        x = (times - start_time).dt.total_seconds().to_numpy()
+        y = df['val'].to_numpy()
+
+        # Determine query points (denser grid for visualization)
+        if len(x) < 2:
+            return None, None, None, None
+
+        # Apply Binning Logic if requested
+        x_active, y_active = x, y
+
+        if bin_size > 0:
+            if bin_unit == 'minutes':
+                x_active, y_active = bin_by_time(x, y, bin_size * 60.0)
+            elif method == 'lagrange' and (len(x) / bin_size) > LAGRANGE_MAX_NODES:
+                # Lagrangian specific binning logic:
+                # average a bin-sized window around 20 evenly-spaced midpoints
+                centers = np.linspace(0, len(x) - 1, LAGRANGE_MAX_NODES, dtype=int)
+                x_active, y_active = bin_windows(x, y, centers, bin_size // 2)
+            else:
+                # Standard binning: consecutive runs of bin_size points
+                x_active, y_active = bin_by_count(x, y, bin_size)
+
+        # Visualization Grid:
+        # We want a smooth line, so we need a dense grid.
+        # Ensure grid spans the range of active points
+
+        num_points = max(200, len(x) * 5)
+        if grid_points:
+            num_points = min(num_points, grid_points)
+        # Use active points range for grid
+        lo, hi = x.min(), x.max()
+        if window is not None:
+            lo, hi = max(lo, window[0]), min(hi, window[1])
+            if lo >= hi:
+                return None, None, None, None
+        grid = np.linspace(lo, hi, num_points)
+        knots = x_active[(x_active >= lo) & (x_active <= hi)]
+        # Evaluate at the knots too, unless that would blow through the grid cap
+        if not grid_points or len(knots) <= grid_points:
+            grid = np.concatenate((grid, knots))
+        x_new = np.unique(grid)
+
+        y_new = None
+
+        # Method selection
+        if method == 'lagrange':
+             # Use BarycentricInterpolator
+             if len(x_active) > LAGRANGE_MAX_NODES and (bin_size == 0 or bin_unit == 'minutes'):
+                 # Too many nodes (no binning, or time bins that leave many buckets):
+                 # Limit to 20 evenly-spaced points to prevent instability (legacy behavior)
+                 indices = np.linspace(0, len(x_active) - 1, LAGRANGE_MAX_NODES, dtype=int)
+                 poly = BarycentricInterpolator(x_active[indices], y_active[indices])
+             else:
+                 # Use active points (which are binned if bin_size > 0)
+                 poly = BarycentricInterpolator(x_active, y_active)
+             y_new = poly(x_new)
+
+        elif method == 'cubic_spline':
+             cs = CubicSpline(x_active, y_active, bc_type='natural')
+             y_new = cs(x_new)
+        elif method == 'cubic_hermite':
+             pch = PchipInterpolator(x_active, y_active)
+             y_new = pch(x_new)
+        else:
+             return None, None, None, None
+
+        # Convert back to timestamps, truncated to the seconds resolution of the source times
+        t_new = (start_time + pd.to_timedelta(x_new, unit='s')).to_numpy().astype('datetime64[s]')
+        t_binned = (start_time + pd.to_timedelta(x_active, unit='s')).to_numpy().astype('datetime64[s]')
+
+        return np.asarray(y_new, dtype=np.float64), t_new, np.asarray(y_active, dtype=np.float64), t_binned
+
+    except Exception as e:
+        print(f"Interpolation error: {e}")
+        return None, None, None, None
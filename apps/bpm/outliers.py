@@ -0,0 +1,173 @@
+"""Outlier detection for the BPM Flask Application.
+
+Readings are flagged by one of three vectorized methods:
+
+    iqr           outside [Q1 - k * IQR, Q3 + k * IQR] of the whole series (k = 1.5)
+    mad           further than k scaled MADs from the median of the whole series (k = 3.5)
+    rolling_mad   further than k scaled MADs from the median of the trailing time window
+                  (default 60 minutes) ending at the reading (k = 3.5)
+
+MADs are scaled by 1.4826 so thresholds read as standard deviations of normal data, and
+the rolling window is a fixed span of time rather than a number of readings, so flags are
+comparable between dense and sparse stretches of a stay.
+
+Bounds are computed over the finite readings only. A NaN or infinite reading can't be
+tested against them and is never flagged; it is not an outlier but a missing reading,
+which the pipeline's cleaning step drops on its own.
+
+OutlierDetector also accepts data appended after it was fitted. Global methods keep the
+values sorted, so new readings are merged in instead of re-sorting the series; the
+rolling method only evaluates the new readings, since a trailing window never sees
+later data and earlier flags can't change.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+OUTLIER_METHODS = ('iqr', 'mad', 'rolling_mad')
+DEFAULT_THRESHOLDS = {'iqr': 1.5, 'mad': 3.5, 'rolling_mad': 3.5}
+# Makes the MAD of normally distributed data equal its standard deviation
+MAD_SCALE = 1.4826
+# Same for the mean absolute deviation, used where the MAD is 0
+MEAN_AD_SCALE = 1.2533
+# The app's cleaning step (what the heart rate store is built with)
+DEFAULT_OUTLIERS = {'method': 'iqr'}
+
+
+class OutlierResult(NamedTuple):
+    """Per-reading outlier flags and the bounds they were tested against."""
+    mask: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+def outlier_options(outliers=None):
+    """Complete outlier settings (method, threshold, window_minutes, min_points) from a partial dict."""
+    options = dict(DEFAULT_OUTLIERS, **(outliers or {}))
+    if options['method'] not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method '{options['method']}'. Expected one of {OUTLIER_METHODS}.")
+    options.setdefault('threshold', DEFAULT_THRESHOLDS[options['method']])
+    options.setdefault('window_minutes', 60)
+    options.setdefault('min_points', 5)
+    return options
+
+
+def is_default_outliers(outliers=None):
+    """Whether `outliers` selects the app's default cleaning (IQR, k = 1.5)."""
+    return outlier_options(outliers) == outlier_options(DEFAULT_OUTLIERS)
+
+
+def _sorted_quantile(sorted_values, q):
+    """Quantile of pre-sorted values with linear interpolation (as np.percentile and pandas)."""
+    pos = q * (len(sorted_values) - 1)
+    lo = int(np.floor(pos))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class OutlierDetector:
+    """Flags outliers in a time-sorted series, and in readings appended to it later."""
+
+    def __init__(self, method='iqr', threshold=None, window_minutes=60, min_points=5):
+        """
+        Args:
+            method (str): One of OUTLIER_METHODS.
+            threshold (float): IQR multiplier or number of scaled MADs (default per method).
+            window_minutes (float): Trailing window of rolling_mad.
+            min_points (int): Readings a rolling window needs before it can flag anything.
+        """
+        options = outlier_options({'method': method, 'window_minutes': window_minutes, 'min_points': min_points,
+                                   **({'threshold': threshold} if threshold is not None else {})})
+        self.method = options['method']
+        self.threshold = options['threshold']
+        self.window = pd.Timedelta(minutes=options['window_minutes'])
+        self.min_points = options['min_points']
+        self.times = np.empty(0, dtype='datetime64[ns]')
+        self.values = np.empty(0, dtype=np.float64)
+        self._sorted = np.empty(0, dtype=np.float64)
+        self._result = None
+
+    def fit(self, times, values):
+        """Detect outliers in a whole series (sorted by time)."""
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.method == 'rolling_mad':
+            self._result = self._rolling(self.times, self.values)
+        else:
+            self._sorted = np.sort(self.values[np.isfinite(self.values)])
+            self._result = self._global()
+        return self._result
+
+    def update(self, times, values):
+        """
+        Add readings after the fitted ones and return the flags of every reading.
+
+        With global methods the bounds move, so earlier readings can change state. If the
+        new readings start before the last fitted one, the series is refitted.
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        values = np.asarray(values, dtype=np.float64)
+        if self._result is None or len(self.times) == 0 or (len(times) and times[0] < self.times[-1]):
+            order = np.argsort(np.concatenate([self.times, times]), kind='stable')
+            return self.fit(np.concatenate([self.times, times])[order], np.concatenate([self.values, values])[order])
+        if len(times) == 0:
+            return self._result
+
+        n_old = len(self.times)
+        self.times = np.concatenate([self.times, times])
+        self.values = np.concatenate([self.values, values])
+        if self.method == 'rolling_mad':
+            # A new reading's MAD uses deviations from medians one window further back
+            context = int(np.searchsorted(self.times, times[0] - 2 * self.window.to_timedelta64(), side='left'))
+            tail = self._rolling(self.times[context:], self.values[context:])
+            offset = n_old - context
+            self._result = OutlierResult(*(np.concatenate([old, new[offset:]]) for old, new in zip(self._result, tail)))
+        else:
+            new_sorted = np.sort(values[np.isfinite(values)])
+            self._sorted = np.insert(self._sorted, np.searchsorted(self._sorted, new_sorted), new_sorted)
+            self._result = self._global()
+        return self._result
+
+    def _global(self):
+        values, sorted_values = self.values, self._sorted
+        if len(sorted_values) < 2:
+            lower, upper = -np.inf, np.inf
+        elif self.method == 'iqr':
+            q1, q3 = _sorted_quantile(sorted_values, 0.25), _sorted_quantile(sorted_values, 0.75)
+            lower, upper = q1 - self.threshold * (q3 - q1), q3 + self.threshold * (q3 - q1)
+        else:
+            median = _sorted_quantile(sorted_values, 0.5)
+            deviations = np.abs(sorted_values - median)
+            scale = MAD_SCALE * np.median(deviations)
+            if scale == 0:
+                scale = MEAN_AD_SCALE * deviations.mean()
+            lower, upper = median - self.threshold * scale, median + self.threshold * scale
+        n = len(values)
+        lower, upper = np.full(n, lower, dtype=np.float64), np.full(n, upper, dtype=np.float64)
+        return OutlierResult(np.isfinite(values) & ((values < lower) | (values > upper)), lower, upper)
+
+    def _rolling(self, times, values):
+        if len(values) == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return OutlierResult(np.empty(0, dtype=bool), empty, empty)
+        finite = np.isfinite(values)
+        # Rolling statistics skip NaN, so non-finite readings don't count towards any window
+        series = pd.Series(np.where(finite, values, np.nan), index=pd.DatetimeIndex(times))
+        median = series.rolling(self.window, min_periods=self.min_points).median()
+        deviations = pd.Series(np.abs(series.to_numpy() - median.to_numpy()), index=series.index)
+        rolling_deviations = deviations.rolling(self.window, min_periods=self.min_points)
+        scale = MAD_SCALE * rolling_deviations.median().to_numpy()
+        # A window of mostly identical readings has a MAD of 0; fall back to the mean deviation
+        scale = np.where(scale > 0, scale, MEAN_AD_SCALE * rolling_deviations.mean().to_numpy())
+        median = median.to_numpy()
+        lower, upper = median - self.threshold * scale, median + self.threshold * scale
+        # Readings without a full window (NaN bounds) are never flagged
+        mask = finite & ((values < lower) | (values > upper))
+        return OutlierResult(mask, lower, upper)
+
+
+def detect_outliers(times, values, outliers=None):
+    """Outlier flags of a time-sorted series for the settings in `outliers` (default: IQR)."""
+    return OutlierDetector(**outlier_options(outliers)).fit(times, values)
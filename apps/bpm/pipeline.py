@@ -0,0 +1,310 @@
+"""Vital sign processing pipeline for the BPM Flask Application.
+
+Turns a subject's chartevents rows into cleaned, duplicate-averaged series (heart rate
+and the other configured vitals) held as NumPy arrays, so they can be cached server-side
+and re-used by every view of the subject.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.analysis.filters.file_filter import get_file_filter
+from .outliers import detect_outliers
+
+
+class SeriesNotFound(LookupError):
+    """Raised when a subject has no usable data for a vital.
+
+    Also cached (in memory) for vitals a decoded subject turned out not to have, so
+    asking again doesn't decode the subject again.
+    """
+    nbytes = 0
+
+
+@dataclass
+class ProcessedSeries:
+    """Cleaned vital sign series for one subject.
+
+    `times`/`values` hold the IQR-cleaned series with duplicate timestamps averaged,
+    sorted by time. `averaged` flags points that were averaged from duplicates.
+    `summary` holds precomputed statistics when the series comes from the feature store.
+    """
+    subject_id: int
+    times: np.ndarray
+    values: np.ndarray
+    averaged: np.ndarray
+    outlier_times: np.ndarray
+    outlier_values: np.ndarray
+    summary: Optional[dict] = None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.times, self.values, self.averaged, self.outlier_times, self.outlier_values))
+
+    def stats(self):
+        """Summary statistics of the cleaned series."""
+        if self.summary is not None:
+            return dict(self.summary)
+        if len(self.values) == 0:
+            return {}
+        v_series = pd.Series(self.values)
+        return {
+            'count': int(len(v_series)),
+            'mean': round(v_series.mean(), 1),
+            'median': round(v_series.median(), 1),
+            'min': round(v_series.min(), 1),
+            'max': round(v_series.max(), 1),
+            'std': round(v_series.std(), 1) if len(v_series) > 1 else 0.0
+        }
+
+    def save(self, path):
+        np.savez(
+            path,
+            subject_id=np.int64(self.subject_id),
+            times=self.times,
+            values=self.values,
+            averaged=self.averaged,
+            outlier_times=self.outlier_times,
+            outlier_values=self.outlier_values
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            return cls(
+                subject_id=int(npz['subject_id']),
+                times=npz['times'],
+                values=npz['values'],
+                averaged=npz['averaged'],
+                outlier_times=npz['outlier_times'],
+                outlier_values=npz['outlier_values']
+            )
+
+
+def select_heart_rate(df, hr_itemids=None):
+    """Filter a subject's chartevents rows down to heart rate readings."""
+    if hr_itemids and 'itemid' in df.columns:
+        return df[df['itemid'].isin(hr_itemids)].copy()
+    if 'valueuom' in df.columns:
+        return df[df['valueuom'] == 'bpm'].copy()
+    # Plan says "Filter rows where valueuom == 'bpm'"
+    # If column missing, empty
+    return pd.DataFrame()
+
+
+def missing_message(vital, subject_id):
+    """Error message for a subject without readings of a vital."""
+    if vital == 'heart_rate':
+        return f'No Heart Rate (BPM) data found for subject {subject_id}.'
+    return f"No {vital.replace('_', ' ')} data found for subject {subject_id}."
+
+
+def split_vitals(df, vital_itemids):
+    """
+    Split a subject's chartevents rows into one frame per vital in a single pass.
+
+    Every row is labelled with its vital by one binary search over the sorted itemids,
+    and the rows are grouped with one stable sort, so splitting out N vitals costs about
+    the same as splitting out one. Rows keep their original order within each vital.
+
+    Args:
+        df (pd.DataFrame): The subject's chartevents rows.
+        vital_itemids (dict): Vital name -> itemids (each list non-empty).
+
+    Returns:
+        dict: {vital: DataFrame of its rows}
+    """
+    names = list(vital_itemids)
+    itemids = np.array([i for name in names for i in vital_itemids[name]], dtype=np.int64)
+    item_codes = np.array([k for k, name in enumerate(names) for _ in vital_itemids[name]], dtype=np.int64)
+    order = np.argsort(itemids)
+    itemids, item_codes = itemids[order], item_codes[order]
+
+    row_itemids = df['itemid'].to_numpy(dtype=np.int64)
+    pos = np.searchsorted(itemids, row_itemids).clip(max=len(itemids) - 1)
+    codes = np.where(itemids[pos] == row_itemids, item_codes[pos], -1)
+
+    rows = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[rows], np.arange(len(names) + 1))
+    return {name: df.iloc[rows[bounds[k]:bounds[k + 1]]] for k, name in enumerate(names)}
+
+
+def clean_series(subject_id, vital_df, outliers=None):
+    """Clean one vital's rows into a ProcessedSeries.
+
+    Steps: sort by charttime, drop readings without a numeric value, drop outliers
+    (`outliers` settings, see outliers.py; default 1.5 * IQR), then average readings that
+    share a timestamp. `vital_df` must not be empty.
+    """
+    vital_df = vital_df.copy()
+    vital_df['charttime'] = pd.to_datetime(vital_df['charttime'])
+    vital_df = vital_df.sort_values('charttime')
+
+    # Missing readings are neither data nor outliers
+    vital_df = vital_df[np.isfinite(vital_df['valuenum'].to_numpy(dtype=np.float64))]
+
+    # Outlier Detection (IQR by default)
+    outliers_df = vital_df.iloc[0:0]
+    clean_df = vital_df
+    if len(vital_df) > 1:
+        outlier_mask = detect_outliers(
+            vital_df['charttime'].to_numpy(dtype='datetime64[ns]'), vital_df['valuenum'].to_numpy(dtype=np.float64), outliers
+        ).mask
+        outliers_df = vital_df[outlier_mask]
+        clean_df = vital_df[~outlier_mask]
+
+    # Averaging Duplicates on Clean Data
+    # IMPORTANT: This averaging happens BEFORE any binning is applied.
+    # Duplicates (same timestamp) are averaged first, then binning is applied to the averaged data.
+    grouped = clean_df.groupby('charttime')['valuenum'].agg(['mean', 'count'])
+
+    return ProcessedSeries(
+        subject_id=int(subject_id),
+        times=grouped.index.to_numpy(dtype='datetime64[ns]'),
+        values=grouped['mean'].to_numpy(dtype=np.float64),
+        # If count > 1, it was averaged - marked as "Averaged" in the Type column
+        averaged=(grouped['count'] > 1).to_numpy(),
+        outlier_times=outliers_df['charttime'].to_numpy(dtype='datetime64[ns]'),
+        outlier_values=outliers_df['valuenum'].to_numpy(dtype=np.float64)
+    )
+
+
+def process_subject(subject_id, df, hr_itemids=None, outliers=None):
+    """Clean a subject's chartevents rows into its heart rate ProcessedSeries.
+
+    Raises:
+        SeriesNotFound: If the subject has no rows or no heart rate rows.
+    """
+    if df.empty:
+        raise SeriesNotFound(f'No data found for subject {subject_id}.')
+
+    bpm_df = select_heart_rate(df, hr_itemids)
+    if bpm_df.empty:
+        raise SeriesNotFound(missing_message('heart_rate', subject_id))
+    return clean_series(subject_id, bpm_df, outliers)
+
+
+def process_vitals(subject_id, df, vital_itemids, outliers=None):
+    """Clean several vitals out of one decoded chartevents range.
+
+    `vital_itemids` maps vital name -> itemids. A vital with no itemids is selected by
+    valueuom == 'bpm' instead (the heart rate fallback when d_items is unavailable).
+    `outliers` selects the outlier detection (see outliers.py; default IQR).
+
+    Returns:
+        dict: {vital: ProcessedSeries, or the SeriesNotFound explaining why it is missing}
+    """
+    if df.empty:
+        return {vital: SeriesNotFound(f'No data found for subject {subject_id}.') for vital in vital_itemids}
+
+    by_itemid = {vital: itemids for vital, itemids in vital_itemids.items() if itemids}
+    parts = split_vitals(df, by_itemid) if by_itemid and 'itemid' in df.columns else {}
+    results = {}
+    for vital, itemids in vital_itemids.items():
+        if itemids:
+            vital_df = parts.get(vital, pd.DataFrame())
+        else:
+            vital_df = select_heart_rate(df)
+        if vital_df.empty:
+            results[vital] = SeriesNotFound(missing_message(vital, subject_id))
+        else:
+            results[vital] = clean_series(subject_id, vital_df, outliers)
+    return results
+
+
+def series_key(subject_id, vital='heart_rate'):
+    """Cache key of a subject's series for one vital."""
+    return (subject_id, vital)
+
+
+def load_series(subject_id, hr_itemids=None, cache=None, store=None, vital='heart_rate', vital_itemids=None, outliers=None, file_filter=None):
+    """Return the processed series of one vital for a subject.
+
+    Lookup order: `cache`, then the precomputed heart rate `store` (a memory-mapped slice),
+    then decoding the subject's chartevents range. A decoded range is split into every
+    vital in `vital_itemids` (vital name -> itemids; default: heart rate from
+    `hr_itemids` only), and all of them are stored in `cache`, so viewing further
+    vitals of the subject costs no further read. `outliers` selects the outlier
+    detection; the store is only valid for the default. `file_filter` reads chartevents
+    (default: the process-wide instance).
+
+    Raises:
+        SeriesNotFound: If the subject has no readings of `vital`.
+    """
+    if vital_itemids is None:
+        vital_itemids = {'heart_rate': hr_itemids or []}
+    if vital not in vital_itemids:
+        raise ValueError(f"Unknown vital '{vital}'. Expected one of {list(vital_itemids)}.")
+
+    if cache is not None:
+        series = cache.get(series_key(subject_id, vital))
+        if isinstance(series, SeriesNotFound):
+            raise SeriesNotFound(str(series))
+        if series is not None:
+            return series
+
+    if store is not None and vital == 'heart_rate':
+        series = store.get(subject_id)
+        if series is not None:
+            return series
+
+    ff = file_filter or get_file_filter("chartevents")
+    df = ff.search_subject(subject_id)
+    results = process_vitals(subject_id, df, vital_itemids, outliers)
+
+    if cache is not None:
+        for name, series in results.items():
+            cache.put(series_key(subject_id, name), series, persist=isinstance(series, ProcessedSeries))
+    if isinstance(results[vital], SeriesNotFound):
+        raise results[vital]
+    return results[vital]
+
+
+def load_series_batch(subject_ids, hr_itemids=None, cache=None, store=None, executor=None, outliers=None):
+    """Return {subject_id: ProcessedSeries or SeriesNotFound} of heart rate for several subjects.
+
+    Cached and stored series are used as they are. The remaining subjects are read from
+    chartevents in a single pass in byte-offset order, and each one is handed to
+    `executor` for processing while the read continues; results are stored in `cache`.
+    """
+    results = {}
+    missing = []
+    for subject_id in dict.fromkeys(subject_ids):
+        series = cache.get(series_key(subject_id)) if cache is not None else None
+        if series is None and store is not None:
+            series = store.get(subject_id)
+        if series is not None:
+            results[subject_id] = series
+        else:
+            missing.append(subject_id)
+
+    if not missing:
+        return results
+
+    ff = get_file_filter("chartevents")
+    pending = {}
+    for subject_id, df in ff.search_subjects(missing):
+        if executor is not None:
+            pending[subject_id] = executor.submit(process_subject, subject_id, df, hr_itemids, outliers)
+        else:
+            try:
+                results[subject_id] = process_subject(subject_id, df, hr_itemids, outliers)
+            except SeriesNotFound as e:
+                results[subject_id] = e
+
+    for subject_id, future in pending.items():
+        try:
+            results[subject_id] = future.result()
+        except SeriesNotFound as e:
+            results[subject_id] = e
+
+    for subject_id in missing:
+        if subject_id not in results:
+            # No chartevents rows at all
+            results[subject_id] = SeriesNotFound(f'No data found for subject {subject_id}.')
+        elif cache is not None and isinstance(results[subject_id], ProcessedSeries):
+            cache.put(series_key(subject_id), results[subject_id])
+    return results
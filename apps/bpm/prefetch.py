@@ -0,0 +1,97 @@
+"""Background prefetch of likely-next subjects for the BPM Flask Application.
+
+After a subject is shown, its neighbouring subject IDs and the next random subject
+(drawn ahead of time) are decoded on a small thread pool into a separate cache with
+its own memory budget, so prefetching never evicts series a user actually opened.
+Each new navigation starts a new generation: queued prefetches of the previous one are
+cancelled, and a request for a subject that is still being prefetched waits for that
+work instead of decoding the subject a second time. A prefetch that is already decoding
+runs to completion, so `load` should read through its own file handles (see
+File_Filter.with_own_handles) to never hold up a foreground load of another subject.
+"""
+
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import LRUCache
+
+
+class Prefetcher:
+    """Warms subjects in the background; the most recent `schedule` call wins."""
+
+    def __init__(self, load, max_workers=2, max_bytes=64 * 1024 * 1024, candidates=None):
+        """
+        Args:
+            load (callable): subject_id -> ProcessedSeries; may raise SeriesNotFound.
+            max_workers (int): Prefetch threads.
+            max_bytes (int): Memory budget of prefetched series.
+            candidates (list): Subject IDs random subjects are drawn from.
+        """
+        self.load = load
+        self.cache = LRUCache(max_bytes)
+        self.candidates = list(candidates) if candidates is not None else []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bpm-prefetch')
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._futures = {}
+        self._next_random = None
+
+    @property
+    def next_random(self):
+        """The subject the next random draw will return, drawing it now if needed."""
+        with self._lock:
+            if self._next_random is None and self.candidates:
+                self._next_random = random.choice(self.candidates)
+            return self._next_random
+
+    def draw_random(self):
+        """Return the pre-drawn random subject and draw the one after it."""
+        with self._lock:
+            if not self.candidates:
+                return None
+            subject_id = self._next_random if self._next_random is not None else random.choice(self.candidates)
+            self._next_random = random.choice(self.candidates)
+            return subject_id
+
+    def schedule(self, subject_ids):
+        """Cancel queued prefetches and start warming `subject_ids`, in order."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            for future in self._futures.values():
+                future.cancel()
+            # Prefetches already decoding can't be interrupted; keep them so take() can join them
+            self._futures = {sid: f for sid, f in self._futures.items() if f.running()}
+            for subject_id in dict.fromkeys(subject_ids):
+                if subject_id in self._futures or subject_id in self.cache:
+                    continue
+                self._futures[subject_id] = self._executor.submit(self._prefetch, subject_id, generation)
+
+    def _prefetch(self, subject_id, generation):
+        # Superseded between being queued and starting
+        if generation != self._generation:
+            return None
+        series = self.load(subject_id)
+        self.cache.put(subject_id, series)
+        return series
+
+    def take(self, subject_id):
+        """
+        The prefetched series for a subject, or None if it wasn't prefetched.
+
+        Waits if the subject is being decoded right now; a prefetch still queued is
+        cancelled instead, since the caller will load the subject itself.
+        """
+        series = self.cache.get(subject_id)
+        if series is not None:
+            return series
+        with self._lock:
+            future = self._futures.get(subject_id)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            # Let the caller's own load report the error
+            return None
@@ -1,363 +1,589 @@
 """Routes for the BPM Flask Application."""
 
-import json
 import random
 import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.utils
-from scipy.interpolate import BarycentricInterpolator, CubicSpline, PchipInterpolator
-from flask import Blueprint, render_template, request, jsonify, current_app
-
-# Import File_Filter
-try:
-    from utils.analysis.filters.file_filter import File_Filter
-except ImportError:
-    # Fallback if running from a different context, though in app it should work
-    from utils.analysis.filters.file_filter import File_Filter
+from flask import Blueprint, render_template, request, jsonify, current_app, stream_with_context
+
+from .pipeline import SeriesNotFound, load_series, load_series_batch, series_key
+from .interpolation import BIN_UNITS, cached_interpolation
+from .downsample import align_to_grid, point_budget, visible_indices
+from .chart_spec import dumps, figure, json_response, scatter
+from .table import PAGE_LIMIT_MAX, ROW_TYPES, SORT_COLUMNS, SeriesTable, hour_labels
+from .subject_index import SEARCH_LIMIT_MAX
+from .config import ACCENT_COLOR, BG_COLOR, BIN_COLOR, GRID_COLOR, PRIMARY_COLOR, SPINE_COLOR, TEXT_PRIMARY, TEXT_SECONDARY
+from .http_cache import compress_response, etag_for, not_modified, with_etag
 
 bpm_bp = Blueprint('bpm', __name__, template_folder='templates', static_folder='static')
 
+@bpm_bp.after_request
+def compress(response):
+    """Compress responses the client accepts gzip or brotli for."""
+    return compress_response(response)
+
 @bpm_bp.route('/')
 def index():
     """Render the main page."""
-    # Get subject IDs from config
+    # Subject IDs are searched through /api/subjects/search, so the page only needs counts
     available_ids = current_app.config.get('SUBJECT_IDS', [])
-    # Limit to 5000 for frontend performance; 65k is too heavy for a simple select
-    display_ids = available_ids[:5000] if available_ids else []
-    return render_template('index.html', subject_ids=display_ids, total_count=len(available_ids))
+    hr_ids = current_app.config.get('HR_SUBJECT_IDS')
+    return render_template(
+        'index.html',
+        total_count=len(available_ids),
+        vitals=current_app.config['VITAL_SERIES'],
+        hr_count=len(hr_ids) if hr_ids is not None else None
+    )
+
+@bpm_bp.route('/api/subjects/search', methods=['GET'])
+def search_subjects():
+    """Subject IDs starting with the typed digits, for the typeahead.
+
+    Query parameters: q (digits typed so far), limit, and hr_only (1 to list only
+    subjects known to have heart rate data).
+    """
+    query = request.args.get('q', '').strip()
+    hr_only = request.args.get('hr_only', '0').lower() in ('1', 'true', 'yes')
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer.'}), 400
+    if not 0 < limit <= SEARCH_LIMIT_MAX:
+        return jsonify({'error': f'limit must be between 1 and {SEARCH_LIMIT_MAX}.'}), 400
+
+    index = current_app.config.get('SUBJECT_INDEX')
+    if index is None:
+        return jsonify({'query': query, 'results': [], 'total': 0})
+    results, total = index.search(query, limit=limit, hr_only=hr_only)
+    return jsonify({'query': query, 'results': results, 'total': total})
+
+def get_series(subject_id, vital='heart_rate'):
+    """Processed series of a vital for a subject, served from the server-side cache when possible."""
+    prefetcher = current_app.config.get('PREFETCHER')
+    cache = current_app.config.get('SERIES_CACHE')
+    key = series_key(subject_id, vital)
+    if vital == 'heart_rate' and prefetcher is not None and (cache is None or key not in cache):
+        series = prefetcher.take(subject_id)
+        if series is not None:
+            if cache is not None:
+                cache.put(key, series)
+            return series
+    return load_series(
+        subject_id,
+        hr_itemids=current_app.config.get('HEART_RATE_ITEMIDS', []),
+        cache=cache,
+        store=current_app.config.get('HR_STORE'),
+        vital=vital,
+        vital_itemids=current_app.config.get('VITAL_ITEMIDS'),
+        outliers=current_app.config.get('OUTLIERS')
+    )
+
+def get_vital(data):
+    """The requested vital (default heart rate), or None if it isn't one of VITAL_SERIES."""
+    vital = data.get('vital') or 'heart_rate'
+    return vital if vital in current_app.config['VITAL_SERIES'] else None
 
-def apply_interpolation(values, timestamps, method, bin_size=0):
+def vital_error():
+    return jsonify({'error': f"vital must be one of {list(current_app.config['VITAL_SERIES'])}."}), 400
+
+def prefetch_around(subject_id):
+    """Warm the subjects a user is likely to open after `subject_id`: its neighbours and the next random draw."""
+    prefetcher = current_app.config.get('PREFETCHER')
+    if prefetcher is None:
+        return
+    index = current_app.config.get('SUBJECT_INDEX')
+    previous_id, next_id = index.neighbors(subject_id, hr_only=True) if index is not None else (None, None)
+    cache = current_app.config.get('SERIES_CACHE')
+    store = current_app.config.get('HR_STORE')
+    # Cached and stored subjects are already fast; scheduling also cancels stale prefetches
+    prefetcher.schedule([
+        sid for sid in (next_id, previous_id, prefetcher.next_random)
+        if sid is not None and not (cache is not None and series_key(sid) in cache) and not (store is not None and sid in store)
+    ])
+
+def get_point_budget(data):
+    """Points per trace for the chart width (in pixels) reported by the client."""
+    config = current_app.config
+    return point_budget(data.get('width'), config['PLOT_POINTS_PER_PIXEL'], config['PLOT_MIN_POINTS'], config['PLOT_MAX_POINTS'])
+
+def get_table(series, interpolation_method, bin_size=0, bin_unit='points', vital='heart_rate'):
+    """Data table for a subject, vital and interpolation setting, cached server-side."""
+    if not interpolation_method or interpolation_method == 'none':
+        interpolation_method, bin_size, bin_unit = 'none', 0, 'points'
+    key = (series.subject_id, vital, interpolation_method, bin_size, bin_unit)
+    cache = current_app.config.get('TABLE_CACHE')
+    table = cache.get(key) if cache is not None else None
+    if table is None:
+        table = SeriesTable.build(
+            series, interpolation_method, bin_size=bin_size, bin_unit=bin_unit, memo=current_app.config.get('INTERP_CACHE')
+        )
+        if cache is not None:
+            cache.put(key, table)
+    return table
+
+def plot_series(series, interpolation_method, bin_size=0, bin_unit='points', max_points=None, hide_original=False, x_range=None, vital='heart_rate'):
+    """Interpolate a processed series and build its plot for the requested view.
+
+    `x_range` is the visible window in hours from the first reading; the interpolation grid
+    is evaluated only inside it and capped at `max_points`.
     """
-    Apply interpolation to the data using specified binning.
+    interpolated_values, interpolated_timestamps, binned_values, binned_timestamps = None, None, None, None
+    if interpolation_method and interpolation_method != 'none':
+        window = (x_range[0] * 3600.0, x_range[1] * 3600.0) if x_range else None
+        interpolated_values, interpolated_timestamps, binned_values, binned_timestamps = cached_interpolation(
+            current_app.config.get('INTERP_CACHE'), series.values, series.times, interpolation_method,
+            bin_size=bin_size, bin_unit=bin_unit, grid_points=max_points, window=window
+        )
+
+    return create_line_plot(
+        series.values,
+        series.times,
+        series.subject_id,
+        interpolated_values,
+        interpolated_timestamps,
+        interpolation_method,
+        bin_size=bin_size,
+        bin_unit=bin_unit,
+        hide_original_points=hide_original,
+        binned_values=binned_values,
+        binned_timestamps=binned_timestamps,
+        max_points=max_points,
+        x_range=x_range,
+        vital_label=current_app.config['VITAL_SERIES'][vital]['label'],
+        unit=current_app.config['VITAL_SERIES'][vital]['unit']
+    )
+
+def parse_load_request():
+    """Validate a load request (JSON body for POST, query string for GET).
+
     Returns:
-        interpolated_values: List of interpolated Y values
-        interpolated_timestamps: List of interpolated timestamps (strings)
-        binned_values: List of Y values used for interpolation (binned averages)
-        binned_timestamps: List of timestamps for binned points (strings)
+        tuple: (params, None) with the chosen subject and settings, or (None, error response).
     """
-    if not values or not timestamps:
-        return None, None
-    
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        data['random'] = data.get('random', '0').lower() in ('1', 'true', 'yes')
+    else:
+        data = request.get_json()
+    subject_id = data.get('subject_id')
+    is_random = data.get('random', False)
+    interpolation_method = data.get('interpolation_method', 'none')
     try:
-        # Create DataFrame to handle duplicates and sorting easily
-        df = pd.DataFrame({'val': values, 'time': pd.to_datetime(timestamps)})
-        
-        # Drop rows with missing values
-        df = df.dropna()
-        
-        if df.empty:
-            return None, None
-            
-        # Group by time and take mean to handle duplicates (interpolation requires strictly increasing x)
-        df = df.groupby('time')['val'].mean().reset_index()
-        df = df.sort_values('time')
-        
-        times = df['time']
-        start_time = times.min()
-        
-        # Calculate seconds from start
-        x = (times - start_time).dt.total_seconds().to_numpy()
-        y = df['val'].to_numpy()
-
-        # Determine query points (denser grid for visualization)
-        if len(x) < 2:
-            return values, timestamps, None, None
+        bin_size = int(data.get('bin_size', 0))
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'bin_size must be an integer.'}), 400)
+    bin_unit = data.get('bin_unit', 'points')
+    if bin_unit not in BIN_UNITS:
+        return None, (jsonify({'error': f'bin_unit must be one of {list(BIN_UNITS)}.'}), 400)
+    vital = get_vital(data)
+    if vital is None:
+        return None, vital_error()
+    
+    # Valid subject ID logic
+    available_ids = current_app.config.get('SUBJECT_IDS', [])
+    # Subjects known to have heart rate data (None if availability hasn't been indexed)
+    hr_ids = current_app.config.get('HR_SUBJECT_IDS')
+    
+    if is_random:
+        candidates = hr_ids if hr_ids is not None else available_ids
+        if not candidates:
+            return None, (jsonify({'error': 'No subject IDs available to select from.'}), 500)
+        # The prefetcher draws one subject ahead, so it can be warm before it is asked for
+        prefetcher = current_app.config.get('PREFETCHER')
+        subject_id = prefetcher.draw_random() if prefetcher is not None else random.choice(candidates)
+    else:
+        if not subject_id:
+            return None, (jsonify({'error': 'Subject ID is required.'}), 400)
+        try:
+            subject_id = int(subject_id)
+        except ValueError:
+             return None, (jsonify({'error': 'Subject ID must be a number.'}), 400)
+        
+        # Validate subject_id exists in list (if user-specified); set lookups are O(1)
+        if available_ids and subject_id not in current_app.config['SUBJECT_ID_SET']:
+             return None, (jsonify({'error': f'Subject ID {subject_id} not found in the dataset.'}), 404)
+        # Known to have no heart rate rows: answer without decoding chartevents
+        if vital == 'heart_rate' and hr_ids is not None and subject_id not in current_app.config['HR_SUBJECT_ID_SET']:
+             return None, (jsonify({'error': f'No Heart Rate (BPM) data found for subject {subject_id}.'}), 404)
 
-        # Apply Binning Logic if requested
-        x_active, y_active = x, y
-        
-        if bin_size > 0:
-            if method == 'lagrange':
-                # Lagrangian specific binning logic
-                if (len(x) / bin_size) > 20:
-                    # Use 20 evenly-spaced midpoints
-                    indices = np.linspace(0, len(x) - 1, 20, dtype=int)
-                    x_binned = []
-                    y_binned = []
-                    
-                    half_bin = bin_size // 2
-                    for idx in indices:
-                        start_idx = max(0, idx - half_bin)
-                        end_idx = min(len(x), idx + half_bin + 1) # +1 for slicing
-                        
-                        # Average the window
-                        if start_idx < end_idx:
-                            x_binned.append(np.mean(x[start_idx:end_idx]))
-                            y_binned.append(np.mean(y[start_idx:end_idx]))
-                            
-                    x_active = np.array(x_binned)
-                    y_active = np.array(y_binned)
-                else:
-                    # Standard binning behavior if not enough points for special logic
-                    # Calculate number of bins
-                    num_bins = int(np.ceil(len(x) / bin_size))
-                    x_active = []
-                    y_binned = []
-                    for i in range(num_bins):
-                        start_idx = i * bin_size
-                        end_idx = min((i + 1) * bin_size, len(x))
-                        x_active.append(np.mean(x[start_idx:end_idx]))
-                        y_binned.append(np.mean(y[start_idx:end_idx]))
-                    x_active = np.array(x_active)
-                    y_active = np.array(y_binned)
-            else:
-                 # Standard Binning for other methods
-                 num_bins = int(np.ceil(len(x) / bin_size))
-                 x_active = []
-                 y_active = []
-                 for i in range(num_bins):
-                     start_idx = i * bin_size
-                     end_idx = min((i + 1) * bin_size, len(x))
-                     x_active.append(np.mean(x[start_idx:end_idx]))
-                     y_active.append(np.mean(y[start_idx:end_idx]))
-                 x_active = np.array(x_active)
-                 y_active = np.array(y_active)
-
-        # Visualization Grid:
-        # We want a smooth line, so we need a dense grid.
-        # Ensure grid spans the range of active points
-        
-        num_points = max(200, len(x) * 5)
-        # Use active points range for grid
-        grid = np.linspace(x.min(), x.max(), num_points)
-        x_new = np.unique(np.concatenate((grid, x_active)))
-        x_new.sort()
-        
-        y_new = None
-        
-        # Method selection
-        if method == 'lagrange':
-             # Use BarycentricInterpolator
-             if len(x_active) > 20 and bin_size == 0:
-                 # Default behavior if NO binning selected but still too many points: 
-                 # Limit to 20 evenly-spaced points to prevent instability (legacy behavior)
-                 indices = np.linspace(0, len(x_active) - 1, 20, dtype=int)
-                 start_x = x_active[indices]
-                 start_y = y_active[indices]
-                 poly = BarycentricInterpolator(start_x, start_y)
-                 y_new = poly(x_new)
-             else:
-                 # Use active points (which are binned if bin_size > 0)
-                 poly = BarycentricInterpolator(x_active, y_active)
-                 y_new = poly(x_new)
-                 
-        elif method == 'cubic_spline':
-             cs = CubicSpline(x_active, y_active, bc_type='natural')
-             y_new = cs(x_new)
-        elif method == 'cubic_hermite':
-             pch = PchipInterpolator(x_active, y_active)
-             y_new = pch(x_new)
-        else:
-             return None, None, None, None
-
-        # Convert back to timestamps
-        t_new = start_time + pd.to_timedelta(x_new, unit='s')
-        t_binned = start_time + pd.to_timedelta(x_active, unit='s')
-        
-        return y_new.tolist(), t_new.strftime('%Y-%m-%d %H:%M:%S').tolist(), y_active.tolist(), t_binned.strftime('%Y-%m-%d %H:%M:%S').tolist()
+    return {
+        'subject_id': subject_id,
+        'vital': vital,
+        'random': is_random,
+        'interpolation_method': interpolation_method,
+        'bin_size': bin_size,
+        'bin_unit': bin_unit,
+        'max_points': get_point_budget(data)
+    }, None
 
-    except Exception as e:
-        print(f"Interpolation error: {e}")
-        return None, None
+def load_etag(kind, params):
+    """ETag for a load of a chosen subject; a random draw isn't a stable resource, so it gets None."""
+    if params['random']:
+        return None
+    return etag_for(
+        kind, params['subject_id'], params['vital'], params['interpolation_method'], params['bin_size'], params['bin_unit'],
+        params['max_points'], current_app.config.get('DATA_VERSION')
+    )
 
-@bpm_bp.route('/api/load-data', methods=['POST'])
+@bpm_bp.route('/api/load-data', methods=['GET', 'POST'])
 def load_data():
-    """Load and process BPM data for a subject."""
+    """Load and process BPM data for a subject.
+
+    Takes the same parameters as a JSON body (POST) or query string (GET). Responses for
+    a chosen subject carry an ETag, so revalidating an unchanged view returns 304
+    without loading or plotting the subject.
+    """
     try:
-        data = request.get_json()
-        subject_id = data.get('subject_id')
-        is_random = data.get('random', False)
-        is_random = data.get('random', False)
-        interpolation_method = data.get('interpolation_method', 'none')
-        bin_size = int(data.get('bin_size', 0))
-        
-        # Valid subject ID logic
-        available_ids = current_app.config.get('SUBJECT_IDS', [])
-        
-        if is_random:
-            if not available_ids:
-                return jsonify({'error': 'No subject IDs available to select from.'}), 500
-            subject_id = random.choice(available_ids)
-        else:
-            if not subject_id:
-                return jsonify({'error': 'Subject ID is required.'}), 400
-            try:
-                subject_id = int(subject_id)
-            except ValueError:
-                 return jsonify({'error': 'Subject ID must be a number.'}), 400
-            
-            # Optional: Validation against available list?
-            # The plan says "Validate subject_id exists in list (if user-specified)"
-            if available_ids and subject_id not in available_ids:
-                 return jsonify({'error': f'Subject ID {subject_id} not found in the dataset.'}), 404
+        params, error = parse_load_request()
+        if error:
+            return error
+        subject_id = params['subject_id']
+
+        etag = load_etag('load-data', params)
+        if etag:
+            response = not_modified(etag)
+            if response is not None:
+                return response
 
-        # Load data using File_Filter
+        # Load processed series (cached server-side per subject)
         try:
-            # "Initialize File_Filter('chartevents')"
-            ff = File_Filter("chartevents")
-            # "Call file_filter.search_subject(subject_id)"
-            df = ff.search_subject(subject_id)
+            series = get_series(subject_id, params['vital'])
+        except SeriesNotFound as e:
+            return jsonify({'error': str(e)}), 404
         except Exception as e:
             return jsonify({'error': f'Error loading data: {str(e)}'}), 500
-        
-        if df.empty:
-             return jsonify({'error': f'No data found for subject {subject_id}.'}), 404
-        
-        # Filter for BPM
-        if 'valueuom' in df.columns:
-            bpm_df = df[df['valueuom'] == 'bpm'].copy()
-        else:
-            # Fallback or check if 'itemid' corresponds to Heart Rate?
-            # Plan says "Filter rows where valueuom == 'bpm'"
-            # If column missing, empty
-            bpm_df = pd.DataFrame()
-        
-        if bpm_df.empty:
-            return jsonify({'error': f'No Heart Rate (BPM) data found for subject {subject_id}.'}), 404
-            
-        # Prepare Data
-        if 'charttime' in bpm_df.columns:
-            bpm_df['charttime'] = pd.to_datetime(bpm_df['charttime'])
-            bpm_df = bpm_df.sort_values('charttime')
-        
-        # Outlier Detection (IQR Method)
-        outliers_list = []
-        if not bpm_df.empty and len(bpm_df) > 1:
-            Q1 = bpm_df['valuenum'].quantile(0.25)
-            Q3 = bpm_df['valuenum'].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            
-            outlier_mask = (bpm_df['valuenum'] < lower_bound) | (bpm_df['valuenum'] > upper_bound)
-            outliers_df = bpm_df[outlier_mask].copy()
-            clean_df = bpm_df[~outlier_mask].copy()
-            
-            # Prepare outliers for table
-            if not outliers_df.empty:
-                o_vals = outliers_df['valuenum'].tolist()
-                o_times = outliers_df['charttime'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist()
-                for v, t in zip(o_vals, o_times):
-                    outliers_list.append({'val': v, 'time': t})
-        else:
-            clean_df = bpm_df.copy()
-
-        # Averaging Duplicates on Clean Data
-        # IMPORTANT: This averaging happens BEFORE any binning is applied.
-        # Duplicates (same timestamp) are averaged first, then binning is applied to the averaged data.
-        valuenum = []
-        charttime = []
-        point_types = []
-        
-        if not clean_df.empty:
-            # Group by charttime to average duplicates
-            grouped = clean_df.groupby('charttime')['valuenum'].agg(['mean', 'count']).reset_index()
-            grouped = grouped.sort_values('charttime')
-            
-            valuenum = grouped['mean'].tolist()
-            # If count > 1, it was averaged - mark as "Averaged" in Type column
-            point_types = ['Averaged' if c > 1 else 'Original' for c in grouped['count']]
-            charttime = grouped['charttime'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist()
-
-        # Calculate Statistics on the processed (clean + averaged) data? 
-        # Usually stats should represent the valid dataset used for analysis
-        stats = {}
-        if valuenum:
-            v_series = pd.Series(valuenum)
-            stats = {
-                'count': int(len(v_series)),
-                'mean': round(v_series.mean(), 1),
-                'median': round(v_series.median(), 1),
-                'min': round(v_series.min(), 1),
-                'max': round(v_series.max(), 1),
-                'std': round(v_series.std(), 1) if len(v_series) > 1 else 0.0
-            }
 
-        # Handle Interpolation
-        interpolated_values = None
-        interpolated_timestamps = None
-        binned_values = None
-        binned_timestamps = None
-        
-        if interpolation_method and interpolation_method != 'none':
-            interpolated_values, interpolated_timestamps, binned_values, binned_timestamps = apply_interpolation(valuenum, charttime, interpolation_method, bin_size=bin_size)
-
-        # Create Visualizations and Table Data
-        vis_data = create_line_plot(
-            valuenum, 
-            charttime, 
-            subject_id, 
-            interpolated_values, 
-            interpolated_timestamps, 
-            interpolation_method,
-            outliers=outliers_list
+        # Create Visualizations and Table Data (traces downsampled to the chart's point budget)
+        vis_data = plot_series(
+            series, params['interpolation_method'], bin_size=params['bin_size'], bin_unit=params['bin_unit'],
+            max_points=params['max_points'], vital=params['vital']
         )
         
-        return jsonify({
+        response = json_response({
             'subject_id': subject_id,
-            'raw_data': {
-                'values': valuenum, 
-                'timestamps': charttime,
-                'types': point_types,
-                'outliers': outliers_list
-            },
-            'interpolated_data': {'values': interpolated_values, 'timestamps': interpolated_timestamps} if interpolated_values else None,
-            'binned_data': {'values': binned_values, 'timestamps': binned_timestamps} if binned_values else None,
-            'interpolation_method': interpolation_method,
-            'bin_size': bin_size,
+            'vital': params['vital'],
+            'interpolation_method': params['interpolation_method'],
+            'bin_size': params['bin_size'],
+            'bin_unit': params['bin_unit'],
             'line_graph': vis_data['line_graph'],
-            'table_data': vis_data['table_data'],
-            'statistics': stats
+            'statistics': series.stats()
         })
+        prefetch_around(subject_id)
+        return with_etag(response, etag) if etag else response
     
     except Exception as e:
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+def stream_events(params):
+    """Events of a progressive load, from cheapest to most expensive (see load_data_stream)."""
+    config = current_app.config
+    subject_id = params['subject_id']
+    yield {'event': 'subject', 'subject_id': subject_id}
+
+    try:
+        series = get_series(subject_id, params['vital'])
+    except SeriesNotFound as e:
+        yield {'event': 'error', 'error': str(e)}
+        return
+
+    # Coarse overview of the whole stay: first paint
+    overview_points = min(params['max_points'], config['STREAM_OVERVIEW_POINTS'])
+    overview = plot_series(series, 'none', max_points=overview_points, vital=params['vital'])
+    yield {'event': 'overview', 'statistics': series.stats(), 'line_graph': overview['line_graph']}
+
+    # Readings at the full point budget, a stretch of the stay at a time in time order
+    n = len(series.values)
+    if n > overview_points:
+        hours = (series.times - series.times[0]) / np.timedelta64(1, 'h')
+        bounds = np.linspace(0, n, -(-n // config['STREAM_SEGMENT_POINTS']) + 1).astype(np.int64)
+        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            budget = max(3, params['max_points'] * (hi - lo) // n)
+            idx = lo + visible_indices(hours[lo:hi], series.values[lo:hi], budget)
+            yield {
+                'event': 'segment', 'index': i, 'count': len(bounds) - 1,
+                'x': hours[idx], 'y': series.values[idx], 'labels': hour_labels(hours[idx])
+            }
+
+    if params['interpolation_method'] and params['interpolation_method'] != 'none':
+        interpolated = plot_series(
+            series, params['interpolation_method'], bin_size=params['bin_size'], bin_unit=params['bin_unit'],
+            max_points=params['max_points'], hide_original=True, vital=params['vital']
+        )
+        yield {'event': 'interpolation', 'line_graph': interpolated['line_graph']}
+
+    prefetch_around(subject_id)
+    yield {'event': 'done'}
+
+@bpm_bp.route('/api/load-data/stream', methods=['GET', 'POST'])
+def load_data_stream():
+    """Load a subject progressively as newline-delimited JSON events.
+
+    Takes the same parameters as /api/load-data. Events, one JSON object per line:
+    subject (the chosen ID), overview (statistics and a coarse plot of the whole stay),
+    segment (original readings at the full point budget, in time order; each covers the
+    stay up to its last x and replaces the overview there), interpolation (the binned and
+    interpolated traces, if a method is set), then done. A failure after the stream has
+    started arrives as an error event.
+    """
+    params, error = parse_load_request()
+    if error:
+        return error
+
+    etag = load_etag('load-stream', params)
+    if etag:
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+    def generate():
+        try:
+            for event in stream_events(params):
+                yield dumps(event) + b'\n'
+        except Exception as e:
+            yield dumps({'event': 'error', 'error': f'Unexpected error: {str(e)}'}) + b'\n'
+
+    response = current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Ask reverse proxies to pass each event through as it is produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    return with_etag(response, etag) if etag else response
+
 @bpm_bp.route('/api/apply-interpolation', methods=['POST'])
 def apply_interpolation_route():
+    """Re-interpolate a loaded subject from the server-side series cache.
+
+    Expects only subject_id, vital, interpolation_method, bin_size, bin_unit and
+    hide_original_points; the series itself is never posted back by the client.
+    """
     try:
         data = request.get_json()
         subject_id = data.get('subject_id')
         interpolation_method = data.get('interpolation_method')
         bin_size = int(data.get('bin_size', 0))
+        bin_unit = data.get('bin_unit', 'points')
         hide_original = data.get('hide_original_points', False)
-        raw_data = data.get('raw_data', {})
-        
-        raw_values = raw_data.get('values', [])
-        raw_timestamps = raw_data.get('timestamps', [])
-        point_types = raw_data.get('types', [])
-        outliers = raw_data.get('outliers', [])
-        
-        if not raw_values or not raw_timestamps:
-             return jsonify({'error': 'Raw data missing'}), 400
-             
-        interpolated_values, interpolated_timestamps, binned_values, binned_timestamps = apply_interpolation(raw_values, raw_timestamps, interpolation_method, bin_size=bin_size)
+        vital = get_vital(data)
+
+        if bin_unit not in BIN_UNITS:
+            return jsonify({'error': f'bin_unit must be one of {list(BIN_UNITS)}.'}), 400
+        if vital is None:
+            return vital_error()
         
-        vis_data = create_line_plot(
-            raw_values, 
-            raw_timestamps, 
-            subject_id, 
-            interpolated_values, 
-            interpolated_timestamps, 
+        try:
+            subject_id = int(subject_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Subject ID must be a number.'}), 400
+
+        try:
+            series = get_series(subject_id, vital)
+        except SeriesNotFound as e:
+            return jsonify({'error': str(e)}), 404
+
+        vis_data = plot_series(
+            series,
             interpolation_method,
-            point_types=point_types,
-            outliers=outliers,
             bin_size=bin_size,
-            hide_original_points=hide_original,
-            binned_values=binned_values,
-            binned_timestamps=binned_timestamps
+            bin_unit=bin_unit,
+            max_points=get_point_budget(data),
+            hide_original=hide_original,
+            vital=vital
         )
         
-        return jsonify({
-            'line_graph': vis_data['line_graph'],
-            'table_data': vis_data['table_data'],
-            'interpolated_data': {'values': interpolated_values, 'timestamps': interpolated_timestamps} if interpolated_values else None
+        return json_response({
+            'line_graph': vis_data['line_graph']
         })
         
     except Exception as e:
         return jsonify({'error': f'Error applying interpolation: {str(e)}'}), 500
 
+@bpm_bp.route('/api/zoom', methods=['POST'])
+def zoom():
+    """Redraw a loaded subject for the visible time window.
+
+    Expects subject_id, vital, x_start and x_end (hours from the first reading; omit both
+    for the whole stay), the chart width and the current interpolation settings. Points
+    inside the window come back at full resolution whenever they fit the point budget.
+    """
+    try:
+        data = request.get_json()
+        interpolation_method = data.get('interpolation_method', 'none')
+        bin_size = int(data.get('bin_size', 0))
+        bin_unit = data.get('bin_unit', 'points')
+        hide_original = data.get('hide_original_points', False)
+        vital = get_vital(data)
+
+        if bin_unit not in BIN_UNITS:
+            return jsonify({'error': f'bin_unit must be one of {list(BIN_UNITS)}.'}), 400
+        if vital is None:
+            return vital_error()
+
+        try:
+            subject_id = int(data.get('subject_id'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Subject ID must be a number.'}), 400
+
+        x_range = None
+        if data.get('x_start') is not None and data.get('x_end') is not None:
+            try:
+                x_range = (float(data['x_start']), float(data['x_end']))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'x_start and x_end must be numbers.'}), 400
+            if x_range[0] >= x_range[1]:
+                return jsonify({'error': 'x_start must be before x_end.'}), 400
+
+        try:
+            series = get_series(subject_id, vital)
+        except SeriesNotFound as e:
+            return jsonify({'error': str(e)}), 404
+
+        vis_data = plot_series(
+            series,
+            interpolation_method,
+            bin_size=bin_size,
+            bin_unit=bin_unit,
+            max_points=get_point_budget(data),
+            hide_original=hide_original,
+            x_range=x_range,
+            vital=vital
+        )
+
+        return json_response({
+            'line_graph': vis_data['line_graph'],
+            'x_range': x_range
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Error zooming: {str(e)}'}), 500
+
+@bpm_bp.route('/api/table', methods=['GET'])
+def table():
+    """One page of the data table for a loaded subject.
+
+    Query parameters: subject_id, vital, interpolation_method, bin_size, bin_unit (the
+    table's interpolation setting), sort (hours, bpm, bin_avg or type), order (asc or desc),
+    type (comma-separated row types to keep), cursor (from the previous page's
+    next_cursor) and limit.
+    """
+    try:
+        args = request.args
+        interpolation_method = args.get('interpolation_method', 'none')
+        sort = args.get('sort', 'hours')
+        order = args.get('order', 'asc')
+        bin_unit = args.get('bin_unit', 'points')
+        types = [t for t in args.get('type', '').split(',') if t]
+        vital = get_vital(args)
+        if vital is None:
+            return vital_error()
+
+        try:
+            subject_id = int(args.get('subject_id'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Subject ID must be a number.'}), 400
+        try:
+            bin_size = int(args.get('bin_size', 0))
+            cursor = int(args.get('cursor', 0))
+            limit = int(args.get('limit', 100))
+        except ValueError:
+            return jsonify({'error': 'bin_size, cursor and limit must be integers.'}), 400
+
+        if bin_unit not in BIN_UNITS:
+            return jsonify({'error': f'bin_unit must be one of {list(BIN_UNITS)}.'}), 400
+        if sort not in SORT_COLUMNS:
+            return jsonify({'error': f'sort must be one of {list(SORT_COLUMNS)}.'}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': "order must be 'asc' or 'desc'."}), 400
+        if any(t not in ROW_TYPES for t in types):
+            return jsonify({'error': f'type must be a comma-separated list of {list(ROW_TYPES)}.'}), 400
+        if cursor < 0 or not 0 < limit <= PAGE_LIMIT_MAX:
+            return jsonify({'error': f'cursor must be >= 0 and limit between 1 and {PAGE_LIMIT_MAX}.'}), 400
+
+        etag = etag_for('table', subject_id, vital, interpolation_method, bin_size, bin_unit, sort, order, sorted(types), cursor, limit, current_app.config.get('DATA_VERSION'))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        try:
+            series = get_series(subject_id, vital)
+        except SeriesNotFound as e:
+            return jsonify({'error': str(e)}), 404
+
+        rows, next_cursor, total = get_table(series, interpolation_method, bin_size, bin_unit, vital).page(
+            sort=sort, descending=order == 'desc', types=types, cursor=cursor, limit=limit
+        )
+        return with_etag(jsonify({'rows': rows, 'next_cursor': next_cursor, 'total': total}), etag)
+
+    except Exception as e:
+        return jsonify({'error': f'Error loading table: {str(e)}'}), 500
+
+@bpm_bp.route('/api/compare', methods=['POST'])
+def compare():
+    """Heart rate of several subjects on one shared time axis.
+
+    Expects subject_ids (a list) and the chart width. Subjects missing from the cache are
+    read from chartevents together in one offset-ordered pass. Each one is cleaned on the
+    BATCH_EXECUTOR thread pool while the read continues, which overlaps decompression
+    (it releases the GIL) with cleaning; the cleaning itself is GIL-bound, so subjects
+    are not cleaned in parallel with each other.
+    Each series is averaged onto a common grid of hours from that subject's first reading,
+    sized to the point budget; per-subject statistics come back alongside. Subjects that
+    can't be loaded are reported in `errors` instead of failing the request.
+
+    API only: no template calls this endpoint yet.
+    """
+    try:
+        data = request.get_json()
+        subject_ids = data.get('subject_ids')
+        max_subjects = current_app.config['COMPARE_MAX_SUBJECTS']
+
+        if not isinstance(subject_ids, list) or not subject_ids:
+            return jsonify({'error': 'subject_ids must be a non-empty list.'}), 400
+        if len(subject_ids) > max_subjects:
+            return jsonify({'error': f'At most {max_subjects} subjects can be compared at once.'}), 400
+        try:
+            subject_ids = list(dict.fromkeys(int(sid) for sid in subject_ids))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Subject IDs must be numbers.'}), 400
+
+        errors = {}
+        id_set = current_app.config.get('SUBJECT_ID_SET')
+        hr_set = current_app.config.get('HR_SUBJECT_ID_SET')
+        to_load = []
+        for subject_id in subject_ids:
+            if id_set and subject_id not in id_set:
+                errors[subject_id] = f'Subject ID {subject_id} not found in the dataset.'
+            elif hr_set is not None and subject_id not in hr_set:
+                errors[subject_id] = f'No Heart Rate (BPM) data found for subject {subject_id}.'
+            else:
+                to_load.append(subject_id)
+
+        loaded = load_series_batch(
+            to_load,
+            hr_itemids=current_app.config.get('HEART_RATE_ITEMIDS', []),
+            cache=current_app.config.get('SERIES_CACHE'),
+            store=current_app.config.get('HR_STORE'),
+            executor=current_app.config.get('BATCH_EXECUTOR'),
+            outliers=current_app.config.get('OUTLIERS')
+        )
+        series_list = []
+        for subject_id in to_load:
+            result = loaded[subject_id]
+            if isinstance(result, Exception):
+                errors[subject_id] = str(result)
+            else:
+                series_list.append(result)
+
+        hours = [(s.times - s.times[0]) / np.timedelta64(1, 'h') for s in series_list]
+        grid_hours, aligned, bin_minutes = align_to_grid(hours, [s.values for s in series_list], get_point_budget(data))
+
+        return json_response({
+            'hours': grid_hours,
+            'bin_minutes': bin_minutes,
+            'series': [
+                {'subject_id': s.subject_id, 'values': row, 'statistics': s.stats()}
+                for s, row in zip(series_list, aligned)
+            ],
+            'errors': {str(k): v for k, v in errors.items()}
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Error comparing subjects: {str(e)}'}), 500
+
 @bpm_bp.route('/api/save-graph', methods=['POST'])
 def save_graph():
     try:
@@ -395,53 +621,45 @@ def save_graph():
         print(f"Save error: {e}")
         return jsonify({'error': f'Error saving graph: {str(e)}'}), 500
 
-def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values=None, interpolated_timestamps=None, method=None, point_types=None, outliers=None, bin_size=0, hide_original_points=False, binned_values=None, binned_timestamps=None):
-    """Generate Plotly JSON for Line Graph with relative time axes and generate table data."""
+def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values=None, interpolated_timestamps=None, method=None, bin_size=0, hide_original_points=False, binned_values=None, binned_timestamps=None, bin_unit='points', max_points=None, x_range=None, vital_label='Heart Rate', unit='BPM'):
+    """Generate Plotly JSON for Line Graph with relative time axes.
+
+    Each trace is restricted to `x_range` (hours from start) when given and downsampled
+    with LTTB to at most `max_points` points. The data table is served by /api/table.
+    `vital_label` and `unit` title the chart and label values. Timestamps are datetime64
+    arrays (as in ProcessedSeries and interpolation results).
+    """
+    bin_label = f"{bin_size} min" if bin_unit == 'minutes' else f"n={bin_size}"
+    has_interpolation = interpolated_values is not None and len(interpolated_values) > 0
+    has_bins = binned_values is not None and len(binned_values) > 0 and bin_size > 0
     
-    # Helper to calculate relative times
-    def get_relative_data(timestamps, start_time):
-        if not timestamps:
-            return [], []
-        
-        # Convert to datetime if not already
-        ts = pd.to_datetime(timestamps)
-        
-        # Calculate elapsed hours
-        # ts - start_time returns a TimedeltaIndex, which supports total_seconds() directly
-        elapsed_seconds = (ts - start_time).total_seconds()
-        elapsed_hours = elapsed_seconds / 3600.0
-        
-        # Create formatted strings: "Day X, Y.Yh"
-        # Day 1 starts at 0h. 
-        days = (elapsed_hours // 24).astype(int) + 1
-        formatted = [f"Day {d}, {h:.1f}h" for d, h in zip(days, elapsed_hours)]
-        
-        return elapsed_hours.tolist(), formatted
+    # Helper to calculate elapsed hours of datetime64 timestamps
+    def get_hours(timestamps, start_time):
+        if timestamps is None or len(timestamps) == 0:
+            return np.array([])
+        return (np.asarray(timestamps) - start_time) / np.timedelta64(1, 'h')
+
+    # Helper to select the drawn points of a trace: visible window, then LTTB to the budget
+    def get_visible_data(timestamps, values, start_time):
+        elapsed_hours = get_hours(timestamps, start_time)
+        values = np.asarray(values, dtype=np.float64)
+        idx = visible_indices(elapsed_hours, values, max_points, x_range)
+        return elapsed_hours[idx], values[idx], hour_labels(elapsed_hours[idx])
 
     # Establish global start time from raw data
-    raw_ts_dt = pd.to_datetime(raw_timestamps)
-    if raw_ts_dt.empty:
-        return {'line_graph': {}, 'table_data': []}
+    if len(raw_timestamps) == 0:
+        return {'line_graph': {}}
         
-    start_time = raw_ts_dt.min()
+    start_time = np.asarray(raw_timestamps).min()
     
     # Process Raw Data
-    raw_hours, raw_labels = get_relative_data(raw_timestamps, start_time)
+    plot_hours, plot_values, plot_labels = get_visible_data(raw_timestamps, raw_values, start_time)
     
     # Process Interpolated Data
-    interp_hours, interp_labels = [], []
-    if interpolated_values and interpolated_timestamps:
-        interp_hours, interp_labels = get_relative_data(interpolated_timestamps, start_time)
-
-    # Theme Colors
-    BG_COLOR = '#111827'
-    TEXT_PRIMARY = '#F9FAFB'
-    TEXT_SECONDARY = '#9CA3AF'
-    GRID_COLOR = '#374151'
-    SPINE_COLOR = '#D1D5DB'
-    PRIMARY_COLOR = '#2563EB' 
-    ACCENT_COLOR = '#10B981' 
-    
+    interp_hours, interp_values, interp_labels = [], [], []
+    if has_interpolation:
+        interp_hours, interp_values, interp_labels = get_visible_data(interpolated_timestamps, interpolated_values, start_time)
+
     common_layout = dict(
         autosize=True,
         paper_bgcolor=BG_COLOR,
@@ -455,7 +673,6 @@ def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values
             linewidth=0.8,
             tickcolor=SPINE_COLOR,
             tickfont=dict(size=10, color=TEXT_SECONDARY),
-            title_font=dict(size=12, family="sans-serif", weight="bold"),
             zeroline=False
         ),
         yaxis=dict(
@@ -464,59 +681,58 @@ def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values
             linecolor=SPINE_COLOR,
             linewidth=0.8,
             tickcolor=SPINE_COLOR,
-            tickfont=dict(size=10, color=TEXT_SECONDARY),
-            title_font=dict(size=12, family="sans-serif", weight="bold")
+            tickfont=dict(size=10, color=TEXT_SECONDARY)
         )
     )
 
-    # Line Graph
-    line_fig = go.Figure()
+    # Line Graph (Plotly JSON spec, built without go.Figure validation)
+    traces = []
 
     # Trace 1: Original Data
     if not hide_original_points:
-        mode = 'markers' if interpolated_values else 'lines+markers'
+        mode = 'markers' if has_interpolation else 'lines+markers'
         
-        line_fig.add_trace(go.Scatter(
-            x=raw_hours,
-            y=raw_values,
+        traces.append(scatter(
+            x=plot_hours,
+            y=plot_values,
             mode=mode,
             name='Original Data',
-            customdata=raw_labels,
-            hovertemplate='%{customdata}<br>BPM: %{y:.1f}<extra></extra>',
+            customdata=plot_labels,
+            hovertemplate=f'%{{customdata}}<br>{unit}: %{{y:.1f}}<extra></extra>',
             marker=dict(color=PRIMARY_COLOR, size=8),
             line=dict(color=PRIMARY_COLOR, width=2)
         ))
 
     # Trace: Binned Data (if active)
-    if binned_values and bin_size > 0:
-        binned_hours, binned_labels = get_relative_data(binned_timestamps, start_time)
-        line_fig.add_trace(go.Scatter(
+    if has_bins:
+        binned_hours, binned_plot_values, binned_labels = get_visible_data(binned_timestamps, binned_values, start_time)
+        traces.append(scatter(
             x=binned_hours,
-            y=binned_values,
+            y=binned_plot_values,
             mode='markers',
-            name=f'Bin Average (n={bin_size})',
+            name=f'Bin Average ({bin_label})',
             customdata=binned_labels,
-            hovertemplate='%{customdata}<br>Avg BPM: %{y:.1f}<extra></extra>',
-            marker=dict(color='#8B5CF6', size=10, symbol='diamond'), # Violet
+            hovertemplate=f'%{{customdata}}<br>Avg {unit}: %{{y:.1f}}<extra></extra>',
+            marker=dict(color=BIN_COLOR, size=10, symbol='diamond'),
         ))
 
     # Trace 2: Interpolated Data
-    if interpolated_values and interpolated_timestamps:
+    if has_interpolation:
         label = f"Interpolated ({method})"
-        line_fig.add_trace(go.Scatter(
+        traces.append(scatter(
             x=interp_hours,
-            y=interpolated_values,
+            y=interp_values,
             mode='lines',
             name=label,
             customdata=interp_labels,
-            hovertemplate='%{customdata}<br>BPM: %{y:.1f}<extra></extra>',
+            hovertemplate=f'%{{customdata}}<br>{unit}: %{{y:.1f}}<extra></extra>',
             line=dict(color=ACCENT_COLOR, width=3)
         ))
     
     line_layout = common_layout.copy()
-    title_text = f"Heart Rate Over Time (Subject {subject_id})"
+    title_text = f"{vital_label} Over Time (Subject {subject_id})"
     if bin_size > 0:
-        title_text += f" - Bin Size: {bin_size}"
+        title_text += f" - Bin Size: {bin_size} min" if bin_unit == 'minutes' else f" - Bin Size: {bin_size}"
         
     line_layout['title'] = dict(
         text=title_text,
@@ -524,9 +740,12 @@ def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values
         font=dict(size=18, family="sans-serif", weight="bold")
     )
     line_layout['xaxis'] = common_layout['xaxis'].copy()
-    line_layout['xaxis']['title'] = "Time (Hours from Start)"
+    axis_title_font = dict(size=12, family="sans-serif", weight="bold")
+    line_layout['xaxis']['title'] = dict(text="Time (Hours from Start)", font=axis_title_font)
+    if x_range is not None:
+        line_layout['xaxis']['range'] = list(x_range)
     line_layout['yaxis'] = common_layout['yaxis'].copy()
-    line_layout['yaxis']['title'] = "BPM"
+    line_layout['yaxis']['title'] = dict(text=unit, font=axis_title_font)
     line_layout['legend'] = dict(
         orientation="v",
         yanchor="top",
@@ -534,63 +753,9 @@ def create_line_plot(raw_values, raw_timestamps, subject_id, interpolated_values
         xanchor="right",
         x=0.98,
         bgcolor="rgba(17, 24, 39, 0.7)", # Semi-transparent dark bg
-        bordercolor="#374151",
+        bordercolor=GRID_COLOR,
         borderwidth=1,
         font=dict(size=11)
     )
     
-    line_fig.update_layout(**line_layout)
-    
-    
-    # Prepare Table Data
-    table_rows = []
-    
-    # helper for constructing row
-    def add_row(t_str, h, val, type_str, bin_avg=None):
-        table_rows.append({
-            'time': t_str,
-            'hours': h,
-            'bpm': val,
-            'type': type_str,
-            'bin_avg': bin_avg
-        })
-    
-    # Original / Averaged Data
-    # point_types might be None if coming from old context, default to Original
-    if point_types is None:
-        point_types = ['Original'] * len(raw_values)
-
-    # Note: If hide_original_points is True, they are hidden from GRAPH, but probably should remain in TABLE or at least valid data.
-    # The Plan doesn't specify hiding them from the table, but the table now has "Bin Average" column.
-    
-    for t_str, h, val, p_type in zip(raw_labels, raw_hours, raw_values, point_types):
-        add_row(t_str, h, val, p_type)
-
-    # Add Bin Average entries
-    if binned_values and bin_size > 0:
-        binned_hours, binned_labels = get_relative_data(binned_timestamps, start_time)
-        for t_str, h, val in zip(binned_labels, binned_hours, binned_values):
-            add_row(t_str, h, val, "Bin Average", bin_avg=val)
-
-    # Outliers
-    # We need to calculate relative time for outliers too
-    if outliers:
-        o_vals = [o['val'] for o in outliers]
-        o_times = [o['time'] for o in outliers]
-        o_hours, o_labels = get_relative_data(o_times, start_time)
-        
-        for t_str, h, val in zip(o_labels, o_hours, o_vals):
-            add_row(t_str, h, val, "Outlier")
-
-    # Interpolated Data - ONLY if requested
-    if interpolated_values:
-         for t_str, h, val in zip(interp_labels, interp_hours, interpolated_values):
-            add_row(t_str, h, val, f'Interpolated ({method})')
-            
-    # Sort by time
-    table_rows.sort(key=lambda x: x['hours'])
-    
-    return {
-        'line_graph': json.loads(json.dumps(line_fig, cls=plotly.utils.PlotlyJSONEncoder)),
-        'table_data': table_rows
-    }
+    return {'line_graph': figure(traces, line_layout)}
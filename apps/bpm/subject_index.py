@@ -0,0 +1,69 @@
+"""Subject ID search for the BPM Flask Application.
+
+Subject IDs are kept as a sorted integer array. A typed prefix maps to one contiguous
+ID range per possible ID length (prefix "1000" covers 10000000-10009999 among 8-digit
+IDs), so each search is a few binary searches regardless of how many subjects exist.
+"""
+
+import numpy as np
+
+SEARCH_LIMIT_MAX = 100
+
+
+class SubjectIndex:
+    """Sorted subject IDs with prefix search; optionally restricted to subjects with heart rate."""
+
+    def __init__(self, subject_ids, hr_subject_ids=None):
+        self.ids = np.unique(np.asarray(subject_ids, dtype=np.int64))
+        self.hr_ids = np.unique(np.asarray(hr_subject_ids, dtype=np.int64)) if hr_subject_ids is not None else None
+        self.max_digits = len(str(int(self.ids.max()))) if len(self.ids) else 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _ranges(self, ids, prefix):
+        """(lo, hi) index ranges of `ids` whose decimal form starts with `prefix`."""
+        value, digits = int(prefix), len(prefix)
+        ranges = []
+        for length in range(digits, self.max_digits + 1):
+            scale = 10 ** (length - digits)
+            # IDs of this length can't have leading zeros
+            low = max(value * scale, 10 ** (length - 1) if length > 1 else 0)
+            high = (value + 1) * scale
+            if low >= high:
+                continue
+            lo, hi = np.searchsorted(ids, [low, high])
+            if hi > lo:
+                ranges.append((int(lo), int(hi)))
+        return ranges
+
+    def neighbors(self, subject_id, hr_only=False):
+        """(previous, next) subject IDs around `subject_id`, None past either end."""
+        ids = self.hr_ids if hr_only and self.hr_ids is not None else self.ids
+        lo, hi = np.searchsorted(ids, [subject_id, subject_id + 1])
+        previous_id = int(ids[lo - 1]) if lo > 0 else None
+        next_id = int(ids[hi]) if hi < len(ids) else None
+        return previous_id, next_id
+
+    def search(self, prefix, limit=20, hr_only=False):
+        """
+        Subject IDs starting with the digits in `prefix`, smallest first.
+
+        Returns:
+            tuple: (ids, total) - at most `limit` IDs and the number of matches.
+        """
+        ids = self.hr_ids if hr_only and self.hr_ids is not None else self.ids
+        if not prefix:
+            return ids[:limit].tolist(), len(ids)
+        if not prefix.isdigit() or prefix.startswith('0'):
+            return [], 0
+
+        ranges = self._ranges(ids, prefix)
+        total = sum(hi - lo for lo, hi in ranges)
+        # Shorter IDs sort before longer ones, so ranges are already in ascending order
+        results = []
+        for lo, hi in ranges:
+            results.extend(ids[lo:min(hi, lo + limit - len(results))].tolist())
+            if len(results) >= limit:
+                break
+        return results, total
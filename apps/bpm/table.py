@@ -0,0 +1,130 @@
+"""Server-side data table for the BPM Flask Application.
+
+The table of readings, bin averages, outliers and interpolated points for one subject
+and interpolation setting is held as columnar NumPy arrays, cached, and served a page
+at a time, sorted and filtered on the server.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .interpolation import cached_interpolation
+
+# Row types; equal times keep this order, as the table always listed them
+ROW_TYPES = ('original', 'averaged', 'bin_average', 'outlier', 'interpolated')
+TYPE_LABELS = {'original': 'Original', 'averaged': 'Averaged', 'bin_average': 'Bin Average', 'outlier': 'Outlier'}
+SORT_COLUMNS = ('hours', 'bpm', 'bin_avg', 'type')
+PAGE_LIMIT_MAX = 1000
+
+
+def hour_labels(elapsed_hours):
+    """Format elapsed hours as "Day X, Y.Yh" (Day 1 starts at 0h)."""
+    days = (elapsed_hours // 24).astype(int) + 1
+    return [f"Day {d}, {h:.1f}h" for d, h in zip(days, elapsed_hours)]
+
+
+class SeriesTable:
+    """Columnar table rows for one subject, sorted by time.
+
+    Sorted views are computed once per (column, direction) and kept; filtering by
+    type and slicing a page are vectorized over them.
+    """
+
+    def __init__(self, hours, bpm, bin_avg, types, method=None):
+        order = np.argsort(hours, kind='stable')
+        self.hours = hours[order]
+        self.bpm = bpm[order]
+        self.bin_avg = bin_avg[order]
+        self.types = types[order]
+        self.type_names = [TYPE_LABELS.get(t, f'Interpolated ({method})') for t in ROW_TYPES]
+        self._views = {}
+
+    @property
+    def nbytes(self):
+        # Includes room for every sorted view, so the size doesn't change while cached
+        views = len(self.hours) * np.dtype(np.intp).itemsize * len(SORT_COLUMNS) * 2
+        return sum(a.nbytes for a in (self.hours, self.bpm, self.bin_avg, self.types)) + views
+
+    def __len__(self):
+        return len(self.hours)
+
+    @classmethod
+    def build(cls, series, method='none', bin_size=0, bin_unit='points', memo=None):
+        """Build the table for a ProcessedSeries, interpolating it if `method` is set (memoized in `memo`)."""
+        start_time = pd.Timestamp(series.times.min()) if len(series.times) else None
+        parts = []
+
+        def add(times, values, type_codes, with_bin_avg=False):
+            if times is None or len(times) == 0:
+                return
+            values = np.asarray(values, dtype=np.float64)
+            elapsed = np.asarray((pd.to_datetime(times) - start_time).total_seconds()) / 3600.0
+            parts.append((
+                elapsed,
+                values,
+                values if with_bin_avg else np.full(len(values), np.nan),
+                np.broadcast_to(np.asarray(type_codes, dtype=np.int8), len(values))
+            ))
+
+        if start_time is not None:
+            add(series.times, series.values, np.where(series.averaged, ROW_TYPES.index('averaged'), ROW_TYPES.index('original')))
+
+            interpolated_values, interpolated_timestamps = None, None
+            if method and method != 'none':
+                interpolated_values, interpolated_timestamps, binned_values, binned_timestamps = cached_interpolation(
+                    memo, series.values, series.times, method, bin_size=bin_size, bin_unit=bin_unit
+                )
+                if binned_values is not None and len(binned_values) and bin_size > 0:
+                    add(binned_timestamps, binned_values, ROW_TYPES.index('bin_average'), with_bin_avg=True)
+
+            add(series.outlier_times, series.outlier_values, ROW_TYPES.index('outlier'))
+            if interpolated_values is not None and len(interpolated_values):
+                add(interpolated_timestamps, interpolated_values, ROW_TYPES.index('interpolated'))
+
+        if not parts:
+            empty = np.empty(0)
+            return cls(empty, empty, empty, np.empty(0, dtype=np.int8), method)
+        return cls(*(np.concatenate(column) for column in zip(*parts)), method=method)
+
+    def _view(self, sort, descending):
+        """Row order for a sort column and direction (NaN bin averages always last)."""
+        key = (sort, descending)
+        if key not in self._views:
+            column = self.types if sort == 'type' else getattr(self, sort)
+            column = column.astype(np.float64)
+            self._views[key] = np.argsort(-column if descending else column, kind='stable')
+        return self._views[key]
+
+    def page(self, sort='hours', descending=False, types=None, cursor=0, limit=100):
+        """
+        Returns one page of rows.
+
+        Args:
+            sort (str): One of SORT_COLUMNS.
+            descending (bool): Sort direction.
+            types (list): Row types (from ROW_TYPES) to keep; all if empty.
+            cursor (int): Position in the sorted, filtered rows to start from.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            tuple: (rows, next_cursor, total), where next_cursor is None on the last page.
+        """
+        view = self._view(sort, descending)
+        if types:
+            view = view[np.isin(self.types[view], [ROW_TYPES.index(t) for t in types])]
+
+        idx = view[cursor:cursor + limit]
+        hours = self.hours[idx]
+        bin_avg = self.bin_avg[idx]
+        rows = [
+            {
+                'time': label,
+                'hours': h,
+                'bpm': b,
+                'type': self.type_names[t],
+                'bin_avg': None if np.isnan(a) else a
+            }
+            for label, h, b, t, a in zip(hour_labels(hours), hours.tolist(), self.bpm[idx].tolist(), self.types[idx].tolist(), bin_avg.tolist())
+        ]
+        next_cursor = cursor + len(idx) if cursor + len(idx) < len(view) else None
+        return rows, next_cursor, len(view)
@@ -3,6 +3,23 @@
 from flask import Flask
 from config.base_config import Config as BaseConfig
 from .routes import data_bp
+from .streaming import HAS_PYARROW
+from utils.analysis.cohort_extract import infer_schema
+from utils.analysis.filters.file_filter import get_file_filter
+
+
+def init_file_filters(app):
+    """Load the lookup tables, gzip handles and bulk Arrow schemas of PRELOAD_TABLES."""
+    schemas = app.config.setdefault('TABLE_SCHEMAS', {})
+    for table in app.config.get('PRELOAD_TABLES', ()):
+        try:
+            ff = get_file_filter(table)
+            if ff.header:
+                ff.open()
+                if HAS_PYARROW:
+                    schemas[table] = infer_schema(ff)
+        except Exception as e:
+            print(f"[Data App] Could not preload {table}: {e}")
 
 
 def create_data_app():
@@ -19,5 +36,7 @@ def create_data_app():
     
     # Register blueprint
     app.register_blueprint(data_bp)
+
+    init_file_filters(app)
     
     return app
@@ -2,6 +2,7 @@
 
 import os
 from config.base_config import Config as BaseConfig
+from utils.analysis.filtering import IDs
 
 
 class Config(BaseConfig):
@@ -13,3 +14,16 @@ class Config(BaseConfig):
     
     # ==================== App-Specific Static Path ====================
     STATIC_FOLDER = os.path.join(os.path.dirname(__file__), 'static')
+
+    # ==================== Retrieval API ====================
+    # Tables served by /subjects/<id>/<table>
+    TABLES = tuple(IDs)
+    # Tables whose lookup table and gzip handle are loaded at startup (and in every
+    # worker with --workers), so the first request doesn't pay for them
+    PRELOAD_TABLES = ('chartevents',)
+    # Columns time windows apply to, in order of preference
+    TIME_COLUMNS = ('charttime', 'starttime', 'storetime')
+    # Rows per encoded chunk (CSV/NDJSON) or record batch (Arrow) of a streamed response
+    CHUNK_ROWS = 50_000
+    # Maximum subjects per /bulk/<table> request
+    BULK_MAX_SUBJECTS = 10_000
@@ -1,11 +1,288 @@
-"""Routes for the Data Flask Application."""
+"""Routes for the Data Flask Application.
 
-from flask import Blueprint
+A retrieval service over the indexed MIMIC-IV tables: the server keeps the lookup table
+and a gzip handle per table open, so clients pull a subject's rows over HTTP instead of
+each loading indexes themselves.
+
+    GET /tables                           tables served, with their columns and time column
+    GET /subjects/<id>/<table>            a subject's rows of one table
+    GET|POST /bulk/<table>                many subjects' rows of one table as one Arrow IPC stream
+
+Query parameters of /subjects/<id>/<table>:
+    columns    comma-separated columns to return (default: all)
+    itemid     comma-separated itemids to keep (repeatable)
+    start/end  time window on the table's time column (inclusive, any pandas timestamp)
+    labels     1 to append d_items label/category/unit columns
+    format     csv, ndjson or arrow (default: from the Accept header, else csv)
+
+/bulk/<table> takes the same filters plus `subject_ids`, in the query string or a JSON
+body. Its columns have one fixed type per table (inferred once from the head of the
+file), so streams for different subject lists concatenate cleanly. Text columns keep
+their source text, and columns known to mix numbers and text (`text_columns` in IDs,
+e.g. chartevents.value) are text from the start. A column inferred as numeric that turns
+out to hold text anyway is never nulled: the stream is aborted, and the worker serves
+the column as text from then on.
+"""
+
+import pandas as pd
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from werkzeug.datastructures import MultiDict
+
+from utils.analysis.cohort_extract import SchemaMismatchError, conform_to_schema, infer_schema, text_columns
+from utils.analysis.filtering import IDs
+from utils.analysis.filters.file_filter import get_file_filter
+from .streaming import (
+    HAS_PYARROW, MIMETYPES, arrow_stream_chunks, arrow_table, coalesce_tables, csv_chunks, format_for, ndjson_chunks
+)
+
+if HAS_PYARROW:
+    import pyarrow as pa
 
 data_bp = Blueprint('data', __name__)
 
+# Text form of chart times in the source files; ISO order makes string comparison chronological
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class QueryError(ValueError):
+    """Invalid query parameters; reported to the client with a 400."""
+
+
+def available_filter(table):
+    """The File_Filter of a table this server serves and has on disk, else None."""
+    if table not in IDs or table not in current_app.config['TABLES']:
+        return None
+    ff = get_file_filter(table)
+    return ff if ff.header else None
+
+
+def time_column(ff):
+    """The column time windows apply to (first of TIME_COLUMNS in the header), or None."""
+    return next((col for col in current_app.config['TIME_COLUMNS'] if col in ff.header), None)
+
+
+def parse_list(args, name, cast=str):
+    """Values of a comma-separated and/or repeated parameter."""
+    values = [v.strip() for raw in args.getlist(name) for v in str(raw).split(',') if v.strip()]
+    try:
+        return [cast(v) for v in values]
+    except ValueError:
+        raise QueryError(f"Invalid value in '{name}': {', '.join(values)}")
+
+
+def parse_time(args, name):
+    """A window bound as text comparable with the source's chart times, or None."""
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return pd.Timestamp(value).strftime(TIME_FORMAT)
+    except ValueError:
+        raise QueryError(f"Invalid timestamp for '{name}': {value}")
+
+
+def request_args():
+    """Parameters of a request: the query string, or a JSON body (lists become repeated values)."""
+    if request.method != 'POST':
+        return request.args
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise QueryError('Expected a JSON object body.')
+    return MultiDict([
+        (key, item) for key, value in data.items()
+        for item in (value if isinstance(value, list) else [value])
+    ])
+
+
+def parse_query(args):
+    """The row filters of a retrieval request (shared by every table)."""
+    return {
+        'columns': parse_list(args, 'columns'),
+        'itemids': parse_list(args, 'itemid', int),
+        'start': parse_time(args, 'start'),
+        'end': parse_time(args, 'end'),
+        'labels': str(args.get('labels', '0')).lower() in ('1', 'true', 'yes'),
+    }
+
+
+def check_query(ff, query):
+    """Validate a query against a table's columns; returns the output columns."""
+    available = list(ff.header)
+    if query['labels'] and ff.metadata.get('dictionary'):
+        available += [col for col in ('label', 'category', 'unitname') if col not in available]
+    unknown = [col for col in query['columns'] if col not in available]
+    if unknown:
+        raise QueryError(f"Unknown columns for {ff.file_id}: {', '.join(unknown)}")
+    if query['itemids'] and 'itemid' not in ff.header:
+        raise QueryError(f"{ff.file_id} has no itemid column")
+    if (query['start'] or query['end']) and time_column(ff) is None:
+        raise QueryError(f"{ff.file_id} has no time column to window on")
+    return query['columns'] or available
+
+
+def select_rows(ff, df, query, columns):
+    """Apply itemid and time-window filters and the column selection to a subject's rows."""
+    mask = pd.Series(True, index=df.index)
+    if query['itemids']:
+        mask &= df['itemid'].isin(query['itemids'])
+    time_col = time_column(ff)
+    if query['start']:
+        mask &= df[time_col] >= query['start']
+    if query['end']:
+        mask &= df[time_col] <= query['end']
+    df = df[mask] if not mask.all() else df
+    if query['labels']:
+        df = ff.add_labels(df)
+    return df[columns]
+
+
+def table_schema(ff):
+    """The fixed Arrow schema of a table, inferred on first use and kept for the process."""
+    schemas = current_app.config.setdefault('TABLE_SCHEMAS', {})
+    if ff.file_id not in schemas:
+        string_columns = current_app.config.setdefault('TABLE_STRING_COLUMNS', {}).get(ff.file_id, ())
+        schemas[ff.file_id] = infer_schema(ff, string_columns=string_columns)
+    return schemas[ff.file_id]
+
+
+def widen_schema(ff, column):
+    """Serve `column` of a table as text from now on (a value didn't fit its inferred type).
+
+    The widening is kept by this process only; other workers widen the column when they
+    hit the value themselves.
+    """
+    string_columns = current_app.config.setdefault('TABLE_STRING_COLUMNS', {}).setdefault(ff.file_id, set())
+    string_columns.add(column)
+    current_app.config.setdefault('TABLE_SCHEMAS', {}).pop(ff.file_id, None)
+
+
+def output_schema(ff, columns):
+    """The table schema restricted to the output columns; dictionary label columns are strings."""
+    schema = table_schema(ff)
+    return pa.schema([schema.field(col) if col in schema.names else pa.field(col, pa.string()) for col in columns])
+
+
+def stream_response(chunks, fmt, headers=None):
+    """A streamed (chunked) response of encoded body chunks."""
+    response = Response(stream_with_context(chunks), mimetype=MIMETYPES[fmt])
+    # Tell reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers.update(headers or {})
+    return response
+
+
+def body_chunks(frames, fmt):
+    """Encoded chunks of DataFrames in the requested format."""
+    chunk_rows = current_app.config['CHUNK_ROWS']
+    if fmt == 'csv':
+        return csv_chunks(frames, chunk_rows)
+    if fmt == 'ndjson':
+        return ndjson_chunks(frames, chunk_rows)
+    return arrow_stream_chunks((arrow_table(df) for df in frames), chunk_rows)
+
 
 @data_bp.route('/')
 def index():
     """Home route for the Data application."""
     return 'Data App Home'
+
+
+@data_bp.route('/tables')
+def tables():
+    """Tables this server can serve, with their columns."""
+    result = []
+    for table in current_app.config['TABLES']:
+        ff = available_filter(table)
+        if ff is not None:
+            result.append({'table': table, 'columns': ff.header, 'time_column': time_column(ff), 'dictionary': ff.metadata.get('dictionary')})
+    return jsonify({'tables': result, 'formats': list(MIMETYPES)})
+
+
+@data_bp.route('/subjects/<int:subject_id>/<table>')
+def subject_table(subject_id, table):
+    """A subject's rows of one table, filtered and streamed in the requested format."""
+    ff = available_filter(table)
+    if ff is None:
+        return jsonify({'error': f'Table {table} is not available.'}), 404
+    if ff.lookup_df is None or subject_id not in ff.lookup_df.index:
+        return jsonify({'error': f'Subject ID {subject_id} not found in the dataset.'}), 404
+
+    fmt = format_for(request.args.get('format'), request.accept_mimetypes)
+    if fmt is None:
+        return jsonify({'error': f"Unknown format. Choose one of {', '.join(MIMETYPES)}."}), 400
+    if fmt == 'arrow' and not HAS_PYARROW:
+        return jsonify({'error': 'Arrow output requires pyarrow on the server.'}), 406
+    try:
+        query = parse_query(request.args)
+        columns = check_query(ff, query)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        df = ff.search_subject(subject_id)
+    except Exception as e:
+        return jsonify({'error': f'Error reading {table} for subject {subject_id}: {str(e)}'}), 500
+    if df.empty:
+        df = pd.DataFrame(columns=ff.header)
+    rows = select_rows(ff, df, query, columns)
+
+    filename = f"{table}_{subject_id}.{fmt}"
+    return stream_response(
+        body_chunks([rows], fmt), fmt,
+        headers={'Content-Disposition': f'inline; filename="{filename}"', 'X-Row-Count': str(len(rows))}
+    )
+
+
+@data_bp.route('/bulk/<table>', methods=['GET', 'POST'])
+def bulk_table(table):
+    """
+    Rows of one table for a list of subjects, as a single Arrow IPC stream.
+
+    Subjects are read in byte-offset order through the table's warm gzip handle, and
+    their rows are sent in record batches of about CHUNK_ROWS rows as they are decoded.
+    Subjects without rows in the table contribute nothing.
+
+    The schema is sent before any rows, so a value that doesn't fit it can't be typed
+    differently mid-stream. Instead of writing it as null, the column is widened to text
+    for later requests and this stream is aborted, which clients see as a truncated
+    stream (DataClient retries).
+    """
+    if not HAS_PYARROW:
+        return jsonify({'error': 'Arrow output requires pyarrow on the server.'}), 406
+    ff = available_filter(table)
+    if ff is None:
+        return jsonify({'error': f'Table {table} is not available.'}), 404
+    try:
+        args = request_args()
+        subject_ids = list(dict.fromkeys(parse_list(args, 'subject_ids', int)))
+        query = parse_query(args)
+        columns = check_query(ff, query)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    if not subject_ids:
+        return jsonify({'error': 'No subject_ids given.'}), 400
+    max_subjects = current_app.config['BULK_MAX_SUBJECTS']
+    if len(subject_ids) > max_subjects:
+        return jsonify({'error': f'At most {max_subjects} subjects per request.'}), 400
+
+    known = [sid for sid in subject_ids if ff.lookup_df is not None and sid in ff.lookup_df.index]
+    schema = output_schema(ff, columns)
+
+    def subject_tables():
+        for _, df in ff.search_subjects(known, text_columns=text_columns(schema)):
+            rows = select_rows(ff, df, query, columns)
+            if rows.empty:
+                continue
+            try:
+                yield conform_to_schema(rows, schema)
+            except SchemaMismatchError as e:
+                widen_schema(ff, e.column)
+                print(f"[Data App] Aborted /bulk/{table}: {e}. Serving {e.column} as text from now on.")
+                raise
+
+    chunk_rows = current_app.config['CHUNK_ROWS']
+    return stream_response(
+        arrow_stream_chunks(coalesce_tables(subject_tables(), chunk_rows), chunk_rows, schema=schema), 'arrow',
+        headers={'X-Subject-Count': str(len(known)), 'X-Unknown-Subjects': str(len(subject_ids) - len(known))}
+    )
+
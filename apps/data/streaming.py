@@ -0,0 +1,110 @@
+"""Chunked response bodies for the Data Flask Application.
+
+A query result is serialized CHUNK_ROWS rows at a time, so a response never holds more
+than one encoded chunk besides the rows themselves, and the client starts receiving data
+as soon as the first chunk is encoded:
+
+    csv      header line, then plain CSV rows (missing values empty)
+    ndjson   one JSON object per row (missing values null)
+    arrow    an Arrow IPC stream: the schema, then one record batch per chunk
+"""
+
+import io
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def format_for(requested, accept_mimetypes):
+    """The output format named by `requested`, else the best one the Accept header allows, else CSV."""
+    if requested:
+        return requested if requested in MIMETYPES else None
+    best = accept_mimetypes.best_match(list(MIMETYPES.values()), default=MIMETYPES['csv'])
+    return next(fmt for fmt, mimetype in MIMETYPES.items() if mimetype == best)
+
+
+def csv_chunks(frames, chunk_rows):
+    """CSV text of one or more DataFrames with the same columns, header first."""
+    header = True
+    for df in frames:
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=header)
+            header = False
+        if header:
+            # No rows: still send the header so clients see the columns
+            yield df.iloc[0:0].to_csv(index=False)
+            header = False
+
+
+def ndjson_chunks(frames, chunk_rows):
+    """Newline-delimited JSON records of one or more DataFrames."""
+    for df in frames:
+        for start in range(0, len(df), chunk_rows):
+            body = df.iloc[start:start + chunk_rows].to_json(orient='records', lines=True)
+            yield body if body.endswith('\n') else body + '\n'
+
+
+def arrow_table(df, schema=None):
+    """Arrow table of a DataFrame, cast to `schema` when given so every batch of a stream matches."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is not None and not table.schema.equals(schema):
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    return table
+
+
+def coalesce_tables(tables, min_rows):
+    """Concatenate consecutive small Arrow tables (e.g. one per subject) into ones of at least `min_rows` rows."""
+    pending, rows = [], 0
+    for table in tables:
+        pending.append(table)
+        rows += table.num_rows
+        if rows >= min_rows:
+            yield pa.concat_tables(pending)
+            pending, rows = [], 0
+    if pending:
+        yield pa.concat_tables(pending)
+
+
+class _DrainableBuffer(io.BytesIO):
+    """Sink for an Arrow IPC writer whose contents are handed out between batches."""
+
+    def take(self):
+        data = self.getvalue()
+        self.seek(0)
+        self.truncate()
+        return data
+
+
+def arrow_stream_chunks(tables, chunk_rows, schema=None):
+    """
+    Arrow IPC stream of one or more Arrow tables, one record batch per chunk.
+
+    The stream's schema is `schema`, or that of the first table; later tables must
+    already conform to it. A given schema is sent before the first table is read, so the
+    response has started (and an error while reading truncates the stream) either way.
+    """
+    sink = _DrainableBuffer()
+    writer = None
+    if schema is not None:
+        writer = pa.ipc.new_stream(sink, schema)
+        yield sink.take()
+    for table in tables:
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, schema or table.schema)
+            yield sink.take()
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+            yield sink.take()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, schema or pa.schema([]))
+    writer.close()
+    yield sink.take()
@@ -0,0 +1,105 @@
+"""Production serving for the Flask applications.
+
+`python main.py --app bpm --workers N --threads M` serves an app with gunicorn instead of
+the Werkzeug development server. The app is created once in the master process before
+the workers fork (preload), so the subject lookup table, heart rate store and subject
+index are loaded once and shared copy-on-write. Each worker process serves M threads;
+gzip handles can't be shared across processes, so every worker opens its own right
+after it starts.
+
+Sending SIGHUP to the master reloads gracefully: the app and its lookup tables are
+created again, new workers are started from it, and the old workers finish their
+in-flight requests before exiting. Server-side caches are per worker.
+"""
+
+try:
+    from gunicorn.app.base import BaseApplication
+    HAS_GUNICORN = True
+except ImportError:
+    BaseApplication = object
+    HAS_GUNICORN = False
+
+from utils.analysis.filters.file_filter import get_file_filter, reset_file_filters
+
+# Seconds a worker may spend on one request, and to finish in-flight requests on reload or shutdown
+WORKER_TIMEOUT = 120
+GRACEFUL_TIMEOUT = 30
+
+
+def preload_files(file_ids):
+    """Load the lookup tables of the given files into this process."""
+    for file_id in file_ids:
+        get_file_filter(file_id)
+
+
+class PreforkServer(BaseApplication):
+    """Gunicorn application that creates the Flask app in the master before forking workers."""
+
+    def __init__(self, create_app, options, file_ids=(), logger=None):
+        self.create_app = create_app
+        self.options = options
+        self.file_ids = file_ids
+        self.log = logger.info if logger else print
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('post_worker_init', self.post_worker_init)
+
+    def load(self):
+        app = self.create_app()
+        preload_files(self.file_ids)
+        self.log(f"App loaded in master; {self.options['workers']} workers x {self.options['threads']} threads will share it.")
+        return app
+
+    def reload(self):
+        """On SIGHUP, rebuild the app (and reread lookup tables) before new workers are forked."""
+        super().reload()
+        reset_file_filters()
+        self.callable = None
+
+    def post_worker_init(self, worker):
+        # gzip handles are per process; open them before the first request arrives
+        for file_id in self.file_ids:
+            try:
+                get_file_filter(file_id).open()
+            except Exception as e:
+                print(f"[Server] Worker {worker.pid} could not open {file_id}: {e}")
+
+
+def serve(create_app, workers, threads=4, host='127.0.0.1', port=5000, file_ids=(), logger=None):
+    """
+    Serve a Flask app with multiple worker processes.
+
+    Args:
+        create_app (callable): App factory, called once in the master process.
+        workers (int): Number of worker processes.
+        threads (int): Threads per worker.
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        file_ids (tuple): Files (e.g. "chartevents") whose lookup tables are preloaded
+            before forking and whose gzip handles each worker opens.
+        logger: Optional LoggerWrapper instance.
+    """
+    if not HAS_GUNICORN:
+        message = "gunicorn is not installed (pip install gunicorn). Falling back to the single-process threaded server."
+        if logger:
+            logger.warning(message)
+        else:
+            print(f"[Server] {message}")
+        app = create_app()
+        preload_files(file_ids)
+        app.run(host=host, port=port, threaded=True)
+        return
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': WORKER_TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+    }
+    PreforkServer(create_app, options, file_ids=file_ids, logger=logger).run()
@@ -11,6 +11,26 @@ class Flags:
         self.parser.add_argument('--download', action='store_true', help='Download MIMIC-IV dataset from PhysioNet')
         self.parser.add_argument('--app', type=str, choices=['data', 'bpm'], help='Run a Flask application (data, bpm)')
         self.parser.add_argument('--optimize-index', nargs='?', const='all', help='Generate byte-offset index for specified file (default: all)')
+        self.parser.add_argument('--extract', type=str, metavar='COHORT_FILE', help='Extract all rows for a cohort of subject_ids to Parquet')
+        self.parser.add_argument('--tables', nargs='+', default=['all'], help='Tables to extract with --extract (default: all)')
+        self.parser.add_argument('--output', type=str, help='Output directory for --extract / --build-hr-store / --export-graphs, or Parquet file for --cohort-stats')
+        self.parser.add_argument('--build-hr-store', action='store_true', help='Precompute cleaned heart rate series for all ICU subjects')
+        self.parser.add_argument('--export-graphs', type=str, metavar='COHORT_FILE', help='Render BPM graphs for a cohort of subject_ids to PNG/SVG')
+        self.parser.add_argument('--methods', nargs='+', default=['none'], help="Interpolation methods for --export-graphs (default: none)")
+        self.parser.add_argument('--format', type=str, choices=['png', 'svg'], default='png', help='Image format for --export-graphs (default: png)')
+        self.parser.add_argument('--vital', type=str, default='heart_rate', help='Vital for --export-graphs / --cohort-stats (default: heart_rate)')
+        self.parser.add_argument('--bin-size', type=int, default=0, help='Interpolation bin size for --export-graphs (default: 0)')
+        self.parser.add_argument('--bin-unit', type=str, choices=['points', 'minutes'], default='points', help='Bin size unit for --export-graphs (default: points)')
+        self.parser.add_argument('--cohort-stats', nargs='?', const='all', metavar='COHORT_FILE', help='Compute per-subject vital statistics to Parquet (default: all subjects)')
+        self.parser.add_argument('--stats', nargs='*', default=['time_in_range', 'variability', 'percentiles'], help='Extra statistics for --cohort-stats (default: time_in_range variability percentiles)')
+        self.parser.add_argument('--percentiles', nargs='+', type=float, default=[5, 25, 75, 95], help='Percentiles for --cohort-stats (default: 5 25 75 95)')
+        self.parser.add_argument('--range', nargs=2, type=float, metavar=('LOW', 'HIGH'), help="Time-in-range bounds for --cohort-stats (default: the vital's normal range)")
+        self.parser.add_argument('--outlier-method', type=str, choices=['iqr', 'mad', 'rolling_mad'], default='iqr', help='Outlier detection for --export-graphs / --cohort-stats (default: iqr)')
+        self.parser.add_argument('--workers', type=int, help='Number of worker processes for batch jobs, or server workers for --app')
+        self.parser.add_argument('--threads', type=int, default=4, help='Threads per server worker with --app --workers (default: 4)')
+        self.parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to serve --app on (default: 127.0.0.1)')
+        self.parser.add_argument('--port', type=int, default=5000, help='Port to serve --app on (default: 5000)')
+        self.parser.add_argument('--batch-size', type=int, default=500, help='Subjects per batch for --extract (default: 500)')
         # Add more flags as needed
 
     def parse(self):
@@ -30,8 +50,16 @@ class Runner:
             self.run_app()
         elif self.flags.optimize_index:
             self.run_optimize_index()
+        elif self.flags.extract:
+            self.run_extract()
+        elif self.flags.build_hr_store:
+            self.run_build_hr_store()
+        elif self.flags.export_graphs:
+            self.run_export_graphs()
+        elif self.flags.cohort_stats:
+            self.run_cohort_stats()
         else:
-            self.logger.error("No task specified. Use --pcspecs, --download, --app, or --optimize-index flag")
+            self.logger.error("No task specified. Use --pcspecs, --download, --app, --optimize-index, --extract, --build-hr-store, --export-graphs, or --cohort-stats flag")
 
     def run_pcspecs(self):
         self.logger.info("Retrieving PC specifications...")
@@ -42,20 +70,41 @@ class Runner:
         run_download_dataset(self.logger)
 
     def run_app(self):
-        """Run the selected Flask application."""
+        """Run the selected Flask application.
+
+        With --workers, the app is served by a multi-process WSGI server; otherwise by the
+        Werkzeug development server with the debugger and reloader.
+        """
         if self.flags.app == 'data':
             self.logger.info("Starting Data Flask application...")
             from apps.data import create_data_app
-            app = create_data_app()
-            app.run(debug=True)
+            from apps.data.config import Config as DataConfig
+            self.serve_app(create_data_app, file_ids=DataConfig.PRELOAD_TABLES)
         elif self.flags.app == 'bpm':
             self.logger.info("Starting BPM Flask application...")
             from apps.bpm import create_bpm_app
-            app = create_bpm_app()
-            app.run(debug=True)
+            self.serve_app(create_bpm_app, file_ids=('chartevents',))
         else:
             self.logger.error(f"Unknown app: {self.flags.app}")
 
+    def serve_app(self, create_app, file_ids=()):
+        """Serve an app factory in production mode (--workers) or with the development server."""
+        if self.flags.workers:
+            from apps.server import serve
+            self.logger.info(f"Serving on {self.flags.host}:{self.flags.port} with {self.flags.workers} workers x {self.flags.threads} threads")
+            serve(
+                create_app,
+                workers=self.flags.workers,
+                threads=self.flags.threads,
+                host=self.flags.host,
+                port=self.flags.port,
+                file_ids=file_ids,
+                logger=self.logger
+            )
+        else:
+            app = create_app()
+            app.run(debug=True, host=self.flags.host, port=self.flags.port)
+
     def run_optimize_index(self):
         """Generate byte-offset index for specified file(s) and verify optimization."""
         target = self.flags.optimize_index
@@ -90,6 +139,98 @@ class Runner:
         
         self.logger.info("Optimization process completed.")
 
+    def run_extract(self):
+        """Extract a cohort's rows from the selected tables to Parquet."""
+        self.logger.info(f"Starting cohort extraction for: {self.flags.extract}")
+        from utils.analysis.cohort_extract import extract_cohort
+        output_dir = extract_cohort(
+            self.flags.extract,
+            tables=self.flags.tables,
+            output_dir=self.flags.output,
+            workers=self.flags.workers,
+            batch_size=self.flags.batch_size,
+            logger=self.logger
+        )
+        self.logger.info(f"Cohort extraction completed. Output: {output_dir}")
+
+    def run_build_hr_store(self):
+        """Precompute the BPM app's heart rate feature store for every indexed subject."""
+        from apps.bpm.config import Config as BPMConfig
+        from apps.bpm.feature_store import build_feature_store
+        from utils.analysis.dictionaries import resolve_itemids
+
+        store_dir = self.flags.output or BPMConfig.HR_STORE_DIR
+        hr_itemids = resolve_itemids(BPMConfig.HEART_RATE_LABEL)
+        self.logger.info(f"Building heart rate store in {store_dir} (itemids: {hr_itemids or 'valueuom == bpm'})")
+        build_feature_store(store_dir, hr_itemids=hr_itemids, workers=self.flags.workers, logger=self.logger)
+        self.logger.info("Heart rate store completed.")
+
+    def run_export_graphs(self):
+        """Render BPM graphs server-side for every subject in a cohort file."""
+        from apps.bpm.config import Config as BPMConfig
+        from apps.bpm.export import export_graphs
+        from utils.analysis.cohort_extract import load_cohort
+        from utils.analysis.dictionaries import resolve_itemids
+
+        vital = self.flags.vital
+        if vital not in BPMConfig.VITAL_SERIES:
+            self.logger.error(f"Unknown vital: {vital}. Choose one of {', '.join(BPMConfig.VITAL_SERIES)}")
+            return
+        spec = BPMConfig.VITAL_SERIES[vital]
+        itemids = resolve_itemids(BPMConfig.HEART_RATE_LABEL) if vital == 'heart_rate' else spec['itemids']
+
+        subject_ids = load_cohort(self.flags.export_graphs)
+        self.logger.info(f"Exporting {spec['label']} graphs for {len(subject_ids)} subjects from {self.flags.export_graphs}")
+        export_graphs(
+            subject_ids,
+            self.flags.methods,
+            output_dir=self.flags.output,
+            fmt=self.flags.format,
+            vital=vital,
+            itemids=itemids,
+            bin_size=self.flags.bin_size,
+            bin_unit=self.flags.bin_unit,
+            max_points=BPMConfig.PLOT_MAX_POINTS,
+            vital_label=spec['label'],
+            unit=spec['unit'],
+            outliers={'method': self.flags.outlier_method},
+            store_dir=BPMConfig.HR_STORE_DIR,
+            workers=self.flags.workers,
+            logger=self.logger
+        )
+        self.logger.info("Graph export completed.")
+
+    def run_cohort_stats(self):
+        """Compute per-subject statistics of a vital for a cohort file (or every subject) to Parquet."""
+        from apps.bpm.config import Config as BPMConfig
+        from apps.bpm.cohort_stats import compute_cohort_statistics
+        from utils.analysis.cohort_extract import load_cohort
+        from utils.analysis.dictionaries import resolve_itemids
+
+        vital = self.flags.vital
+        if vital not in BPMConfig.VITAL_SERIES:
+            self.logger.error(f"Unknown vital: {vital}. Choose one of {', '.join(BPMConfig.VITAL_SERIES)}")
+            return
+        spec = BPMConfig.VITAL_SERIES[vital]
+        itemids = resolve_itemids(BPMConfig.HEART_RATE_LABEL) if vital == 'heart_rate' else spec['itemids']
+
+        target = self.flags.cohort_stats
+        subject_ids = None if target == 'all' else load_cohort(target)
+        self.logger.info(f"Computing {spec['label']} statistics for {'all subjects' if subject_ids is None else target}")
+        output_path = compute_cohort_statistics(
+            subject_ids,
+            output_path=self.flags.output,
+            vital=vital,
+            itemids=itemids,
+            extras=self.flags.stats,
+            percentiles=self.flags.percentiles,
+            value_range=tuple(self.flags.range) if self.flags.range else spec['range'],
+            outliers={'method': self.flags.outlier_method},
+            workers=self.flags.workers,
+            logger=self.logger
+        )
+        self.logger.info(f"Cohort statistics completed. Output: {output_path}")
+
 if __name__ == "__main__":
     flags = Flags()
     args = flags.parse()
@@ -0,0 +1,159 @@
+"""
+Data App Client
+
+Pulls rows from a running data app (`python main.py --app data`) into DataFrames. Rows
+travel as Arrow IPC streams and are decoded batch by batch as they arrive, so column
+types come from the server's schema and nothing is parsed from CSV on the client:
+
+    client = DataClient("http://127.0.0.1:5000")
+    frames = client.fetch_bulk(subject_ids, tables=["chartevents", "outputevents"], itemids=[220045])
+    hr = frames["chartevents"]
+"""
+
+import http.client
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+# Requests per table of fetch_bulk before a stream the server keeps aborting is an error
+# (each abort widens one more column to text, in the server worker that hit it)
+BULK_ATTEMPTS = 3
+
+
+class DataAPIError(RuntimeError):
+    """An error response of the data app."""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class DataClient:
+    """Client of the data app's retrieval API."""
+
+    def __init__(self, base_url='http://127.0.0.1:5000', timeout=300):
+        """
+        Args:
+            base_url (str): Address of the data app.
+            timeout (float): Seconds to wait for the server before giving up on a request.
+        """
+        if not HAS_PYARROW:
+            raise ImportError("DataClient requires pyarrow.")
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _open(self, path, params=None, body=None):
+        """Open a request to the API; error responses raise DataAPIError with the server's message."""
+        url = f"{self.base_url}{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params, doseq=True)
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(url, data=data, headers={'Accept': ARROW_MIMETYPE})
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            return urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise DataAPIError(e.code, message) from None
+
+    def _read_frame(self, response):
+        """
+        Decode an Arrow IPC stream response into a DataFrame.
+
+        Raises:
+            DataAPIError: If the server aborted the stream before its end.
+        """
+        with response:
+            try:
+                return pa.ipc.open_stream(response).read_all().to_pandas()
+            except (http.client.IncompleteRead, pa.ArrowInvalid) as e:
+                raise DataAPIError(response.status, f"Stream of {response.url} ended early ({e})") from None
+
+    def tables(self):
+        """Tables the server serves, with their columns and time column."""
+        with self._open('/tables') as response:
+            return json.loads(response.read())['tables']
+
+    def fetch_subject(self, subject_id, table, columns=None, itemids=None, start=None, end=None, labels=False):
+        """
+        One subject's rows of a table.
+
+        Args:
+            subject_id (int): Subject to fetch.
+            table (str): Table name, e.g. 'chartevents'.
+            columns (list): Columns to return (default: all).
+            itemids (list): Only keep rows with these itemids.
+            start, end: Time window on the table's time column (inclusive).
+            labels (bool): Append d_items label/category/unit columns.
+
+        Returns:
+            pd.DataFrame: The rows, with column types inferred from this subject's rows.
+        """
+        params = _filters(columns, itemids, start, end, labels)
+        params['format'] = 'arrow'
+        return self._read_frame(self._open(f"/subjects/{int(subject_id)}/{table}", params=params))
+
+    def fetch_bulk(self, subject_ids, tables=('chartevents',), columns=None, itemids=None, start=None, end=None, labels=False, workers=None):
+        """
+        Rows of several tables for a list of subjects.
+
+        Each table is one streamed request to /bulk/<table>; tables are fetched
+        concurrently (one connection each, or `workers`). Columns have one type per table
+        on the server, so results of separate calls concatenate cleanly. When a numeric
+        column turns out to hold text, the server aborts the stream rather than null the
+        value and serves the column as text from then on; the table is requested again
+        (up to BULK_ATTEMPTS times), and only frames fetched after that have it as text.
+
+        Args:
+            subject_ids (list): Subjects to fetch.
+            tables (list): Table names.
+            columns, itemids, start, end, labels: Filters as in fetch_subject, applied to every table.
+            workers (int): Concurrent requests (default: one per table).
+
+        Returns:
+            dict: table -> pd.DataFrame.
+        """
+        if isinstance(tables, str):
+            tables = [tables]
+        body = _filters(columns, itemids, start, end, labels)
+        body['subject_ids'] = [int(sid) for sid in subject_ids]
+
+        def fetch(table):
+            for attempt in range(BULK_ATTEMPTS):
+                try:
+                    return self._read_frame(self._open(f"/bulk/{table}", body=body))
+                except DataAPIError as e:
+                    if e.status != 200 or attempt == BULK_ATTEMPTS - 1:
+                        raise
+
+        with ThreadPoolExecutor(max_workers=workers or max(1, len(tables))) as pool:
+            return dict(zip(tables, pool.map(fetch, tables)))
+
+
+def _filters(columns, itemids, start, end, labels):
+    """Request parameters of the row filters that are set."""
+    params = {}
+    if columns:
+        params['columns'] = list(columns)
+    if itemids:
+        params['itemid'] = [int(i) for i in itemids]
+    if start is not None:
+        params['start'] = str(start)
+    if end is not None:
+        params['end'] = str(end)
+    if labels:
+        params['labels'] = 1
+    return params
@@ -0,0 +1,324 @@
+"""
+Cohort Extraction Utility
+
+Extracts every row for a cohort of subject_ids from one or more MIMIC-IV tables into
+Parquet files. Work is split into batches of subjects sorted by byte offset and fanned
+out over a process pool; each batch streams its subjects into its own Parquet part file,
+so memory stays bounded by one row group and completed batches survive interruptions.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+from utils.analysis.filtering import IDs
+from utils.analysis.filters.file_filter import get_file_filter
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'cohorts')
+PROGRESS_FILE = "_progress.json"
+
+# Rows buffered before a row group is flushed to disk
+ROW_GROUP_ROWS = 250_000
+# Rows sampled from the head of a table to fix its Parquet schema
+SCHEMA_SAMPLE_ROWS = 200_000
+
+
+def load_cohort(cohort_path):
+    """
+    Reads subject_ids from a cohort file.
+
+    Accepts a CSV with a `subject_id` column or a plain text file with one id per line.
+
+    Returns:
+        list: Unique subject_ids in ascending order.
+    """
+    if not os.path.exists(cohort_path):
+        raise FileNotFoundError(f"Cohort file {cohort_path} not found.")
+
+    df = pd.read_csv(cohort_path)
+    if 'subject_id' in df.columns:
+        ids = df['subject_id']
+    else:
+        # Headerless file: one subject_id per line
+        ids = pd.read_csv(cohort_path, header=None).iloc[:, 0]
+
+    ids = pd.to_numeric(ids, errors='coerce').dropna().astype('int64')
+    return sorted(set(ids.tolist()))
+
+
+class SchemaMismatchError(ValueError):
+    """A value that doesn't fit the numeric type its column was inferred with."""
+
+    def __init__(self, column, value):
+        super().__init__(column, value)
+        self.column = column
+        self.value = value
+
+    def __str__(self):
+        return f"Column {self.column} has non-numeric value {self.value!r} outside the schema sample"
+
+
+def infer_schema(ff, string_columns=()):
+    """
+    Infers a stable Arrow schema for a table from a sample of its leading rows.
+
+    Numeric columns are stored as float64 (ids other than the sort column may be missing),
+    the sort column as int64 and everything else as string, so part files written by
+    different workers can be read back as one dataset. Columns in `string_columns`, and
+    the table's known mixed text columns (`text_columns` in IDs), are strings regardless
+    of the sample (see SchemaMismatchError).
+    """
+    string_columns = set(string_columns) | set(ff.metadata.get('text_columns', ()))
+    sample = pd.read_csv(ff.file_path, nrows=SCHEMA_SAMPLE_ROWS)
+    fields = []
+    for col in ff.header:
+        if col == ff.sort_col:
+            fields.append(pa.field(col, pa.int64()))
+        elif col not in string_columns and col in sample.columns and pd.api.types.is_numeric_dtype(sample[col]):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def text_columns(schema):
+    """Columns of a schema that are strings; read them with search_subjects(text_columns=...)."""
+    return [field.name for field in schema if pa.types.is_string(field.type)]
+
+
+def conform_to_schema(df, schema):
+    """
+    Coerces a subject frame to the table schema.
+
+    String columns must have been read as text (see text_columns): converting parsed
+    numbers back to strings would not reproduce the source text (72 would become "72.0").
+
+    Raises:
+        SchemaMismatchError: If a numeric column holds text that isn't a number, which
+            would otherwise be written as null.
+    """
+    df = df.copy()
+    for field in schema:
+        col = field.name
+        if col not in df.columns:
+            df[col] = None
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            values = pd.to_numeric(df[col], errors='coerce')
+            lost = values.isna() & df[col].notna()
+            if lost.any():
+                raise SchemaMismatchError(col, df[col][lost].iloc[0])
+            df[col] = values
+        else:
+            df[col] = df[col].astype('string')
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def _extract_batch(file_id, batch_no, subject_ids, schema, out_path):
+    """
+    Worker: streams one batch of subjects from a table into a Parquet part file.
+
+    The part is written to a temporary name and renamed once complete, so a killed
+    run never leaves a truncated file behind.
+
+    Returns:
+        tuple: (file_id, batch_no, rows_written)
+    """
+    ff = get_file_filter(file_id)
+    tmp_path = out_path + ".tmp"
+    rows_written = 0
+    buffered = []
+    buffered_rows = 0
+
+    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        for _, df in ff.search_subjects(subject_ids, text_columns=text_columns(schema)):
+            if df.empty:
+                continue
+            buffered.append(conform_to_schema(df, schema))
+            buffered_rows += len(df)
+            if buffered_rows >= ROW_GROUP_ROWS:
+                writer.write_table(pa.concat_tables(buffered))
+                rows_written += buffered_rows
+                buffered, buffered_rows = [], 0
+
+        if buffered:
+            writer.write_table(pa.concat_tables(buffered))
+            rows_written += buffered_rows
+
+    os.replace(tmp_path, out_path)
+    return file_id, batch_no, rows_written
+
+
+class Progress:
+    """
+    Tracks completed (table, batch) pairs in a JSON file inside the output directory,
+    along with the columns of each table that are extracted as text.
+    """
+
+    def __init__(self, output_dir, fingerprint):
+        self.path = os.path.join(output_dir, PROGRESS_FILE)
+        self.fingerprint = fingerprint
+        self.completed = {}
+        self.string_columns = {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get("fingerprint") == fingerprint:
+                self.completed = {k: set(v) for k, v in state.get("completed", {}).items()}
+                self.string_columns = state.get("string_columns", {})
+            else:
+                print("[Cohort_Extract] Cohort or batch size changed since the last run. Starting over.")
+
+    def is_done(self, file_id, batch_no):
+        return batch_no in self.completed.get(file_id, set())
+
+    def mark_done(self, file_id, batch_no):
+        self.completed.setdefault(file_id, set()).add(batch_no)
+        self._save()
+
+    def restart_table(self, file_id, string_columns):
+        """Forgets a table's completed batches and records its widened text columns."""
+        self.completed.pop(file_id, None)
+        self.string_columns[file_id] = sorted(set(self.string_columns.get(file_id, [])) | set(string_columns))
+        self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "completed": {k: sorted(v) for k, v in self.completed.items()},
+                "string_columns": self.string_columns,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+def _clear_stale_parts(table_dir, progress, file_id):
+    """
+    Removes part files of batches not recorded as completed, so parts left by an earlier
+    run with another cohort, batch size or schema never mix into the dataset.
+    """
+    for path in glob.glob(os.path.join(table_dir, "part-*.parquet*")):
+        batch = os.path.basename(path)[len("part-"):].split(".")[0]
+        if not (batch.isdigit() and progress.is_done(file_id, int(batch)) and path.endswith(".parquet")):
+            os.remove(path)
+
+
+def _plan_table(ff, subject_ids, output_dir, batch_size, progress):
+    """Pending (file_id, batch_no, subject_ids, schema, out_path) tasks of one table, in byte-offset order."""
+    ranges = ff.get_byte_ranges(subject_ids)
+    if ranges.empty:
+        return []
+
+    table_dir = os.path.join(output_dir, ff.file_id)
+    os.makedirs(table_dir, exist_ok=True)
+    _clear_stale_parts(table_dir, progress, ff.file_id)
+    schema = infer_schema(ff, progress.string_columns.get(ff.file_id, ()))
+    ordered_ids = ranges['subject_id'].tolist()
+
+    tasks = []
+    for batch_no, i in enumerate(range(0, len(ordered_ids), batch_size)):
+        if progress.is_done(ff.file_id, batch_no):
+            continue
+        out_path = os.path.join(table_dir, f"part-{batch_no:05d}.parquet")
+        tasks.append((ff.file_id, batch_no, ordered_ids[i:i + batch_size], schema, out_path))
+    return tasks
+
+
+def extract_cohort(cohort_path, tables=None, output_dir=None, workers=None, batch_size=500, logger=None):
+    """
+    Writes each table's rows for a cohort of subjects to Parquet.
+
+    Output layout is `<output_dir>/<table>/part-<batch>.parquet`; read a table back with
+    `pd.read_parquet(os.path.join(output_dir, table))`. Re-running with the same cohort
+    and batch size resumes from the batches recorded in `_progress.json`.
+
+    Column types are inferred from the head of each table. If a later row holds text in a
+    column inferred as numeric, that column is switched to string and the table is
+    extracted again, so no value is lost to type coercion.
+
+    Args:
+        cohort_path (str): CSV/text file of subject_ids.
+        tables (list): File ids from IDs (default: all).
+        output_dir (str): Destination directory (default: data/cohorts/<cohort name>).
+        workers (int): Number of worker processes (default: CPU count - 1).
+        batch_size (int): Subjects per part file.
+        logger: Optional LoggerWrapper instance.
+    """
+    log = logger.info if logger else print
+
+    if not HAS_PYARROW:
+        raise ImportError("pyarrow is required for cohort extraction.")
+
+    tables = list(IDs.keys()) if not tables or 'all' in tables else tables
+    unknown = [t for t in tables if t not in IDs]
+    if unknown:
+        raise ValueError(f"Unknown table(s) {unknown}. Available: {list(IDs.keys())}")
+
+    subject_ids = load_cohort(cohort_path)
+    if output_dir is None:
+        cohort_name = os.path.splitext(os.path.basename(cohort_path))[0]
+        output_dir = os.path.join(DEFAULT_OUTPUT_DIR, cohort_name)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    fingerprint = hashlib.sha1(f"{batch_size}:{subject_ids}".encode()).hexdigest()
+    progress = Progress(output_dir, fingerprint)
+    log(f"Extracting {len(subject_ids)} subjects from {tables} into {output_dir} with {workers} workers")
+
+    # Plan batches per table in byte-offset order so each worker reads forward through the file
+    tasks = []
+    for file_id in tables:
+        ff = get_file_filter(file_id)
+        if not os.path.exists(ff.file_path):
+            log(f"[{file_id}] File {ff.file_path} not found. Skipping.")
+            continue
+        table_tasks = _plan_table(ff, subject_ids, output_dir, batch_size, progress)
+        if not table_tasks and ff.get_byte_ranges(subject_ids).empty:
+            log(f"[{file_id}] No cohort subjects have rows in this table. Skipping.")
+        tasks.extend(table_tasks)
+
+    if not tasks:
+        log("All batches already extracted.")
+        return output_dir
+
+    start_time = time.time()
+    rows_written = {}
+    while tasks:
+        mismatched = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_extract_batch, *task): task[0] for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    file_id, batch_no, rows = future.result()
+                except SchemaMismatchError as e:
+                    mismatched.setdefault(futures[future], {})[e.column] = e.value
+                    continue
+                progress.mark_done(file_id, batch_no)
+                rows_written[(file_id, batch_no)] = rows
+                if logger:
+                    logger.debug(f"[{file_id}] Batch {batch_no} wrote {rows} rows")
+
+        # Tables with text in a numeric column are extracted again with those columns as text
+        tasks = []
+        for file_id, columns in mismatched.items():
+            examples = ', '.join(f"{col} ({value!r})" for col, value in columns.items())
+            log(f"[{file_id}] Non-numeric values beyond the schema sample in {examples}. Re-extracting these columns as text.")
+            progress.restart_table(file_id, columns)
+            rows_written = {key: rows for key, rows in rows_written.items() if key[0] != file_id}
+            tasks.extend(_plan_table(get_file_filter(file_id), subject_ids, output_dir, batch_size, progress))
+
+    log(f"Extracted {sum(rows_written.values())} rows in {len(rows_written)} batches in {time.time() - start_time:.2f}s")
+    return output_dir
@@ -0,0 +1,121 @@
+"""
+Dictionary Table Service
+
+Loads MIMIC-IV dictionary tables (`d_items`, `d_labitems`) once per process and maps
+itemids to their label/category/unit with vectorized index lookups instead of per-query
+merges. Labels can also be resolved back to itemids (e.g. "Heart Rate" -> [220045]).
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.analysis.filtering import DICTIONARIES, ROOT_URL
+
+_DICTIONARY_CACHE = {}
+_DICTIONARY_LOCK = threading.Lock()
+
+
+class Item_Dictionary:
+    def __init__(self, name, file_path=None):
+        """
+        Loads a dictionary table indexed by its key column.
+
+        Args:
+            name (str): Dictionary id from DICTIONARIES (e.g. "d_items").
+            file_path (str): Optional override for file path.
+        """
+        self.name = name
+        self.metadata = DICTIONARIES.get(name)
+        if not self.metadata:
+            raise ValueError(f"Dictionary {name} not found in DICTIONARIES.")
+
+        self.file_path = file_path or os.path.join(ROOT_URL, self.metadata["location"])
+        if not os.path.exists(self.file_path):
+            raise FileNotFoundError(f"Dictionary file {self.file_path} not found.")
+
+        self.key = self.metadata["key"]
+        self.df = pd.read_csv(self.file_path).set_index(self.key).sort_index()
+        self.fields = [f for f in self.metadata["fields"] if f in self.df.columns]
+
+        # Lower-cased labels for case-insensitive reverse lookups
+        self._labels_lower = self.df["label"].astype(str).str.strip().str.lower()
+        print(f"[Item_Dictionary] Loaded {len(self.df)} entries from {name}")
+
+    def map(self, itemids, field="label"):
+        """
+        Maps an array of itemids to a dictionary field.
+
+        Returns:
+            np.ndarray: Field values aligned with `itemids` (NaN where unknown).
+        """
+        if field not in self.df.columns:
+            raise ValueError(f"Field {field} not found in {self.name}.")
+        positions = self.df.index.get_indexer(pd.Index(itemids))
+        values = self.df[field].to_numpy(dtype=object)
+        result = np.full(len(positions), np.nan, dtype=object)
+        found = positions >= 0
+        result[found] = values[positions[found]]
+        return result
+
+    def enrich(self, df, fields=None, on=None):
+        """
+        Returns a copy of `df` with dictionary fields appended as columns.
+
+        Args:
+            df (DataFrame): Frame holding an itemid column.
+            fields (list): Fields to add (default: the dictionary's standard fields).
+            on (str): Column holding the itemids (default: the dictionary key).
+        """
+        on = on or self.key
+        fields = fields or self.fields
+        if df.empty or on not in df.columns:
+            return df
+
+        enriched = df.copy()
+        for field in fields:
+            enriched[field] = self.map(df[on], field)
+        return enriched
+
+    def find_itemids(self, label, exact=True):
+        """
+        Resolves a label to itemids (case-insensitive).
+
+        Args:
+            label (str): Label to look up, e.g. "Heart Rate".
+            exact (bool): If False, matches any label containing `label`.
+
+        Returns:
+            list: Matching itemids in ascending order.
+        """
+        needle = label.strip().lower()
+        if exact:
+            mask = self._labels_lower == needle
+        else:
+            mask = self._labels_lower.str.contains(needle, regex=False)
+        return self.df.index[mask.to_numpy()].tolist()
+
+
+def get_dictionary(name):
+    """Returns the process-wide cached Item_Dictionary for `name`, loading it on first use."""
+    if name not in _DICTIONARY_CACHE:
+        with _DICTIONARY_LOCK:
+            if name not in _DICTIONARY_CACHE:
+                _DICTIONARY_CACHE[name] = Item_Dictionary(name)
+    return _DICTIONARY_CACHE[name]
+
+
+def resolve_itemids(label, name="d_items", exact=True):
+    """
+    Resolves a label to itemids using a cached dictionary.
+
+    Returns:
+        list: Matching itemids, or an empty list if the dictionary is unavailable.
+    """
+    try:
+        return get_dictionary(name).find_itemids(label, exact=exact)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[Item_Dictionary] Could not resolve '{label}': {e}")
+        return []
@@ -1,12 +1,22 @@
 IDs = {
-    "chartevents": {"rows": 313645063, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/chartevents.csv.gz"},
-    "datetimeevents": {"rows": 7112999, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/datetimeevents.csv.gz"},
-    "ingredientevents": {"rows": 12229408, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/ingredientevents.csv.gz"},
-    "inputevents": {"rows": 8978893, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/inputevents.csv.gz"},
-    "outputevents": {"rows": 4234967, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/outputevents.csv.gz"},
-    "procedureevents": {"rows": 696092, "ordered_by": "subject_id", "location": "physionet.org/files/mimiciv/3.1/icu/procedureevents.csv.gz"},
+    "chartevents": {"rows": 313645063, "ordered_by": "subject_id", "dictionary": "d_items", "text_columns": ["value"], "location": "physionet.org/files/mimiciv/3.1/icu/chartevents.csv.gz"},
+    "datetimeevents": {"rows": 7112999, "ordered_by": "subject_id", "dictionary": "d_items", "text_columns": ["value"], "location": "physionet.org/files/mimiciv/3.1/icu/datetimeevents.csv.gz"},
+    "ingredientevents": {"rows": 12229408, "ordered_by": "subject_id", "dictionary": "d_items", "location": "physionet.org/files/mimiciv/3.1/icu/ingredientevents.csv.gz"},
+    "inputevents": {"rows": 8978893, "ordered_by": "subject_id", "dictionary": "d_items", "location": "physionet.org/files/mimiciv/3.1/icu/inputevents.csv.gz"},
+    "outputevents": {"rows": 4234967, "ordered_by": "subject_id", "dictionary": "d_items", "location": "physionet.org/files/mimiciv/3.1/icu/outputevents.csv.gz"},
+    "procedureevents": {"rows": 696092, "ordered_by": "subject_id", "dictionary": "d_items", "location": "physionet.org/files/mimiciv/3.1/icu/procedureevents.csv.gz"},
 }
 
+# "text_columns" are columns that mix numbers and text (e.g. chartevents.value), which
+# typed exports treat as text up front rather than inferring them from a sample.
+
+# Dictionary tables that describe the itemids used by the event tables
+DICTIONARIES = {
+    "d_items": {"key": "itemid", "fields": ["label", "category", "unitname"], "location": "physionet.org/files/mimiciv/3.1/icu/d_items.csv.gz"},
+    "d_labitems": {"key": "itemid", "fields": ["label", "category", "fluid"], "location": "physionet.org/files/mimiciv/3.1/hosp/d_labitems.csv.gz"},
+}
+
+import numpy as np
 import pandas as pd
 import time
 import os
@@ -24,6 +34,66 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 from config.base_config import Config
 ROOT_URL = Config.ROOT_URL
 
+# Vital signs whose availability is recorded per subject while indexing their table;
+# the lookup table gets a has_<vital> column (1 if the subject has any reading).
+# This is the itemid registry of the vitals the BPM app shows (its VITAL_SERIES).
+VITALS = {
+    "heart_rate": {"file_id": "chartevents", "itemids": [220045]},
+    "respiratory_rate": {"file_id": "chartevents", "itemids": [220210]},
+    "spo2": {"file_id": "chartevents", "itemids": [220277]},
+    "temperature": {"file_id": "chartevents", "itemids": [223761]},
+    "nbp_systolic": {"file_id": "chartevents", "itemids": [220179]},
+    "nbp_diastolic": {"file_id": "chartevents", "itemids": [220180]},
+    "abp_systolic": {"file_id": "chartevents", "itemids": [220050]},
+    "abp_diastolic": {"file_id": "chartevents", "itemids": [220051]},
+}
+
+# Sparse row index: byte offset of every ROW_INDEX_SPACING-th data row.
+# Rows are logical CSV rows, so quoted fields containing newlines don't shift later rows.
+ROW_INDEX_SPACING = 4096
+ROW_INDEX_SUFFIX = ".rowidx.npz"
+
+def vital_column(vital):
+    """Lookup table column flagging subjects with readings of a vital."""
+    return f"has_{vital}"
+
+def logical_rows(f):
+    """
+    Yields the rows of a binary CSV stream, joining physical lines that end inside a
+    quoted field (a newline within quotes doesn't end a row). Escaped quotes ("") keep
+    the quote count even, so an odd count means a field is still open.
+    """
+    pending = None
+    for line in f:
+        if pending is not None:
+            line = pending + line
+            pending = None
+        if line.count(b'"') % 2:
+            pending = line
+            continue
+        yield line
+    if pending is not None:
+        yield pending
+
+def read_logical_row(f):
+    """Reads one CSV row from a binary stream's current position (see logical_rows); b'' at EOF."""
+    line = f.readline()
+    while line.count(b'"') % 2:
+        continuation = f.readline()
+        if not continuation:
+            break
+        line += continuation
+    return line
+
+def _vital_bits(file_id):
+    """Maps itemid bytes (as they appear in the CSV) to a bit per vital recorded in `file_id`."""
+    vitals = [name for name, meta in VITALS.items() if meta["file_id"] == file_id]
+    bits = {}
+    for bit, name in enumerate(vitals):
+        for itemid in VITALS[name]["itemids"]:
+            bits[str(itemid).encode()] = 1 << bit
+    return vitals, bits
+
 class Filterer:
     def __init__(self, debug=False):
         self.debug = debug
@@ -99,6 +169,11 @@ class Filterer:
             if valid_count > 0:
                 print(f"[{file_id}] Columns {start_col} and {end_col} already exist with {valid_count} valid entries. Skipping index generation.")
                 print(f"[{file_id}] To regenerate, delete these columns from the CSV and run again.")
+                if not os.path.exists(resolved_file_path + ROW_INDEX_SUFFIX):
+                    self.generate_row_index(file_id, resolved_file_path)
+                missing_vitals = [v for v in _vital_bits(file_id)[0] if vital_column(v) not in subjects_df.columns]
+                if missing_vitals:
+                    self.generate_vital_index(file_id, resolved_file_path, target_csv_path)
                 return
         
         offsets = {}
@@ -131,12 +206,23 @@ class Filterer:
                 print(f"[{file_id}] Error: Sort column '{sort_col}' not found in header")
                 return
 
+            # Vital availability is recorded in the same pass when this table holds vitals
+            vitals, vital_bits = _vital_bits(file_id)
+            itemid_col_idx = cols.index('itemid') if vitals and 'itemid' in cols else -1
+            split_count = max(subject_col_idx, itemid_col_idx) + 1
+            vital_flags = {}
+
             current_subject = None
             subject_start_offset = current_offset
+            row_offsets = []
+            row_count = 0
             
-            for line in f:
+            for line in logical_rows(f):
                 line_len = len(line)
-                parts = line.split(b',', subject_col_idx + 1)
+                if row_count % ROW_INDEX_SPACING == 0:
+                    row_offsets.append(current_offset)
+                row_count += 1
+                parts = line.split(b',', split_count)
                 if len(parts) <= subject_col_idx:
                     current_offset += line_len
                     continue
@@ -146,6 +232,11 @@ class Filterer:
                     sid = int(sid_bytes)
                 except ValueError:
                     sid = int(sid_bytes.decode('utf-8').strip('"'))
+
+                if itemid_col_idx >= 0 and len(parts) > itemid_col_idx:
+                    bit = vital_bits.get(parts[itemid_col_idx])
+                    if bit:
+                        vital_flags[sid] = vital_flags.get(sid, 0) | bit
                 
                 if sid != current_subject:
                     if current_subject is not None:
@@ -165,6 +256,7 @@ class Filterer:
                 offsets[current_subject] = (subject_start_offset, current_offset)
                 
         print(f"\n[{file_id}] Scanning complete. Found {len(offsets)} subjects in {time.time() - start_time:.2f}s")
+        self._save_row_index(resolved_file_path, row_offsets, row_count)
         
         # Identify new subjects
         existing_sids = set(subjects_df['subject_id'])
@@ -194,6 +286,9 @@ class Filterer:
         # Fill NaN with -1 if any (from map)
         subjects_df[start_col] = subjects_df[start_col].fillna(-1).astype(int)
         subjects_df[end_col] = subjects_df[end_col].fillna(-1).astype(int)
+
+        if vitals:
+            subjects_df = self._apply_vital_flags(subjects_df, file_id, vitals, vital_flags)
         
         subjects_df.to_csv(target_csv_path, index=False)
         print(f"[{file_id}] Updated {target_csv_path} with columns {start_col}, {end_col}")
@@ -202,6 +297,114 @@ class Filterer:
         # Reload lookup table
         self._load_lookup_table()
 
+    def _save_row_index(self, resolved_file_path, row_offsets, row_count):
+        """Saves the sparse row-number -> byte-offset index next to the data file."""
+        row_index_path = resolved_file_path + ROW_INDEX_SUFFIX
+        np.savez(
+            row_index_path,
+            offsets=np.asarray(row_offsets, dtype=np.int64),
+            spacing=np.int64(ROW_INDEX_SPACING),
+            rows=np.int64(row_count)
+        )
+        print(f"Saved row index ({len(row_offsets)} checkpoints, {row_count} rows) to {row_index_path}")
+
+    def generate_row_index(self, file_id, file_path=None):
+        """
+        Scans the file and saves a sparse row-number -> byte-offset index.
+
+        `generate_byte_index` builds this as part of its scan; this method covers files
+        whose subject offsets were indexed before row indexes existed.
+        """
+        if not HAS_INDEXED_GZIP:
+            print(f"[{file_id}] Error: indexed_gzip is required for generating row index.")
+            return
+
+        resolved_file_path = self._resolve_file_path(file_id, file_path)
+        index_file_path = resolved_file_path + ".idx"
+        print(f"[{file_id}] Building row index...")
+        start_time = time.time()
+
+        with indexed_gzip.IndexedGzipFile(resolved_file_path, spacing=2**22) as f:
+            if os.path.exists(index_file_path):
+                f.import_index(filename=index_file_path)
+
+            f.readline()
+            current_offset = f.tell()
+            row_offsets = []
+            row_count = 0
+
+            for line in logical_rows(f):
+                if row_count % ROW_INDEX_SPACING == 0:
+                    row_offsets.append(current_offset)
+                row_count += 1
+                current_offset += len(line)
+
+        print(f"[{file_id}] Row scan complete in {time.time() - start_time:.2f}s")
+        self._save_row_index(resolved_file_path, row_offsets, row_count)
+
+    def _apply_vital_flags(self, subjects_df, file_id, vitals, vital_flags):
+        """Writes has_<vital> columns from per-subject vital bitmasks."""
+        flags = subjects_df['subject_id'].map(vital_flags).fillna(0).to_numpy(dtype=np.int64)
+        for bit, vital in enumerate(vitals):
+            column = vital_column(vital)
+            subjects_df[column] = ((flags >> bit) & 1).astype(np.int8)
+            print(f"[{file_id}] {column}: {int(subjects_df[column].sum())} subjects")
+        return subjects_df
+
+    def generate_vital_index(self, file_id, file_path=None, lookup_csv_path=None):
+        """
+        Scans the file and records which subjects have readings of each vital in VITALS.
+
+        `generate_byte_index` records this as part of its scan; this method covers files
+        whose subject offsets were indexed before vital availability existed.
+        """
+        if not HAS_INDEXED_GZIP:
+            print(f"[{file_id}] Error: indexed_gzip is required for generating vital index.")
+            return
+
+        vitals, vital_bits = _vital_bits(file_id)
+        if not vitals:
+            print(f"[{file_id}] No vitals are recorded in this table.")
+            return
+
+        target_csv_path = lookup_csv_path if lookup_csv_path else self.lookup_path
+        resolved_file_path = self._resolve_file_path(file_id, file_path)
+        index_file_path = resolved_file_path + ".idx"
+        sort_col = IDs[file_id]["ordered_by"]
+        print(f"[{file_id}] Building vital availability index...")
+        start_time = time.time()
+
+        vital_flags = {}
+        with indexed_gzip.IndexedGzipFile(resolved_file_path, spacing=2**22) as f:
+            if os.path.exists(index_file_path):
+                f.import_index(filename=index_file_path)
+
+            cols = f.readline().decode('utf-8').strip().split(',')
+            subject_col_idx = cols.index(sort_col)
+            itemid_col_idx = cols.index('itemid')
+            split_count = max(subject_col_idx, itemid_col_idx) + 1
+
+            for line in logical_rows(f):
+                parts = line.split(b',', split_count)
+                if len(parts) <= max(subject_col_idx, itemid_col_idx):
+                    continue
+                bit = vital_bits.get(parts[itemid_col_idx])
+                if bit:
+                    sid = int(parts[subject_col_idx].strip(b'"'))
+                    vital_flags[sid] = vital_flags.get(sid, 0) | bit
+
+        print(f"[{file_id}] Vital scan complete in {time.time() - start_time:.2f}s")
+        subjects_df = self._apply_vital_flags(pd.read_csv(target_csv_path), file_id, vitals, vital_flags)
+        subjects_df.to_csv(target_csv_path, index=False)
+        self._load_lookup_table()
+
+    def subjects_with(self, vital):
+        """Subject IDs with readings of `vital` (a VITALS key), or None if it hasn't been indexed."""
+        column = vital_column(vital)
+        if self.lookup_df is None or column not in self.lookup_df.columns:
+            return None
+        return self.lookup_df.index[self.lookup_df[column] == 1].to_numpy()
+
 # Lazy imports for export and backward compatibility to avoid circular imports
 # These will be imported at the end of module initialization
 _File_Filter = None
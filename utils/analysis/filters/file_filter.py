@@ -1,6 +1,10 @@
+import copy
 import os
+import numpy as np
 import pandas as pd
+import threading
 import time
+from contextlib import contextmanager
 from io import BytesIO
 import sys
 
@@ -8,18 +12,55 @@ import sys
 # Note: internal imports might be tricky depending on how this is run. 
 # Attempting relative import assuming this is used as a package.
 try:
-    from ..filtering import Filterer, IDs, ROOT_URL, HAS_INDEXED_GZIP
+    from ..filtering import Filterer, IDs, ROOT_URL, HAS_INDEXED_GZIP, ROW_INDEX_SUFFIX, read_logical_row
 except ImportError:
     # If run directly or path issues, try absolute import
-    from utils.analysis.filtering import Filterer, IDs, ROOT_URL, HAS_INDEXED_GZIP
+    from utils.analysis.filtering import Filterer, IDs, ROOT_URL, HAS_INDEXED_GZIP, ROW_INDEX_SUFFIX, read_logical_row
+
+try:
+    from ..dictionaries import get_dictionary
+except ImportError:
+    from utils.analysis.dictionaries import get_dictionary
 
 try:
     import indexed_gzip
 except ImportError:
     pass
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Per-process File_Filter instances, so workers and app requests reuse lookup tables and gzip handles
+_FILTER_CACHE = {}
+# Gzip handles a File_Filter keeps open per process. Threads reading at the same time each
+# check one out; each handle holds its own copy of the .idx seek points in memory
+MAX_GZIP_HANDLES = 4
+_FILTER_CACHE_LOCK = threading.Lock()
+
+
+def get_file_filter(file_id):
+    """Returns the process-wide cached File_Filter for file_id, creating it on first use."""
+    if file_id not in _FILTER_CACHE:
+        with _FILTER_CACHE_LOCK:
+            if file_id not in _FILTER_CACHE:
+                _FILTER_CACHE[file_id] = File_Filter(file_id)
+    return _FILTER_CACHE[file_id]
+
+
+def reset_file_filters():
+    """Closes and drops the cached File_Filters, so the next get_file_filter reloads lookup tables."""
+    with _FILTER_CACHE_LOCK:
+        for ff in _FILTER_CACHE.values():
+            ff.close()
+        _FILTER_CACHE.clear()
+
+
 class File_Filter(Filterer):
-    def __init__(self, file_id, file_path=None, debug=False):
+    def __init__(self, file_id, file_path=None, debug=False, max_handles=MAX_GZIP_HANDLES):
         super().__init__(debug=debug)
         self.file_id = file_id
         
@@ -52,6 +93,36 @@ class File_Filter(Filterer):
             self.header = []
             self.sort_col_idx = -1
 
+        self._row_index = None
+        self._init_handles(max_handles)
+
+        # Columns pyarrow must read as text so values keep their CSV form (as pandas does):
+        # time columns up front, plus any other column found to hold dates or timestamps
+        self._text_columns = frozenset(col for col in self.header if col.endswith('time'))
+
+    def _init_handles(self, max_handles):
+        """Sets up an empty pool of gzip handles and per-thread buffers."""
+        # Pool of lazily opened gzip handles. A read checks one out for its seek + read, so
+        # up to max_handles threads decompress at once; parsing happens after it is returned.
+        # The pool is tagged with the owning pid so forked workers open their own handles.
+        self.max_handles = max(1, max_handles)
+        self._idle_handles = []
+        self._open_handles = 0
+        self._gzip_pid = None
+        self._gzip_cond = threading.Condition()
+
+        # Per-thread decompression buffer, reused across reads and grown on demand
+        self._local = threading.local()
+
+    def with_own_handles(self, max_handles=MAX_GZIP_HANDLES):
+        """
+        A File_Filter sharing this one's lookup table and row index but with a separate pool
+        of gzip handles, for background reads that foreground reads must never wait behind.
+        """
+        clone = copy.copy(self)
+        clone._init_handles(max_handles)
+        return clone
+
     def generate_byte_index(self, lookup_csv_path=None):
         """
         Scans the file to generate byte offsets for each subject and updates the lookup CSV.
@@ -59,23 +130,70 @@ class File_Filter(Filterer):
         """
         super().generate_byte_index(self.file_id, self.file_path, lookup_csv_path)
 
+    def _load_row_index(self):
+        """
+        Loads the sparse row-number -> byte-offset index written during indexing.
+        Returns None if it has not been generated.
+        """
+        if self._row_index is None:
+            row_index_path = self.file_path + ROW_INDEX_SUFFIX
+            if not os.path.exists(row_index_path):
+                return None
+            with np.load(row_index_path) as npz:
+                self._row_index = {
+                    "offsets": npz["offsets"],
+                    "spacing": int(npz["spacing"]),
+                    "rows": int(npz["rows"]),
+                }
+            # The scanned row count is authoritative over the static metadata
+            self.total_rows = self._row_index["rows"]
+        return self._row_index
+
+    def get_rows(self, start, stop, columns=None):
+        """
+        Returns data rows [start, stop) (0-based, header excluded) as a DataFrame indexed by row number.
+
+        Uses the sparse row index to seek to the nearest checkpoint at or before `start`,
+        so the cost depends on the number of rows requested rather than their position.
+        Rows are logical CSV rows: a quoted field spanning several lines is one row.
+        Falls back to a sequential pandas scan if the row index has not been built.
+        """
+        row_index = self._load_row_index()
+        start = max(0, int(start))
+        stop = min(int(stop), self.total_rows)
+        if stop <= start:
+            return pd.DataFrame(columns=columns or self.header)
+
+        if row_index is None or not HAS_INDEXED_GZIP:
+            if self.debug:
+                print(f"[get_rows] No row index for {self.file_id}. Falling back to sequential scan.")
+            df = pd.read_csv(self.file_path, skiprows=range(1, start + 1), nrows=stop - start, usecols=columns)
+        else:
+            spacing = row_index["spacing"]
+            checkpoint = start // spacing
+            with self._handle() as f:
+                f.seek(int(row_index["offsets"][checkpoint]))
+                for _ in range(start - checkpoint * spacing):
+                    read_logical_row(f)
+                data = b"".join(read_logical_row(f) for _ in range(stop - start))
+            df = self._parse_bytes(data)
+            if columns:
+                df = df[columns]
+
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
+
     def _get_value_at_index(self, index):
         """
         Reads the value of the sort column at the specified 0-based data index.
         """
+        # Loading the row index replaces the static row count with the scanned one
+        self._load_row_index()
         if index < 0 or index >= self.total_rows:
             return None
-            
-        # Skip header (1 row) + index rows
-        skip = 1 + index
+
         try:
-            df = pd.read_csv(
-                self.file_path, 
-                skiprows=skip, 
-                nrows=1, 
-                header=None, 
-                usecols=[self.sort_col_idx]
-            )
+            df = self.get_rows(index, index + 1, columns=[self.sort_col])
             if df.empty:
                 return None
             return df.iloc[0, 0]
@@ -83,90 +201,294 @@ class File_Filter(Filterer):
             print(f"Error reading index {index}: {e}")
             return None
 
-    def search_subject(self, subject_id):
+    def _open_gzip(self):
         """
-        Searches for a subject_id and returns all their records using byte-offset indexing.
+        Opens the gzip file for random access, importing the prebuilt .idx seek points if available.
         """
-        start_time = time.time()
-        if self.debug:
-            print(f"[search_subject] Searching for subject_id: {subject_id}")
-        
-        start_col = f"{self.file_id}_byteidx_start"
-        end_col = f"{self.file_id}_byteidx_end"
-        
         if not HAS_INDEXED_GZIP:
             error_msg = "[ERROR] indexed_gzip is required for search_subject."
             print(error_msg)
             raise ImportError(error_msg)
-        
+
+        index_file_path = self.file_path + ".idx"
+        f = indexed_gzip.IndexedGzipFile(self.file_path)
+        if os.path.exists(index_file_path):
+            f.import_index(filename=index_file_path)
+        else:
+            print(f"[WARNING] No .idx file found at {index_file_path}. Building index on-the-fly...")
+        return f
+
+    def _reset_pool_after_fork(self):
+        """Forgets handles inherited from a parent process. Must be called holding _gzip_cond."""
+        if self._gzip_pid != os.getpid():
+            self._idle_handles = []
+            self._open_handles = 0
+            self._gzip_pid = os.getpid()
+
+    @contextmanager
+    def _handle(self):
+        """
+        Yields a gzip handle checked out of this instance's pool for exclusive use.
+
+        An idle handle is reused; otherwise a new one is opened while fewer than
+        max_handles exist, else the caller waits for one to be returned. Importing the
+        .idx seek points is expensive, so it is paid once per handle, not per read.
+        """
+        with self._gzip_cond:
+            self._reset_pool_after_fork()
+            while not self._idle_handles and self._open_handles >= self.max_handles:
+                self._gzip_cond.wait()
+            handle = self._idle_handles.pop() if self._idle_handles else None
+            if handle is None:
+                self._open_handles += 1
+            pid = self._gzip_pid
+
+        if handle is None:
+            try:
+                handle = self._open_gzip()
+            except Exception:
+                with self._gzip_cond:
+                    self._open_handles -= 1
+                    self._gzip_cond.notify()
+                raise
+        try:
+            yield handle
+        finally:
+            with self._gzip_cond:
+                if pid == self._gzip_pid:
+                    self._idle_handles.append(handle)
+                else:
+                    # The pool was closed while the handle was checked out
+                    handle.close()
+                self._gzip_cond.notify()
+
+    def open(self):
+        """Opens one of this process's gzip handles ahead of the first read (e.g. in a forked server worker)."""
+        with self._handle():
+            pass
+
+    def close(self):
+        """Closes this process's idle gzip handles; handles in use are closed when returned."""
+        with self._gzip_cond:
+            if self._gzip_pid == os.getpid():
+                for handle in self._idle_handles:
+                    handle.close()
+            self._idle_handles = []
+            self._open_handles = 0
+            self._gzip_pid = None
+            self._gzip_cond.notify_all()
+
+    def _check_byte_index(self):
+        """
+        Ensures the lookup table holds byte-offset columns for this file.
+        Returns the (start_col, end_col) column names.
+        """
+        start_col = f"{self.file_id}_byteidx_start"
+        end_col = f"{self.file_id}_byteidx_end"
+
         if self.lookup_df is None:
             error_msg = f"[ERROR] Lookup table not found at {self.lookup_path}."
             print(error_msg)
             raise FileNotFoundError(error_msg)
-        
+
         if start_col not in self.lookup_df.columns or end_col not in self.lookup_df.columns:
             error_msg = f"[ERROR] Byte-offset index columns ({start_col}, {end_col}) not found in lookup table."
             print(error_msg)
             raise ValueError(error_msg)
-        
+
+        return start_col, end_col
+
+    def get_byte_range(self, subject_id):
+        """
+        Returns the (start_byte, end_byte) range of a subject in the decompressed file,
+        or None if the subject has no rows in this file.
+        """
+        start_col, end_col = self._check_byte_index()
+
         if subject_id not in self.lookup_df.index:
             if self.debug:
                 print(f"[search_subject] Subject {subject_id} not found in lookup table")
-            return pd.DataFrame(columns=self.header)
-        
+            return None
+
         info = self.lookup_df.loc[subject_id]
         start_byte = int(info[start_col])
         end_byte = int(info[end_col])
-        
+
         if start_byte == -1 or end_byte == -1:
             if self.debug:
                 print(f"[search_subject] Subject {subject_id} has no data in {self.file_id}")
+            return None
+
+        return start_byte, end_byte
+
+    def get_byte_ranges(self, subject_ids):
+        """
+        Returns a DataFrame of (subject_id, start, end) for the given subjects, sorted by start offset.
+        Subjects without rows in this file are dropped.
+        """
+        start_col, end_col = self._check_byte_index()
+
+        ids = pd.Index(pd.unique(pd.Series(list(subject_ids), dtype="int64")))
+        ranges = self.lookup_df.reindex(ids)[[start_col, end_col]]
+        ranges = ranges.dropna()
+        ranges = ranges[(ranges[start_col] != -1) & (ranges[end_col] != -1)].astype("int64")
+        ranges = ranges.rename(columns={start_col: "start", end_col: "end"})
+        ranges.index.name = "subject_id"
+        return ranges.reset_index().sort_values("start", kind="stable").reset_index(drop=True)
+
+    def _parse_bytes(self, data, text_columns=()):
+        """
+        Parses a decompressed block of CSV rows (without header) into a DataFrame.
+
+        `data` may be bytes or a memoryview. With pyarrow the buffer is wrapped without
+        copying and parsed as a single block (so type inference sees every row); pandas
+        is used as a fallback. Both accept quoted fields containing newlines and keep
+        dates and timestamps as their source text. Columns in `text_columns` are read as
+        their source text too, whatever their values look like.
+        """
+        if len(data) == 0:
             return pd.DataFrame(columns=self.header)
-        
-        length_bytes = end_byte - start_byte
+
+        text_columns = [col for col in text_columns if col in self.header]
+        if not HAS_PYARROW:
+            return pd.read_csv(BytesIO(data), names=self.header, header=None, dtype=dict.fromkeys(text_columns, str))
+
+        while True:
+            table = pa_csv.read_csv(
+                pa.BufferReader(pa.py_buffer(data)),
+                read_options=pa_csv.ReadOptions(column_names=self.header, block_size=len(data) + 1),
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={col: pa.string() for col in self._text_columns.union(text_columns)},
+                    strings_can_be_null=True
+                )
+            )
+            # A column inferred as a date or timestamp is re-read as text (once per column and instance)
+            temporal = {field.name for field in table.schema if pa.types.is_temporal(field.type)}
+            if not temporal:
+                return table.to_pandas()
+            self._text_columns = self._text_columns | temporal
+
+    def _read_into_buffer(self, f, length):
+        """
+        Decompresses `length` bytes from the handle's current position into this thread's buffer.
+
+        Returns:
+            memoryview: View over the bytes read (valid until this thread's next read).
+        """
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < length:
+            buffer = self._local.buffer = bytearray(length)
+        view = memoryview(buffer)[:length]
+        total = 0
+        while total < length:
+            n = f.readinto(view[total:])
+            if not n:
+                break
+            total += n
+        return view[:total]
+
+    def _read_range(self, subject_id, start_byte, end_byte, text_columns=()):
+        """
+        Reads and parses a subject's byte range (see _parse_bytes for `text_columns`).
+
+        The gzip handle is only checked out for the seek and decompression; the bytes are
+        parsed from this thread's buffer after it is returned, so other threads can read
+        meanwhile. Returns an empty frame if the decoded rows belong to a different subject.
+        """
+        with self._handle() as f:
+            f.seek(start_byte)
+            data = self._read_into_buffer(f, end_byte - start_byte)
+        result_df = self._parse_bytes(data, text_columns)
+
+        if not result_df.empty:
+            actual_subject = result_df.iloc[0, self.sort_col_idx]
+            # Handle types if needed (str vs int)
+            # Assuming int for subject_id as per usual MIMIC
+            try:
+                actual_subject = int(actual_subject)
+                subject_id = int(subject_id)
+            except ValueError:
+                pass
+
+            if actual_subject != subject_id:
+                print(f"[search_subject] ERROR: Loaded data for subject {actual_subject}, but expected {subject_id}.")
+                return pd.DataFrame(columns=self.header)
+
+        return result_df
+
+    def add_labels(self, df):
+        """
+        Appends label/category/unit columns from this file's dictionary table (e.g. d_items).
+        The dictionary is loaded once per process and mapped by index, not merged.
+        """
+        dictionary_id = self.metadata.get("dictionary")
+        if not dictionary_id:
+            return df
+        return get_dictionary(dictionary_id).enrich(df)
+
+    def search_subject(self, subject_id, with_labels=False):
+        """
+        Searches for a subject_id and returns all their records using byte-offset indexing.
+        If with_labels is True, dictionary fields (label, category, unitname) are appended per itemid.
+        """
+        start_time = time.time()
         if self.debug:
-            print(f"[search_subject] Using byte-offset lookup: offset={start_byte}, length={length_bytes} bytes")
-        
-        index_file_path = self.file_path + ".idx"
-        
+            print(f"[search_subject] Searching for subject_id: {subject_id}")
+
+        if not HAS_INDEXED_GZIP:
+            error_msg = "[ERROR] indexed_gzip is required for search_subject."
+            print(error_msg)
+            raise ImportError(error_msg)
+
+        byte_range = self.get_byte_range(subject_id)
+        if byte_range is None:
+            return pd.DataFrame(columns=self.header)
+
+        start_byte, end_byte = byte_range
+        if self.debug:
+            print(f"[search_subject] Using byte-offset lookup: offset={start_byte}, length={end_byte - start_byte} bytes")
+
         try:
-            with indexed_gzip.IndexedGzipFile(self.file_path) as f:
-                if os.path.exists(index_file_path):
-                    f.import_index(filename=index_file_path)
-                else:
-                    print(f"[WARNING] No .idx file found at {index_file_path}. Building index on-the-fly...")
-                
-                f.seek(start_byte)
-                data = f.read(length_bytes)
-            
-            result_df = pd.read_csv(BytesIO(data), names=self.header, header=None)
-            
-            if not result_df.empty:
-                actual_subject = result_df.iloc[0, self.sort_col_idx]
-                # Handle types if needed (str vs int)
-                # Assuming int for subject_id as per usual MIMIC
-                try:
-                    actual_subject = int(actual_subject)
-                    subject_id = int(subject_id)
-                except ValueError:
-                    pass 
-
-                if actual_subject != subject_id:
-                    print(f"[search_subject] ERROR: Loaded data for subject {actual_subject}, but expected {subject_id}.")
-                    return pd.DataFrame(columns=self.header)
-            
+            result_df = self._read_range(subject_id, start_byte, end_byte)
+
             if self.debug:
                 end_time = time.time()
                 duration = end_time - start_time
                 print(f"[search_subject] Successfully loaded {len(result_df)} rows for subject {subject_id} in {duration:.4f}s")
-            
+
+            if with_labels:
+                result_df = self.add_labels(result_df)
             return result_df
-            
+
         except Exception as e:
             error_msg = f"[ERROR] Failed to read data for subject {subject_id}: {str(e)}"
             print(error_msg)
             raise RuntimeError(error_msg) from e
 
+    def search_subjects(self, subject_ids, with_labels=False, text_columns=()):
+        """
+        Yields (subject_id, DataFrame) for many subjects, reading through this instance's gzip handles.
+
+        Subjects are read in ascending byte-offset order so the decompressor only moves
+        forward through the file; subjects without rows in this file are skipped.
+        Columns in `text_columns` keep their source text (e.g. to fill a fixed string schema).
+        """
+        ranges = self.get_byte_ranges(subject_ids)
+        if ranges.empty:
+            return
+
+        for subject_id, start_byte, end_byte in ranges.itertuples(index=False):
+            try:
+                df = self._read_range(subject_id, start_byte, end_byte, text_columns)
+            except Exception as e:
+                error_msg = f"[ERROR] Failed to read data for subject {subject_id}: {str(e)}"
+                print(error_msg)
+                raise RuntimeError(error_msg) from e
+            if with_labels:
+                df = self.add_labels(df)
+            yield int(subject_id), df
+
     def filter_by_column(self, column_name, value, subject_id=None):
         """
         Filters data by column/value.
@@ -1,15 +1,42 @@
 from ..filtering import Filterer, IDs
-from .file_filter import File_Filter
+from ..transport import export_frame, import_frame, discard
+from .file_filter import File_Filter, get_file_filter
+from concurrent.futures import ProcessPoolExecutor
+import os
 import pandas as pd
 import time
 
+
+def _fetch_shared(file_id, subject_ids):
+    """
+    Worker: reads subjects from one file in byte-offset order and exports each frame
+    to shared memory, returning only the small handles to the parent.
+    """
+    ff = get_file_filter(file_id)
+    handles = []
+    try:
+        for subject_id, df in ff.search_subjects(subject_ids):
+            handles.append((subject_id, export_frame(df)))
+    except Exception:
+        for _, handle in handles:
+            discard(handle)
+        raise
+    return file_id, handles
+
+
 class Subject_Filter(Filterer):
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, workers=None):
         """
         Initializes the Subject_Filter.
         Pre-initializes File_Filter instances for all available files.
+
+        Args:
+            debug (bool): Verbose output.
+            workers (int): Size of the process pool used by parallel retrieval (default: CPU count - 1).
         """
         super().__init__(debug=debug)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self._pool = None
         self.filters = {}
         if self.debug:
             print("[Subject_Filter] Initializing child filters for all files...")
@@ -21,9 +48,28 @@ class Subject_Filter(Filterer):
                 print(f"[Subject_Filter] Warning: Failed to initialize filter for {file_id}: {e}")
                 self.filters[file_id] = None
 
+    def _get_pool(self):
+        """Returns the process pool, starting it on first use."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        """Shuts down the process pool, if started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _empty_frame(self, file_id):
+        filter_instance = self.filters.get(file_id)
+        return pd.DataFrame(columns=filter_instance.header if filter_instance else [])
+
     def get_all_subject_data(self, subject_id):
         """
         Retrieves all data for a specific subject across all files.
+
+        Reads happen in this process: for one subject, the shared-memory round trip of
+        the process pool costs more than it saves (see get_cohort_data for many subjects).
         
         Args:
             subject_id (int): The subject ID to retrieve data for.
@@ -58,3 +104,69 @@ class Subject_Filter(Filterer):
             print(f"[Subject_Filter] Finished data retrieval for subject {subject_id} in {duration:.4f}s")
                 
         return results
+
+    def get_cohort_data(self, subject_ids, file_ids=None, chunk_size=200):
+        """
+        Retrieves data for many subjects across files using the process pool.
+
+        Each task reads a chunk of subjects from one file in byte-offset order. Workers
+        return results through shared memory (see utils.analysis.transport) rather than
+        pickling DataFrames back to this process.
+
+        Args:
+            subject_ids (list): Subject IDs to retrieve.
+            file_ids (list): Files to read (default: all initialized files present on disk).
+            chunk_size (int): Subjects per worker task.
+
+        Returns:
+            dict: {subject_id: {file_id: DataFrame}}; subjects without rows get empty frames.
+
+        Raises:
+            RuntimeError: If a file can't be planned or a worker fails. No partial result is
+                returned, so an empty frame always means the subject has no rows.
+        """
+        if file_ids is None:
+            file_ids = [f for f, ff in self.filters.items() if ff and ff.header]
+        missing = [f for f in file_ids if not self.filters.get(f)]
+        if missing:
+            raise ValueError(f"[Subject_Filter] Files not initialized: {', '.join(missing)}")
+        subject_ids = [int(s) for s in subject_ids]
+        results = {sid: {file_id: self._empty_frame(file_id) for file_id in file_ids} for sid in subject_ids}
+
+        if self.debug:
+            start_time = time.time()
+            print(f"[Subject_Filter] Starting parallel retrieval for {len(subject_ids)} subjects from {file_ids}")
+
+        plans = {}
+        for file_id in file_ids:
+            try:
+                plans[file_id] = self.filters[file_id].get_byte_ranges(subject_ids)["subject_id"].tolist()
+            except Exception as e:
+                raise RuntimeError(f"[Subject_Filter] Error planning retrieval from {file_id}: {e}") from e
+
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_fetch_shared, file_id, ordered[i:i + chunk_size])
+            for file_id, ordered in plans.items() for i in range(0, len(ordered), chunk_size)
+        ]
+
+        error = None
+        for future in futures:
+            try:
+                file_id, handles = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            for subject_id, handle in handles:
+                if error is None:
+                    results[subject_id][file_id] = import_frame(handle)
+                else:
+                    # Results of other tasks are still released from shared memory
+                    discard(handle)
+        if error is not None:
+            raise RuntimeError(f"[Subject_Filter] Error during parallel retrieval: {error}") from error
+
+        if self.debug:
+            print(f"[Subject_Filter] Finished parallel retrieval in {time.time() - start_time:.4f}s")
+
+        return results
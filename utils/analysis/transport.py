@@ -0,0 +1,138 @@
+"""
+Shared-Memory Result Transport
+
+Moves DataFrames from worker processes to the parent without pickling them. A worker
+serializes its result as an Arrow IPC stream directly into a `multiprocessing.shared_memory`
+block and returns a small picklable handle; the parent memory-maps the block, reads the
+stream in place and unlinks the block. The only copy on the way is the Arrow to pandas
+conversion; Arrow keeps the mapping alive while anything read from it is.
+"""
+
+import os
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Where POSIX shared memory blocks appear as files (Linux); elsewhere the stream is copied out
+SHM_DIR = '/dev/shm'
+
+
+@dataclass(frozen=True)
+class SharedFrameHandle:
+    """Picklable reference to an Arrow IPC stream held in shared memory."""
+    name: str
+    size: int
+    rows: int
+
+
+def _create_untracked(size):
+    """
+    Creates a shared memory block that the creating process will not clean up on exit.
+    Ownership passes to whichever process calls `release`.
+    """
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        # Python < 3.13: no track flag, so unregister from this process's resource tracker
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def export_frame(df):
+    """
+    Writes a DataFrame into a new shared memory block as an Arrow IPC stream.
+
+    Returns:
+        SharedFrameHandle: Handle to pass back to the parent process.
+    """
+    if not HAS_PYARROW:
+        raise ImportError("pyarrow is required for shared-memory transport.")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Measure the stream first so the block can be sized exactly. The mock stream only
+    # counts bytes, so the data itself is written once, straight into the block.
+    sizer = pa.MockOutputStream()
+    with pa.ipc.new_stream(sizer, table.schema) as writer:
+        writer.write_table(table)
+    size = sizer.size()
+
+    shm = _create_untracked(max(size, 1))
+    try:
+        _write_stream(shm.buf, table)
+    except BaseException:
+        release(shm)
+        raise
+    shm.close()
+    return SharedFrameHandle(name=shm.name, size=size, rows=table.num_rows)
+
+
+def _write_stream(buf, table):
+    # Arrow holds an export of `buf` while the writer is alive; keeping it local to
+    # this frame guarantees the export is gone before the block is closed
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(buf))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+
+
+def _read_frame(buf, size):
+    # Copy fallback: pandas keeps some Arrow-backed columns (e.g. strings) as views of the
+    # Arrow buffers, which must not point into a block that is about to be closed
+    data = pa.py_buffer(buf[:size].tobytes())
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def import_frame(handle):
+    """
+    Reads a shared block into a DataFrame and releases the block.
+
+    Where blocks are files under SHM_DIR, the block is memory-mapped and the stream is
+    decoded in place; the mapping lives as long as the Arrow buffers (and any DataFrame
+    column viewing them), so the block is unlinked right away. Elsewhere the stream is
+    copied out of the block in a single memcpy. Nothing is unpickled either way.
+    """
+    path = os.path.join(SHM_DIR, handle.name.lstrip('/'))
+    if not os.path.exists(path):
+        shm = shared_memory.SharedMemory(name=handle.name)
+        try:
+            return _read_frame(shm.buf, handle.size)
+        finally:
+            release(shm)
+
+    try:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_stream(source).read_all()
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return table.to_pandas()
+
+
+def release(shm):
+    """Closes and unlinks a shared memory block."""
+    try:
+        shm.close()
+    except BufferError:
+        # A view is still alive somewhere; the mapping goes away when it is collected
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def discard(handle):
+    """Releases a block that will not be read (e.g. after a failed batch)."""
+    try:
+        release(shared_memory.SharedMemory(name=handle.name))
+    except FileNotFoundError:
+        pass
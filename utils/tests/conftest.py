@@ -0,0 +1,61 @@
+"""Shared fixtures: small gzipped MIMIC-style tables indexed the way the real ones are."""
+
+import gzip
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils.analysis import filtering
+from utils.analysis.filters import file_filter
+
+
+def chartevents_frame(subjects=(1, 2, 3), rows=50, seed=0):
+    """chartevents-like rows: `rows` readings every 5 minutes per subject, alternating two itemids."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for sid in subjects:
+        times = pd.date_range('2180-01-01', periods=rows, freq='5min').strftime('%Y-%m-%d %H:%M:%S')
+        frames.append(pd.DataFrame({
+            'subject_id': sid, 'hadm_id': 100 + sid, 'stay_id': 200 + sid, 'caregiver_id': np.nan,
+            'charttime': times, 'storetime': times,
+            'itemid': np.where(np.arange(rows) % 2 == 0, 220045, 220277),
+            'value': rng.normal(80, 5, rows).round(1), 'valuenum': rng.normal(80, 5, rows).round(1),
+            'valueuom': 'bpm', 'warning': 0,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def make_table(tmp_path, monkeypatch):
+    """
+    Writes a DataFrame as a gzipped table, indexes it and registers its File_Filter.
+
+    The File_Filter is what get_file_filter(file_id) returns for the rest of the test;
+    the process-wide filter cache is restored afterwards.
+    """
+    monkeypatch.setattr(file_filter, '_FILTER_CACHE', {})
+    # Small row index spacing, so reads start from checkpoints other than the first
+    monkeypatch.setattr(filtering, 'ROW_INDEX_SPACING', 3)
+    lookup_path = str(tmp_path / 'lookup.csv')
+
+    def make(df, file_id='chartevents'):
+        path = str(tmp_path / f'{file_id}.csv.gz')
+        with gzip.open(path, 'wt') as f:
+            df.to_csv(f, index=False)
+        if not os.path.exists(lookup_path):
+            pd.DataFrame({'subject_id': sorted(df['subject_id'].unique())}).to_csv(lookup_path, index=False)
+        ff = file_filter.File_Filter(file_id, file_path=path)
+        ff.lookup_path = lookup_path
+        ff.generate_byte_index(lookup_csv_path=lookup_path)
+        file_filter._FILTER_CACHE[file_id] = ff
+        return ff
+
+    yield make
+    for ff in file_filter._FILTER_CACHE.values():
+        ff.close()
@@ -0,0 +1,133 @@
+"""BPM app API: conditional requests, compression and progressive loads."""
+
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from apps.bpm import create_bpm_app
+from apps.bpm.config import Config
+from apps.bpm.http_cache import compress_response, etag_for, with_etag
+from conftest import chartevents_frame
+
+SUBJECTS = [1, 2, 3]
+
+
+@pytest.fixture
+def bpm_client(make_table, tmp_path, monkeypatch):
+    """Test client of the BPM app over a small chartevents table, without d_items, store or prefetching."""
+    make_table(chartevents_frame(subjects=SUBJECTS, rows=400))
+    monkeypatch.setattr(Config, 'SUBJECT_IDS_FILE', str(tmp_path / 'lookup.csv'))
+    monkeypatch.setattr(Config, 'HEART_RATE_LABEL', None)
+    monkeypatch.setattr(Config, 'HR_STORE_DIR', str(tmp_path / 'no_store'))
+    monkeypatch.setattr(Config, 'PREFETCH_WORKERS', 0)
+    return create_bpm_app().test_client()
+
+
+def test_etag_for_is_stable():
+    assert etag_for('load-data', 1, 'heart_rate', 'v1') == etag_for('load-data', 1, 'heart_rate', 'v1')
+    assert etag_for('load-data', 1, 'heart_rate', 'v1') != etag_for('load-data', 1, 'heart_rate', 'v2')
+    assert etag_for(1, 23) != etag_for(12, 3)
+
+
+@pytest.mark.parametrize('url', ['/api/load-data?subject_id=2', '/api/load-data/stream?subject_id=2'])
+def test_revalidation_returns_304(bpm_client, url):
+    first = bpm_client.get(url)
+    first.get_data()
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    again = bpm_client.get(url, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == etag
+
+    other = bpm_client.get(url + '&interpolation_method=cubic_spline', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+
+
+def test_random_loads_are_not_tagged(bpm_client):
+    response = bpm_client.get('/api/load-data?random=1')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_json_is_compressed_when_accepted(bpm_client):
+    plain = bpm_client.get('/api/load-data?subject_id=1')
+    packed = bpm_client.get('/api/load-data?subject_id=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert gzip.decompress(packed.get_data()) == plain.get_data()
+
+
+def test_streamed_responses_pass_through(bpm_client):
+    response = bpm_client.get('/api/load-data/stream?subject_id=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data().startswith(b'{')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(COMPRESS_MIN_BYTES=100, COMPRESS_MIMETYPES=('application/json',), GZIP_LEVEL=6, BROTLI_QUALITY=5)
+    app.after_request(compress_response)
+
+    @app.route('/small')
+    def small():
+        return {'a': 1}
+
+    @app.route('/large')
+    def large():
+        return with_etag(app.response_class(b'x' * 500, mimetype='text/plain'), 'abc')
+
+    @app.route('/failed')
+    def failed():
+        return {'error': 'e' * 500}, 500
+
+    return app
+
+
+@pytest.mark.parametrize('url', ['/small', '/large', '/failed'])
+def test_compression_skips_small_other_types_and_errors(app, url):
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def stream(client, url):
+    return [json.loads(line) for line in client.get(url).get_data(as_text=True).splitlines()]
+
+
+def test_stream_events_in_order(bpm_client):
+    bpm_client.application.config.update(STREAM_OVERVIEW_POINTS=50, STREAM_SEGMENT_POINTS=100)
+    events = stream(bpm_client, '/api/load-data/stream?subject_id=3&interpolation_method=cubic_spline&width=2000')
+    kinds = [event['event'] for event in events]
+    assert kinds[:2] == ['subject', 'overview']
+    assert kinds[-2:] == ['interpolation', 'done']
+    segments = events[2:-2]
+    assert {event['event'] for event in segments} == {'segment'}
+    assert [event['index'] for event in segments] == list(range(segments[0]['count']))
+    assert len(segments) > 1
+
+    # Segments run through the stay in time order and end at its last reading
+    x = [hour for event in segments for hour in event['x']]
+    assert x == sorted(x) and len(set(x)) == len(x)
+    loaded = bpm_client.get('/api/load-data?subject_id=3').get_json()
+    assert x[-1] == pytest.approx(loaded['line_graph']['data'][0]['x'][-1])
+    assert events[1]['statistics'] == loaded['statistics']
+
+
+def test_stream_without_segments(bpm_client):
+    # A stay within the overview budget is complete after the overview
+    bpm_client.application.config.update(STREAM_OVERVIEW_POINTS=1000)
+    kinds = [event['event'] for event in stream(bpm_client, '/api/load-data/stream?subject_id=1')]
+    assert kinds == ['subject', 'overview', 'done']
+
+
+def test_stream_rejects_unknown_subjects(bpm_client):
+    response = bpm_client.get('/api/load-data/stream?subject_id=42')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
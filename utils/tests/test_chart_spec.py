@@ -0,0 +1,61 @@
+"""BPM chart specs against the go.Figure output they replaced."""
+
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+import pytest
+
+from apps.bpm.chart_spec import dumps
+from apps.bpm.routes import create_line_plot
+
+
+def as_lists(value):
+    """Spec values as the old code passed them to go.Figure (lists, not arrays)."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: as_lists(v) for k, v in value.items()}
+    return value
+
+
+def go_figure_json(spec):
+    """The spec rebuilt through go.Figure and PlotlyJSONEncoder, parsed."""
+    fig = go.Figure()
+    for trace in spec['data']:
+        fig.add_trace(go.Scatter(**as_lists({k: v for k, v in trace.items() if k != 'type'})))
+    fig.update_layout(**{k: v for k, v in spec['layout'].items() if k != 'template'})
+    return json.loads(json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    times = np.datetime64('2180-01-01T00:00:00', 's') + np.cumsum(rng.integers(60, 900, n)).astype('timedelta64[s]')
+    values = rng.normal(80, 8, n)
+    values[7] = 1e-05
+    values[9] = 1e16
+    return values, times
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'max_points': 100},
+    {'x_range': (10.0, 40.0), 'max_points': 50},
+    {'hide_original_points': True, 'bin_size': 5},
+])
+def test_spec_matches_go_figure(options):
+    values, times = series()
+    interp_times = np.linspace(times[0].astype(np.int64), times[-1].astype(np.int64), 300).astype('datetime64[s]')
+    interp_values = np.interp(interp_times.astype(np.float64), times.astype(np.float64), values)
+    binned_times, binned_values = times[::5], values[::5]
+    spec = create_line_plot(values, times, 1, interp_values, interp_times, 'cubic_spline',
+                            binned_values=binned_values, binned_timestamps=binned_times, **options)['line_graph']
+    assert json.loads(dumps(spec)) == go_figure_json(spec)
+
+
+def test_axis_titles_keep_their_font():
+    values, times = series(20)
+    layout = json.loads(dumps(create_line_plot(values, times, 1)['line_graph']))['layout']
+    for axis in ('xaxis', 'yaxis'):
+        assert layout[axis]['title']['font'] == {'size': 12, 'family': 'sans-serif', 'weight': 'bold'}
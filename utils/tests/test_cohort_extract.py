@@ -0,0 +1,97 @@
+"""Cohort extraction to Parquet: contents, resuming, stale parts and schema widening."""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import chartevents_frame
+from utils.analysis import cohort_extract
+from utils.analysis.cohort_extract import PROGRESS_FILE, extract_cohort
+
+SUBJECTS = [1, 2, 3, 4]
+
+
+@pytest.fixture
+def cohort(tmp_path):
+    path = tmp_path / 'cohort.csv'
+    # Subject 99 has no rows
+    pd.DataFrame({'subject_id': [3, 1, 99, 4]}).to_csv(path, index=False)
+    return str(path)
+
+
+def extract(cohort, out):
+    return extract_cohort(cohort, tables=['chartevents'], output_dir=str(out), workers=1, batch_size=1)
+
+
+def parts(out):
+    table_dir = out / 'chartevents'
+    return {name: os.stat(table_dir / name).st_mtime_ns for name in sorted(os.listdir(table_dir))}
+
+
+def test_extracts_cohort_rows(make_table, cohort, tmp_path):
+    source = chartevents_frame(subjects=SUBJECTS)
+    make_table(source)
+    out = tmp_path / 'out'
+    extract(cohort, out)
+    assert list(parts(out)) == ['part-00000.parquet', 'part-00001.parquet', 'part-00002.parquet']
+
+    got = pd.read_parquet(out / 'chartevents')
+    expected = source[source['subject_id'].isin([1, 3, 4])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got[['subject_id', 'charttime', 'itemid', 'valuenum']],
+                                  expected[['subject_id', 'charttime', 'itemid', 'valuenum']], check_dtype=False)
+    # value mixes numbers and text in MIMIC, so it keeps the file's text
+    assert got['value'].tolist() == expected['value'].astype(str).tolist()
+
+
+def test_rerun_resumes_and_clears_stale_parts(make_table, cohort, tmp_path):
+    make_table(chartevents_frame(subjects=SUBJECTS))
+    out = tmp_path / 'out'
+    extract(cohort, out)
+    before = parts(out)
+
+    # An interrupted run: batch 1 never finished, and parts of another run were left behind
+    with open(out / PROGRESS_FILE) as f:
+        progress = json.load(f)
+    progress['completed']['chartevents'].remove(1)
+    with open(out / PROGRESS_FILE, 'w') as f:
+        json.dump(progress, f)
+    for name in ('part-00001.parquet.tmp', 'part-00007.parquet'):
+        (out / 'chartevents' / name).write_bytes(b'stale')
+
+    extract(cohort, out)
+    after = parts(out)
+    assert list(after) == list(before)
+    assert [name for name in before if after[name] != before[name]] == ['part-00001.parquet']
+    assert len(pd.read_parquet(out / 'chartevents')) == 150
+
+
+def test_changed_cohort_starts_over(make_table, cohort, tmp_path):
+    make_table(chartevents_frame(subjects=SUBJECTS))
+    out = tmp_path / 'out'
+    extract(cohort, out)
+    other = tmp_path / 'other.csv'
+    pd.DataFrame({'subject_id': [2]}).to_csv(other, index=False)
+    extract(str(other), out)
+    assert list(parts(out)) == ['part-00000.parquet']
+    assert pd.read_parquet(out / 'chartevents')['subject_id'].unique().tolist() == [2]
+
+
+def test_text_beyond_the_sample_reextracts_as_text(make_table, cohort, tmp_path, monkeypatch):
+    monkeypatch.setattr(cohort_extract, 'SCHEMA_SAMPLE_ROWS', 20)
+    source = chartevents_frame(subjects=SUBJECTS)
+    source['warning'] = source['warning'].astype(object)
+    source.loc[120, 'warning'] = 'Checked'
+    make_table(source)
+    out = tmp_path / 'out'
+    extract(cohort, out)
+
+    got = pd.read_parquet(out / 'chartevents')
+    assert len(got) == 150
+    assert (got['warning'] == 'Checked').sum() == 1
+    assert got['warning'].notna().all()
+    with open(out / PROGRESS_FILE) as f:
+        progress = json.load(f)
+    assert progress['string_columns'] == {'chartevents': ['warning']}
+    assert sorted(progress['completed']['chartevents']) == [0, 1, 2]
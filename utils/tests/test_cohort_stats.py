@@ -0,0 +1,85 @@
+"""Cohort-wide vital statistics: per-series extras and the Parquet table."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.bpm.cohort_stats import compute_cohort_statistics, series_statistics, stat_columns
+from apps.bpm.pipeline import ProcessedSeries, load_series
+from conftest import chartevents_frame
+
+
+def series_at(minutes, values):
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + np.asarray(minutes) * np.timedelta64(1, 'm')
+    return ProcessedSeries(1, times, np.asarray(values, dtype=np.float64), np.zeros(len(values), dtype=bool),
+                           np.empty(0, dtype='datetime64[ns]'), np.empty(0))
+
+
+def test_time_in_range_caps_gaps():
+    # The 180 minute gap after the 80 counts as 60 minutes
+    row = series_statistics(series_at([0, 10, 20, 200, 210], [50, 80, 80, 120, 90]), extras=['time_in_range'])
+    assert row['hours'] == 1.5
+    assert row['time_below'] == round(10 / 90, 4)
+    assert row['time_in_range'] == round(70 / 90, 4)
+    assert row['time_above'] == round(10 / 90, 4)
+
+
+def time_in_range_by_minute(minutes, values, low, high, max_gap):
+    """Reference: walk the stay minute by minute, each minute taking the last reading's value."""
+    counts = {'below': 0, 'in': 0, 'above': 0}
+    for start, end, value in zip(minutes[:-1], minutes[1:], values[:-1]):
+        covered = min(end - start, max_gap)
+        key = 'below' if value < low else 'above' if value > high else 'in'
+        counts[key] += covered
+    total = sum(counts.values())
+    return total / 60, {k: v / total for k, v in counts.items()}
+
+
+@pytest.mark.parametrize('max_gap', [15, 60, 240])
+def test_time_in_range_matches_minutes(max_gap):
+    rng = np.random.default_rng(max_gap)
+    minutes = np.cumsum(rng.integers(1, 120, 300))
+    values = rng.normal(85, 20, 300).round()
+    row = series_statistics(series_at(minutes, values), extras=['time_in_range'], max_gap_minutes=max_gap)
+    hours, fractions = time_in_range_by_minute(minutes.tolist(), values.tolist(), 60, 100, max_gap)
+    assert row['hours'] == round(hours, 2)
+    assert row['time_below'] == pytest.approx(fractions['below'], abs=1e-4)
+    assert row['time_in_range'] == pytest.approx(fractions['in'], abs=1e-4)
+    assert row['time_above'] == pytest.approx(fractions['above'], abs=1e-4)
+
+
+def test_single_reading():
+    row = series_statistics(series_at([0], [70]))
+    assert row['hours'] == 0 and 'time_in_range' not in row
+    assert np.isnan(row['cv']) and np.isnan(row['rmssd'])
+    assert row['p5'] == row['p95'] == 70
+
+
+def test_variability_and_percentiles():
+    values = np.array([70, 75, 72, 90, 65, 80], dtype=np.float64)
+    row = series_statistics(series_at(np.arange(6) * 5, values), extras=['variability', 'percentiles'], percentiles=(10, 50))
+    assert row['cv'] == round(values.std(ddof=1) / values.mean(), 4)
+    assert row['rmssd'] == round(np.sqrt(np.mean(np.diff(values) ** 2)), 2)
+    assert row['p10'] == round(np.percentile(values, 10), 1) and row['p50'] == round(np.median(values), 1)
+    assert 'time_in_range' not in row
+
+
+def test_cohort_table(make_table, tmp_path):
+    df = chartevents_frame(subjects=[1, 2, 3, 4])
+    # Subject 4 has no heart rate readings
+    make_table(df[(df['subject_id'] != 4) | (df['itemid'] != 220045)])
+    path = compute_cohort_statistics([3, 1, 4, 99, 2], output_path=str(tmp_path / 'stats.parquet'), itemids=[220045], workers=1)
+    table = pd.read_parquet(path)
+    assert list(table.columns) == stat_columns()
+    assert table['subject_id'].tolist() == [1, 2, 3, 4, 99]
+    assert table['count'].tolist()[3:] == [0, 0]
+    assert table.iloc[3:, 2:].isna().all().all()
+    for i, subject_id in enumerate([1, 2, 3]):
+        expected = series_statistics(load_series(subject_id, [220045]))
+        got = table.iloc[i].to_dict()
+        assert got == pytest.approx({k: float(v) for k, v in expected.items()}, nan_ok=True)
+
+
+def test_rejects_unknown_extras(tmp_path):
+    with pytest.raises(ValueError):
+        compute_cohort_statistics([1], output_path=str(tmp_path / 'stats.parquet'), extras=['entropy'])
@@ -0,0 +1,191 @@
+"""Retrieval endpoints of the data app and the notebook client."""
+
+import io
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from werkzeug.serving import make_server
+
+from apps.data import create_data_app
+from conftest import chartevents_frame
+from utils.analysis import cohort_extract
+from utils.analysis.client import DataClient
+from utils.analysis.cohort_extract import SchemaMismatchError
+
+SUBJECTS = [1, 2, 3]
+
+
+@pytest.fixture
+def source(make_table):
+    df = chartevents_frame(subjects=SUBJECTS)
+    make_table(df)
+    return df
+
+
+@pytest.fixture
+def client(source):
+    app = create_data_app()
+    app.config['CHUNK_ROWS'] = 40
+    return app.test_client()
+
+
+def read_arrow(response):
+    return pa.ipc.open_stream(io.BytesIO(response.get_data())).read_all().to_pandas()
+
+
+def rows_of(df, subject_id):
+    return df[df['subject_id'] == subject_id].reset_index(drop=True)
+
+
+def test_tables(client):
+    tables = client.get('/tables').get_json()['tables']
+    chartevents = next(t for t in tables if t['table'] == 'chartevents')
+    assert chartevents['time_column'] == 'charttime'
+    assert chartevents['columns'][0] == 'subject_id'
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson', 'arrow'])
+def test_subject_formats(client, source, fmt):
+    response = client.get(f'/subjects/2/chartevents?format={fmt}&columns=charttime,itemid,valuenum')
+    assert response.status_code == 200
+    assert response.headers['X-Row-Count'] == '50'
+    if fmt == 'csv':
+        got = pd.read_csv(io.BytesIO(response.get_data()))
+    elif fmt == 'ndjson':
+        got = pd.DataFrame([json.loads(line) for line in response.get_data(as_text=True).splitlines()])
+    else:
+        got = read_arrow(response)
+    expected = rows_of(source, 2)[['charttime', 'itemid', 'valuenum']]
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_subject_filters(client, source):
+    response = client.get('/subjects/1/chartevents?format=arrow&itemid=220045'
+                          '&start=2180-01-01 01:00&end=2180-01-01 02:00')
+    got = read_arrow(response)
+    expected = rows_of(source, 1)
+    expected = expected[(expected['itemid'] == 220045) & expected['charttime'].between('2180-01-01 01:00:00', '2180-01-01 02:00:00')]
+    assert got['charttime'].tolist() == expected['charttime'].tolist()
+    assert set(got['itemid']) == {220045}
+
+
+def test_format_from_accept_header(client):
+    response = client.get('/subjects/1/chartevents', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/subjects/99/chartevents', 404),
+    ('/subjects/1/no_such_table', 404),
+    ('/subjects/1/chartevents?columns=nope', 400),
+    ('/subjects/1/chartevents?itemid=abc', 400),
+    ('/subjects/1/chartevents?start=not-a-time', 400),
+    ('/subjects/1/chartevents?format=xml', 400),
+])
+def test_subject_errors(client, url, status):
+    response = client.get(url)
+    assert response.status_code == status
+    assert 'error' in response.get_json()
+
+
+def test_bulk_streams_subjects_in_order(client, source):
+    response = client.post('/bulk/chartevents', json={'subject_ids': [3, 1, 42]})
+    assert response.status_code == 200
+    assert response.headers['X-Subject-Count'] == '2'
+    assert response.headers['X-Unknown-Subjects'] == '1'
+    got = read_arrow(response)
+    expected = pd.concat([rows_of(source, 1), rows_of(source, 3)], ignore_index=True)
+    pd.testing.assert_frame_equal(got[['subject_id', 'charttime', 'itemid', 'valuenum']],
+                                  expected[['subject_id', 'charttime', 'itemid', 'valuenum']], check_dtype=False)
+
+
+def test_bulk_schema_is_fixed(client):
+    # An all-empty column is typed from the table, not from each subject's rows
+    first = read_arrow(client.get('/bulk/chartevents?subject_ids=1'))
+    both = read_arrow(client.get('/bulk/chartevents?subject_ids=2,3&columns=caregiver_id,valuenum'))
+    assert first['caregiver_id'].dtype == both['caregiver_id'].dtype == np.float64
+    assert list(both.columns) == ['caregiver_id', 'valuenum']
+
+
+def test_bulk_keeps_source_text(make_table):
+    # value is a known mixed text column: numbers in it are sent as written in the file
+    df = chartevents_frame(subjects=SUBJECTS)
+    df['value'] = np.where(np.arange(len(df)) % 2 == 0, '72', '80.5')
+    make_table(df)
+    got = read_arrow(create_data_app().test_client().post('/bulk/chartevents', json={'subject_ids': SUBJECTS}))
+    assert got['value'].tolist() == df['value'].tolist()
+    assert got['valuenum'].dtype == np.float64
+
+
+def test_bulk_without_rows_sends_schema(client):
+    got = read_arrow(client.post('/bulk/chartevents', json={'subject_ids': [42], 'columns': ['charttime']}))
+    assert got.empty
+    assert list(got.columns) == ['charttime']
+
+
+@pytest.mark.parametrize('body, status', [
+    ({'subject_ids': []}, 400),
+    ({'subject_ids': ['x']}, 400),
+    ({'subject_ids': list(range(20_000))}, 400),
+    ([1, 2], 400),
+])
+def test_bulk_errors(client, body, status):
+    assert client.post('/bulk/chartevents', json=body).status_code == status
+
+
+def text_source(make_table, monkeypatch):
+    """A table whose warning column is numeric in the schema sample but holds text later on."""
+    monkeypatch.setattr(cohort_extract, 'SCHEMA_SAMPLE_ROWS', 20)
+    df = chartevents_frame(subjects=SUBJECTS)
+    df['warning'] = df['warning'].astype(object)
+    df.loc[120, 'warning'] = 'Checked'
+    make_table(df)
+    return df
+
+
+def test_bulk_never_nulls_text(make_table, monkeypatch):
+    text_source(make_table, monkeypatch)
+    client = create_data_app().test_client()
+    with pytest.raises(SchemaMismatchError):
+        client.post('/bulk/chartevents', json={'subject_ids': SUBJECTS}).get_data()
+    # The column is served as text from then on
+    got = read_arrow(client.post('/bulk/chartevents', json={'subject_ids': SUBJECTS}))
+    assert len(got) == 150
+    assert (got['warning'] == 'Checked').sum() == 1
+    assert got['warning'].notna().all()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app):
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return DataClient(f'http://127.0.0.1:{server.server_port}')
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_client_fetch(source, serve):
+    client = serve(create_data_app())
+    assert 'chartevents' in [t['table'] for t in client.tables()]
+    frame = client.fetch_subject(1, 'chartevents', columns=['charttime', 'valuenum'], itemids=[220277])
+    assert len(frame) == 25
+    frames = client.fetch_bulk(SUBJECTS, tables='chartevents', columns=['subject_id', 'valuenum'])
+    assert frames['chartevents']['subject_id'].tolist() == source['subject_id'].tolist()
+
+
+def test_client_retries_aborted_streams(make_table, monkeypatch, serve):
+    text_source(make_table, monkeypatch)
+    client = serve(create_data_app())
+    got = client.fetch_bulk(SUBJECTS)['chartevents']
+    assert (got['warning'] == 'Checked').sum() == 1
+    assert got['warning'].notna().all()
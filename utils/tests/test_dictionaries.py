@@ -0,0 +1,77 @@
+"""d_items lookups against pandas merges, and labels on subject reads."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import chartevents_frame
+from utils.analysis import dictionaries
+from utils.analysis.dictionaries import Item_Dictionary, get_dictionary, resolve_itemids
+
+D_ITEMS = pd.DataFrame({
+    'itemid': [220277, 220045, 220046, 220047, 220179, 223761],
+    'label': ['O2 saturation pulseoxymetry', 'Heart Rate', 'Heart rate Alarm - High', 'Heart Rate Alarm - Low',
+              'Non Invasive Blood Pressure systolic', 'Temperature Fahrenheit'],
+    'abbreviation': ['SpO2', 'HR', 'HR Alarm - High', 'HR Alarm - Low', 'NBPs', 'Temperature F'],
+    'category': ['Respiratory', 'Routine Vital Signs', 'Alarms', 'Alarms', 'Routine Vital Signs', 'Routine Vital Signs'],
+    'unitname': ['%', 'bpm', 'bpm', 'bpm', 'mmHg', '°F'],
+})
+
+
+@pytest.fixture
+def d_items(tmp_path, monkeypatch):
+    """A small d_items table, registered as the process-wide dictionary."""
+    path = tmp_path / 'd_items.csv.gz'
+    D_ITEMS.to_csv(path, index=False)
+    dictionary = Item_Dictionary('d_items', file_path=str(path))
+    monkeypatch.setattr(dictionaries, '_DICTIONARY_CACHE', {'d_items': dictionary})
+    return dictionary
+
+
+def test_map_matches_merge(d_items):
+    itemids = np.array([220045, 999999, 220277, 220045, 223761])
+    merged = pd.DataFrame({'itemid': itemids}).merge(D_ITEMS, on='itemid', how='left')
+    for field in ('label', 'category', 'unitname'):
+        pd.testing.assert_series_equal(pd.Series(d_items.map(itemids, field), name=field), merged[field], check_dtype=False)
+    with pytest.raises(ValueError):
+        d_items.map(itemids, 'fluid')
+
+
+def test_enrich_appends_fields(d_items):
+    df = chartevents_frame(subjects=[1], rows=10)[['subject_id', 'itemid', 'valuenum']]
+    df.loc[3, 'itemid'] = 999999
+    enriched = d_items.enrich(df)
+    expected = df.merge(D_ITEMS[['itemid', 'label', 'category', 'unitname']], on='itemid', how='left')
+    pd.testing.assert_frame_equal(enriched, expected, check_dtype=False)
+    # The input is left as it was
+    assert list(df.columns) == ['subject_id', 'itemid', 'valuenum']
+    assert list(d_items.enrich(df, fields=['unitname']).columns) == ['subject_id', 'itemid', 'valuenum', 'unitname']
+    assert d_items.enrich(df.iloc[0:0]).empty
+
+
+@pytest.mark.parametrize('label, exact, expected', [
+    ('Heart Rate', True, [220045]),
+    ('  heart rate ', True, [220045]),
+    ('heart rate', False, [220045, 220046, 220047]),
+    ('alarm', False, [220046, 220047]),
+    ('Pulse', True, []),
+])
+def test_find_itemids(d_items, label, exact, expected):
+    assert d_items.find_itemids(label, exact=exact) == expected
+
+
+def test_resolve_itemids(d_items, monkeypatch):
+    assert get_dictionary('d_items') is d_items
+    assert resolve_itemids('Heart Rate') == [220045]
+    # d_labitems isn't downloaded here
+    monkeypatch.setattr(dictionaries, 'ROOT_URL', '/nonexistent')
+    assert resolve_itemids('Glucose', name='d_labitems') == []
+    assert resolve_itemids('Glucose', name='no_such_dictionary') == []
+
+
+def test_subject_rows_with_labels(d_items, make_table):
+    ff = make_table(chartevents_frame(subjects=[1, 2]))
+    df = ff.search_subject(2, with_labels=True)
+    assert len(df) == 50
+    assert set(df['label']) == {'Heart Rate', 'O2 saturation pulseoxymetry'}
+    assert (df.loc[df['itemid'] == 220045, 'unitname'] == 'bpm').all()
@@ -0,0 +1,103 @@
+"""Plot downsampling of the BPM app against straightforward loop implementations."""
+
+import numpy as np
+import pytest
+
+from apps.bpm.downsample import align_to_grid, lttb, point_budget, visible_indices
+
+
+def lttb_loop(x, y, n_out):
+    """Reference LTTB, bucket by bucket as in the original algorithm."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    kept = [0]
+    a = 0
+    for i in range(n_out - 2):
+        next_lo = int(np.floor((i + 1) * every)) + 1
+        next_hi = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = np.mean(x[next_lo:next_hi]), np.mean(y[next_lo:next_hi])
+        lo = int(np.floor(i * every)) + 1
+        hi = int(np.floor((i + 1) * every)) + 1
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return np.array(kept)
+
+
+def noisy_series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.uniform(30, 600, n))
+    y = 80 + np.cumsum(rng.normal(0, 2, n)) + rng.normal(0, 5, n)
+    return x, y
+
+
+@pytest.mark.parametrize('n, n_out', [(10, 3), (100, 7), (1000, 100), (1001, 333), (5000, 1200)])
+def test_lttb_matches_loop(n, n_out):
+    x, y = noisy_series(n, seed=n)
+    np.testing.assert_array_equal(lttb(x, y, n_out), lttb_loop(x, y, n_out))
+
+
+def test_lttb_keeps_everything_within_budget():
+    x, y = noisy_series(50)
+    np.testing.assert_array_equal(lttb(x, y, 50), np.arange(50))
+    np.testing.assert_array_equal(lttb(x, y, 2), np.arange(50))
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(1000.0)
+    y = np.full(1000, 80.0)
+    y[437] = 200.0
+    assert 437 in lttb(x, y, 20)
+
+
+def test_visible_indices_window_and_budget():
+    x, y = noisy_series(2000)
+    lo, hi = x[500], x[1500]
+    idx = visible_indices(x, y, x_range=(lo, hi))
+    # One neighbour beyond each edge, so lines run to the chart edges
+    np.testing.assert_array_equal(idx, np.arange(499, 1502))
+
+    idx = visible_indices(x, y, max_points=100, x_range=(lo, hi))
+    assert len(idx) == 100
+    np.testing.assert_array_equal(idx, 499 + lttb_loop(x[499:1502], y[499:1502], 100))
+
+
+def test_point_budget_clamps():
+    assert point_budget(1000, 2, 100, 5000) == 2000
+    assert point_budget(10, 2, 100, 5000) == 100
+    assert point_budget(10**6, 2, 100, 5000) == 5000
+    assert point_budget('wide', 2, 100, 5000) == 5000
+
+
+def align_loop(hours, values, max_points):
+    """Reference grid alignment: mean of each series' readings per bucket of whole minutes."""
+    longest = max((h[-1] for h in hours if len(h)), default=0.0)
+    bin_minutes = max(1, int(np.ceil(longest * 60.0 / max_points)))
+    n_buckets = int(longest * 60.0 // bin_minutes) + 1
+    aligned = np.full((len(hours), n_buckets), np.nan)
+    for row, (h, v) in enumerate(zip(hours, values)):
+        for b in range(n_buckets):
+            in_bucket = [val for t, val in zip(h, v) if int(t * 60.0 // bin_minutes) == b]
+            if in_bucket:
+                aligned[row, b] = np.mean(in_bucket)
+    return np.arange(n_buckets) * bin_minutes / 60.0, aligned, bin_minutes
+
+
+def test_align_to_grid_matches_loop():
+    rng = np.random.default_rng(3)
+    hours = [np.sort(rng.uniform(0, 30, 400)), np.sort(rng.uniform(0, 12, 90)), np.array([])]
+    hours[0][0] = hours[1][0] = 0.0
+    values = [rng.normal(80, 10, len(h)) for h in hours]
+    grid, aligned, bin_minutes = align_to_grid(hours, values, 120)
+    ref_grid, ref_aligned, ref_minutes = align_loop(hours, values, 120)
+    assert bin_minutes == ref_minutes == 15
+    np.testing.assert_allclose(grid, ref_grid)
+    np.testing.assert_allclose(aligned, ref_aligned)
+    assert np.isnan(aligned[2]).all()
@@ -0,0 +1,66 @@
+"""Batch graph export: figures, subjects without data, and resuming."""
+
+import json
+import os
+
+import pytest
+
+from apps.bpm.export import PROGRESS_FILE, export_graphs, graph_path
+from conftest import chartevents_frame
+
+METHODS = ['none', 'cubic_spline']
+HR_ITEMIDS = [220045]
+
+
+@pytest.fixture
+def source(make_table):
+    df = chartevents_frame(subjects=[1, 2, 3, 4])
+    # Subject 4 has no heart rate readings
+    make_table(df[(df['subject_id'] != 4) | (df['itemid'] != 220045)])
+
+
+@pytest.fixture
+def out(tmp_path):
+    return tmp_path / 'export'
+
+
+def export(output_dir, **options):
+    # Subject 99 isn't in the table at all
+    return export_graphs([1, 2, 3, 4, 99], METHODS, output_dir=str(output_dir), itemids=HR_ITEMIDS, workers=1, **options)
+
+
+def test_export_writes_every_figure(source, out):
+    assert export(out) == {'written': 6, 'skipped': 0, 'failed': 0, 'no_data': 2}
+    for subject_id in (1, 2, 3):
+        for method in METHODS:
+            with open(graph_path(str(out), subject_id, method, 'png'), 'rb') as f:
+                assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+    assert sorted(os.listdir(out)) == sorted(
+        [f'{m}_{s}.png' for s in (1, 2, 3) for m in METHODS] + [PROGRESS_FILE]
+    )
+    with open(out / PROGRESS_FILE) as f:
+        assert json.load(f) == {'no_data': [4, 99]}
+
+
+def test_rerun_only_renders_missing_figures(source, out):
+    export(out)
+    os.remove(graph_path(str(out), 2, 'cubic_spline', 'png'))
+    unchanged = os.stat(graph_path(str(out), 1, 'none', 'png')).st_mtime_ns
+    assert export(out) == {'written': 1, 'skipped': 5, 'failed': 0, 'no_data': 2}
+    assert os.path.exists(graph_path(str(out), 2, 'cubic_spline', 'png'))
+    assert os.stat(graph_path(str(out), 1, 'none', 'png')).st_mtime_ns == unchanged
+    assert export(out) == {'written': 0, 'skipped': 6, 'failed': 0, 'no_data': 2}
+
+
+def test_svg_and_bins(source, out):
+    result = export(out, fmt='svg', bin_size=30, bin_unit='minutes')
+    assert result['written'] == 6
+    with open(graph_path(str(out), 3, 'cubic_spline', 'svg')) as f:
+        assert '<svg' in f.read()
+
+
+def test_rejects_unknown_format_and_method(out):
+    with pytest.raises(ValueError):
+        export_graphs([1], METHODS, output_dir=str(out), fmt='gif')
+    with pytest.raises(ValueError):
+        export_graphs([1], ['quadratic'], output_dir=str(out))
@@ -0,0 +1,96 @@
+"""Building, resuming and serving the precomputed heart rate store."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from apps.bpm import feature_store
+from apps.bpm.feature_store import HeartRateStore, build_feature_store
+from apps.bpm.pipeline import load_series
+from conftest import chartevents_frame
+
+SUBJECTS = list(range(1, 9))
+HR_ITEMIDS = [220045]
+
+
+@pytest.fixture
+def source(make_table, monkeypatch):
+    monkeypatch.setattr(feature_store, 'SHARD_COUNT', 4)
+    df = chartevents_frame(subjects=SUBJECTS)
+    # Subject 8 has no heart rate readings
+    df = df[(df['subject_id'] != 8) | (df['itemid'] != 220045)]
+    make_table(df)
+    return df
+
+
+def shard_files(store_dir):
+    shard_dir = os.path.join(store_dir, '_shards')
+    return {name: os.stat(os.path.join(shard_dir, name)).st_mtime_ns
+            for name in os.listdir(shard_dir) if name.startswith('shard-')}
+
+
+def interrupted(*args):
+    """Stands in for the merge, as if the build was stopped once every shard was done."""
+    raise KeyboardInterrupt
+
+
+def test_store_matches_pipeline(source, tmp_path):
+    store_dir = build_feature_store(str(tmp_path / 'store'), HR_ITEMIDS, workers=1)
+    store = HeartRateStore.open(store_dir, HR_ITEMIDS)
+    assert sorted(store.subjects.index) == SUBJECTS[:-1]
+    assert store.get(8) is None
+    for subject_id in SUBJECTS[:-1]:
+        stored, decoded = store.get(subject_id), load_series(subject_id, HR_ITEMIDS)
+        for name in feature_store.ARRAYS:
+            np.testing.assert_array_equal(getattr(stored, name), getattr(decoded, name))
+            assert getattr(stored, name).dtype == getattr(decoded, name).dtype
+        assert stored.stats() == pytest.approx(decoded.stats())
+
+
+def test_open_checks_selection_and_format(source, tmp_path):
+    store_dir = build_feature_store(str(tmp_path / 'store'), HR_ITEMIDS, workers=1)
+    assert HeartRateStore.open(store_dir, [220277]) is None
+    manifest_path = os.path.join(store_dir, 'manifest.json')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest['format']
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    assert HeartRateStore.open(store_dir, HR_ITEMIDS) is None
+
+
+def test_interrupted_build_resumes(source, tmp_path, monkeypatch):
+    store_dir = str(tmp_path / 'store')
+    merge = feature_store._merge_shards
+    monkeypatch.setattr(feature_store, '_merge_shards', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        build_feature_store(store_dir, HR_ITEMIDS, workers=1)
+    before = shard_files(store_dir)
+    # A shard whose CSV is missing was cut off before it finished
+    os.remove(os.path.join(store_dir, '_shards', 'shard-00001.csv'))
+
+    with pytest.raises(KeyboardInterrupt):
+        build_feature_store(store_dir, HR_ITEMIDS, workers=1)
+    after = shard_files(store_dir)
+    assert {name for name in before if after[name] != before[name]} == {'shard-00001.csv', 'shard-00001.npz'}
+
+    monkeypatch.setattr(feature_store, '_merge_shards', merge)
+    build_feature_store(store_dir, HR_ITEMIDS, workers=1)
+    assert not os.path.exists(os.path.join(store_dir, '_shards'))
+    assert len(HeartRateStore.open(store_dir, HR_ITEMIDS).subjects) == len(SUBJECTS) - 1
+
+
+def test_changed_plan_rebuilds_every_shard(source, tmp_path, monkeypatch):
+    store_dir = str(tmp_path / 'store')
+    monkeypatch.setattr(feature_store, '_merge_shards', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        build_feature_store(store_dir, HR_ITEMIDS, workers=1)
+    before = shard_files(store_dir)
+    with pytest.raises(KeyboardInterrupt):
+        build_feature_store(store_dir, [220277], workers=1)
+    after = shard_files(store_dir)
+    assert all(after[name] != before[name] for name in before)
+    with open(os.path.join(store_dir, '_shards', 'plan.json')) as f:
+        assert json.load(f)['selection'] == {'itemids': [220277]}
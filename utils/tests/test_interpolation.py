@@ -0,0 +1,103 @@
+"""BPM binning against the original loops, and memoized interpolation outputs."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.bpm.cache import LRUCache
+from apps.bpm.interpolation import (
+    InterpolationResult, apply_interpolation, bin_by_count, bin_by_time, bin_windows, cached_interpolation
+)
+
+
+def bin_by_count_loop(x, y, bin_size):
+    num_bins = int(np.ceil(len(x) / bin_size))
+    x_binned, y_binned = [], []
+    for i in range(num_bins):
+        start_idx = i * bin_size
+        end_idx = min((i + 1) * bin_size, len(x))
+        x_binned.append(np.mean(x[start_idx:end_idx]))
+        y_binned.append(np.mean(y[start_idx:end_idx]))
+    return np.array(x_binned), np.array(y_binned)
+
+
+def bin_windows_loop(x, y, centers, half_bin):
+    x_binned, y_binned = [], []
+    for idx in centers:
+        start_idx = max(0, idx - half_bin)
+        end_idx = min(len(x), idx + half_bin + 1)
+        x_binned.append(np.mean(x[start_idx:end_idx]))
+        y_binned.append(np.mean(y[start_idx:end_idx]))
+    return np.array(x_binned), np.array(y_binned)
+
+
+def bin_by_time_groupby(x, y, interval_seconds):
+    grouped = pd.DataFrame({'x': x, 'y': y}).groupby(np.floor_divide(x, interval_seconds)).mean()
+    return grouped['x'].to_numpy(), grouped['y'].to_numpy()
+
+
+def sample_series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.concatenate(([0.0], np.cumsum(rng.uniform(30, 900, n - 1))))
+    y = rng.normal(80, 8, n)
+    return x, y
+
+
+@pytest.mark.parametrize('bin_size', [1, 2, 7, 50, 499, 500, 800])
+def test_bin_by_count_matches_loop(bin_size):
+    x, y = sample_series()
+    for got, expected in zip(bin_by_count(x, y, bin_size), bin_by_count_loop(x, y, bin_size)):
+        np.testing.assert_allclose(got, expected)
+
+
+@pytest.mark.parametrize('half_bin', [0, 1, 5, 60])
+def test_bin_windows_matches_loop(half_bin):
+    x, y = sample_series()
+    centers = np.linspace(0, len(x) - 1, 20, dtype=int)
+    for got, expected in zip(bin_windows(x, y, centers, half_bin), bin_windows_loop(x, y, centers, half_bin)):
+        np.testing.assert_allclose(got, expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('minutes', [1, 15, 60, 24 * 60])
+def test_bin_by_time_matches_groupby(minutes):
+    x, y = sample_series()
+    for got, expected in zip(bin_by_time(x, y, minutes * 60.0), bin_by_time_groupby(x, y, minutes * 60.0)):
+        np.testing.assert_allclose(got, expected)
+
+
+def series_arrays(n=300):
+    x, y = sample_series(n)
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + (x * 1e9).astype('timedelta64[ns]')
+    return y, times
+
+
+@pytest.mark.parametrize('method', ['cubic_spline', 'cubic_hermite'])
+def test_outputs_are_arrays(method):
+    values, times = series_arrays()
+    y_new, t_new, y_binned, t_binned = apply_interpolation(values, times, method, bin_size=5)
+    assert y_new.dtype == np.float64 and y_binned.dtype == np.float64
+    assert t_new.dtype == t_binned.dtype == np.dtype('datetime64[s]')
+    assert len(y_new) == len(t_new) and len(y_binned) == len(t_binned) == 60
+
+
+@pytest.mark.parametrize('method', ['cubic_spline', 'cubic_hermite'])
+def test_memoized_outputs_match_fresh_ones(tmp_path, method):
+    values, times = series_arrays()
+    fresh = apply_interpolation(values, times, method, bin_size=5, grid_points=400)
+    cache = LRUCache(10**7, disk_dir=str(tmp_path), value_type=InterpolationResult)
+    miss = cached_interpolation(cache, values, times, method, bin_size=5, grid_points=400)
+    hit = cached_interpolation(cache, values, times, method, bin_size=5, grid_points=400)
+    cache.clear()
+    from_disk = cached_interpolation(cache, values, times, method, bin_size=5, grid_points=400)
+    for output in (miss, hit, from_disk):
+        for got, expected in zip(output, fresh):
+            np.testing.assert_array_equal(got, expected)
+            assert got.dtype == expected.dtype
+
+
+def test_zoomed_outputs_are_not_persisted(tmp_path):
+    values, times = series_arrays()
+    cache = LRUCache(10**7, disk_dir=str(tmp_path), value_type=InterpolationResult)
+    cached_interpolation(cache, values, times, 'cubic_spline', window=(3600.0, 7200.0))
+    assert len(cache) == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,80 @@
+"""Outlier masks of the BPM app, including series with missing readings."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.bpm.outliers import OUTLIER_METHODS, OutlierDetector, detect_outliers
+from apps.bpm.pipeline import clean_series
+
+
+def readings(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + np.arange(n) * np.timedelta64(2, 'm')
+    values = rng.normal(80, 5, n)
+    values[[40, 170]] = [220.0, 5.0]
+    return times, values
+
+
+def test_iqr_matches_pandas_quantiles():
+    times, values = readings()
+    q1, q3 = pd.Series(values).quantile([0.25, 0.75])
+    expected = (values < q1 - 1.5 * (q3 - q1)) | (values > q3 + 1.5 * (q3 - q1))
+    np.testing.assert_array_equal(detect_outliers(times, values).mask, expected)
+
+
+@pytest.mark.parametrize('method', OUTLIER_METHODS)
+def test_flags_spikes(method):
+    times, values = readings()
+    mask = detect_outliers(times, values, {'method': method}).mask
+    assert mask[40] and mask[170]
+
+
+@pytest.mark.parametrize('method', OUTLIER_METHODS)
+def test_missing_readings_dont_move_the_bounds(method):
+    times, values = readings()
+    with_nan = values.copy()
+    with_nan[[10, 11, 200]] = np.nan
+    with_nan[250] = np.inf
+    finite = np.isfinite(with_nan)
+
+    result = detect_outliers(times, with_nan, {'method': method})
+    assert np.isfinite(result.lower[-1]) and np.isfinite(result.upper[-1])
+    # Non-finite readings aren't flagged, the rest as if they had never been there
+    assert not result.mask[~finite].any()
+    reference = detect_outliers(times[finite], with_nan[finite], {'method': method})
+    if method == 'rolling_mad':
+        # Rolling windows are spans of time, so gaps only matter to windows that contain them
+        assert result.mask[finite][-50:].tolist() == reference.mask[-50:].tolist()
+    else:
+        np.testing.assert_array_equal(result.mask[finite], reference.mask)
+        np.testing.assert_allclose(result.lower[finite], reference.lower)
+
+
+@pytest.mark.parametrize('method', ['iqr', 'mad'])
+def test_all_missing_flags_nothing(method):
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + np.arange(10) * np.timedelta64(2, 'm')
+    result = detect_outliers(times, np.full(10, np.nan), {'method': method})
+    assert not result.mask.any()
+
+
+@pytest.mark.parametrize('method', OUTLIER_METHODS)
+def test_update_matches_fit(method):
+    times, values = readings()
+    values[[20, 210]] = np.nan
+    fitted = OutlierDetector(method=method).fit(times, values)
+    detector = OutlierDetector(method=method)
+    detector.fit(times[:150], values[:150])
+    updated = detector.update(times[150:], values[150:])
+    for got, expected in zip(updated, fitted):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_clean_series_drops_missing_readings():
+    times, values = readings()
+    values[[5, 6]] = np.nan
+    df = pd.DataFrame({'charttime': times, 'valuenum': values})
+    series = clean_series(1, df)
+    assert np.isfinite(series.values).all()
+    assert np.isfinite(series.outlier_values).all()
+    assert len(series.values) == len(values) - 2 - series.outlier_values.size
@@ -0,0 +1,96 @@
+"""Splitting one decoded chartevents range into every vital of the BPM app."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.bpm.cache import LRUCache
+from apps.bpm.pipeline import ProcessedSeries, SeriesNotFound, clean_series, load_series, process_vitals, split_vitals
+from utils.analysis.filtering import VITALS
+
+VITAL_ITEMIDS = {vital: spec['itemids'] for vital, spec in VITALS.items()}
+
+
+def mixed_rows(n=3000, seed=0):
+    """Rows of every vital, interleaved with itemids that belong to none of them."""
+    rng = np.random.default_rng(seed)
+    itemids = np.concatenate([ids for ids in VITAL_ITEMIDS.values()] + [[220046, 224642, 226512, 999999]])
+    # Respiratory rate and SpO2 itemids left out, so those vitals are missing
+    itemids = itemids[~np.isin(itemids, VITAL_ITEMIDS['respiratory_rate'] + VITAL_ITEMIDS['spo2'])]
+    times = pd.Timestamp('2180-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 10**6, n)), unit='s')
+    return pd.DataFrame({
+        'subject_id': 1,
+        'charttime': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'itemid': rng.choice(itemids, n),
+        'valuenum': rng.normal(80, 10, n).round(1),
+        'valueuom': 'bpm',
+    })
+
+
+def test_split_matches_isin():
+    df = mixed_rows()
+    parts = split_vitals(df, VITAL_ITEMIDS)
+    assert list(parts) == list(VITAL_ITEMIDS)
+    for vital, itemids in VITAL_ITEMIDS.items():
+        pd.testing.assert_frame_equal(parts[vital], df[df['itemid'].isin(itemids)])
+
+
+def test_split_vitals_of_several_itemids():
+    df = mixed_rows()
+    itemids = {'heart_rate': [220046, 220045], 'systolic': [220050, 220179], 'other': [999999]}
+    parts = split_vitals(df, itemids)
+    for vital, ids in itemids.items():
+        pd.testing.assert_frame_equal(parts[vital], df[df['itemid'].isin(ids)])
+
+
+def test_split_single_vital_and_empty_frame():
+    df = mixed_rows()
+    itemids = {'heart_rate': VITAL_ITEMIDS['heart_rate']}
+    pd.testing.assert_frame_equal(split_vitals(df, itemids)['heart_rate'], df[df['itemid'].isin(itemids['heart_rate'])])
+    assert split_vitals(df.iloc[0:0], VITAL_ITEMIDS)['spo2'].empty
+
+
+def test_process_vitals_matches_cleaning_each_vital():
+    df = mixed_rows()
+    results = process_vitals(1, df, VITAL_ITEMIDS)
+    for vital, itemids in VITAL_ITEMIDS.items():
+        rows = df[df['itemid'].isin(itemids)]
+        if rows.empty:
+            assert isinstance(results[vital], SeriesNotFound)
+            continue
+        expected = clean_series(1, rows)
+        for name in ('times', 'values', 'averaged', 'outlier_times', 'outlier_values'):
+            np.testing.assert_array_equal(getattr(results[vital], name), getattr(expected, name))
+
+
+def test_process_vitals_falls_back_to_bpm_unit():
+    df = mixed_rows()
+    results = process_vitals(1, df, {'heart_rate': [], 'spo2': VITAL_ITEMIDS['spo2']})
+    np.testing.assert_array_equal(results['heart_rate'].values, clean_series(1, df).values)
+    assert isinstance(results['spo2'], SeriesNotFound)
+
+
+class CountingFilter:
+    """Stands in for the chartevents File_Filter, counting subject reads."""
+
+    def __init__(self, df):
+        self.df = df
+        self.reads = 0
+
+    def search_subject(self, subject_id):
+        self.reads += 1
+        return self.df
+
+
+def test_one_read_serves_every_vital():
+    ff = CountingFilter(mixed_rows())
+    cache = LRUCache(10**8)
+    series = {
+        vital: load_series(1, cache=cache, vital=vital, vital_itemids=VITAL_ITEMIDS, file_filter=ff)
+        for vital in ('heart_rate', 'temperature', 'nbp_systolic')
+    }
+    assert ff.reads == 1
+    assert all(isinstance(s, ProcessedSeries) for s in series.values())
+    with pytest.raises(SeriesNotFound):
+        load_series(1, cache=cache, vital='spo2', vital_itemids=VITAL_ITEMIDS, file_filter=ff)
+    assert ff.reads == 1
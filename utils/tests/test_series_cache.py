@@ -0,0 +1,95 @@
+"""The BPM app's LRU caches: eviction, disk persistence and versioned cache directories."""
+
+import os
+
+import numpy as np
+from flask import Flask
+
+from apps.bpm import init_series_cache
+from apps.bpm.cache import LRUCache
+from apps.bpm.pipeline import ProcessedSeries
+
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def series(subject_id, n=10):
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + np.arange(n) * np.timedelta64(5, 'm')
+    return ProcessedSeries(
+        subject_id=subject_id, times=times, values=np.linspace(60, 90, n), averaged=np.arange(n) % 3 == 0,
+        outlier_times=times[:1], outlier_values=np.array([250.0])
+    )
+
+
+def assert_same_series(a, b):
+    assert a.subject_id == b.subject_id
+    for name in ('times', 'values', 'averaged', 'outlier_times', 'outlier_values'):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=30)
+    for key in 'abc':
+        cache.put(key, Sized(10))
+    cache.get('a')
+    cache.put('d', Sized(10))
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    assert cache.nbytes == 30
+
+
+def test_replacing_a_key_updates_size():
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', Sized(40))
+    cache.put('a', Sized(10))
+    assert len(cache) == 1
+    assert cache.nbytes == 10
+
+
+def test_keeps_newest_entry_over_budget():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', Sized(5))
+    cache.put('b', Sized(50))
+    assert 'a' not in cache and 'b' in cache
+
+
+def test_disk_persistence(tmp_path):
+    cache = LRUCache(max_bytes=10**6, disk_dir=str(tmp_path), value_type=ProcessedSeries)
+    cache.put(('series', 1), series(1))
+    cache.put(('series', 2), series(2), persist=False)
+
+    restarted = LRUCache(max_bytes=10**6, disk_dir=str(tmp_path), value_type=ProcessedSeries)
+    assert_same_series(restarted.get(('series', 1)), series(1))
+    assert ('series', 1) in restarted
+    assert restarted.get(('series', 2)) is None
+    assert not any(name.endswith('.tmp.npz') for name in os.listdir(tmp_path))
+
+
+def test_evicted_entries_reload_from_disk(tmp_path):
+    nbytes = series(1).nbytes
+    cache = LRUCache(max_bytes=nbytes, disk_dir=str(tmp_path), value_type=ProcessedSeries)
+    cache.put(1, series(1))
+    cache.put(2, series(2))
+    assert 1 not in cache
+    assert_same_series(cache.get(1), series(1))
+
+
+def test_unreadable_file_is_a_miss(tmp_path):
+    cache = LRUCache(max_bytes=10**6, disk_dir=str(tmp_path), value_type=ProcessedSeries)
+    (tmp_path / '1.npz').write_bytes(b'truncated')
+    assert cache.get(1) is None
+
+
+def test_series_dir_is_versioned(tmp_path):
+    dirs = []
+    for version in ('v1', 'v2', 'v1'):
+        app = Flask(__name__)
+        app.config.update(SERIES_CACHE_DIR=str(tmp_path), SERIES_CACHE_MAX_BYTES=10**6,
+                          INTERP_CACHE_MAX_BYTES=10**6, TABLE_CACHE_MAX_BYTES=10**6, DATA_VERSION=version)
+        init_series_cache(app)
+        dirs.append(app.config['SERIES_CACHE'].disk_dir)
+    assert dirs[0] != dirs[1]
+    assert dirs[0] == dirs[2]
+    assert all(os.path.dirname(d) == str(tmp_path) for d in dirs)
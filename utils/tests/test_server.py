@@ -0,0 +1,91 @@
+"""Prefork serving: loading the app in the master and per-process gzip handles."""
+
+import os
+import pickle
+import types
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+pytest.importorskip('gunicorn')
+
+from apps.server import PreforkServer
+from conftest import chartevents_frame
+from utils.analysis.filters import file_filter
+from utils.analysis.filters.file_filter import get_file_filter
+
+OPTIONS = {'bind': '127.0.0.1:0', 'workers': 2, 'threads': 2, 'worker_class': 'gthread', 'preload_app': True}
+
+
+@pytest.fixture
+def table(make_table):
+    return make_table(chartevents_frame(subjects=[1, 2, 3]))
+
+
+def in_child(work):
+    """Run `work` in a forked child process and return its (picklable) result."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            result = ('ok', work())
+        except BaseException as e:
+            result = ('error', repr(e))
+        with os.fdopen(write_fd, 'wb') as f:
+            pickle.dump(result, f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        status, result = pickle.load(f)
+    os.waitpid(pid, 0)
+    assert status == 'ok', result
+    return result
+
+
+def test_load_creates_the_app_once_in_the_master(table):
+    created = []
+
+    def create_app():
+        created.append(Flask(__name__))
+        return created[-1]
+
+    server = PreforkServer(create_app, OPTIONS, file_ids=('chartevents',))
+    assert server.cfg.preload_app and server.cfg.threads == 2
+    assert server.cfg.post_worker_init == server.post_worker_init
+    assert server.wsgi() is created[0]
+    assert server.wsgi() is created[0]
+    assert len(created) == 1
+    assert get_file_filter('chartevents') is table
+
+
+def test_worker_opens_its_own_handle(table):
+    # The master has read through a handle of its own before forking
+    expected = table.search_subject(2)
+    master_handle = table._idle_handles[0]
+    server = PreforkServer(lambda: Flask(__name__), OPTIONS, file_ids=('chartevents',))
+
+    def worker():
+        server.post_worker_init(types.SimpleNamespace(pid=os.getpid()))
+        ff = get_file_filter('chartevents')
+        opened = (ff._gzip_pid == os.getpid(), ff._open_handles, master_handle in ff._idle_handles)
+        return opened, ff.search_subject(2)
+
+    (own_pid, open_handles, inherited), df = in_child(worker)
+    assert own_pid and open_handles == 1 and not inherited
+    pd.testing.assert_frame_equal(df, expected)
+    # The master's handle is untouched by the worker
+    pd.testing.assert_frame_equal(table.search_subject(2), expected)
+    assert table._idle_handles == [master_handle]
+
+
+def test_reload_drops_lookup_tables_and_handles(table):
+    table.search_subject(1)
+    handle = table._idle_handles[0]
+    server = PreforkServer(lambda: Flask(__name__), OPTIONS)
+    server.wsgi()
+    server.reload()
+    assert file_filter._FILTER_CACHE == {}
+    assert handle.closed
+    assert server.callable is None
@@ -0,0 +1,60 @@
+"""Subject ID prefix search of the BPM app against string matching."""
+
+import numpy as np
+import pytest
+
+from apps.bpm.subject_index import SubjectIndex
+
+# IDs of one to eight digits, so prefixes match ranges of several lengths
+IDS = sorted(set(np.random.default_rng(0).integers(1, 10**8, 3000).tolist()) | {
+    1, 7, 10, 12, 99, 100, 123, 1000, 1234, 10000, 99999, 123456, 1000000, 10000032, 12345678, 99999999
+} - {11})
+HR_IDS = IDS[::3]
+
+
+def matches(ids, prefix):
+    return [i for i in ids if str(i).startswith(prefix)]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SubjectIndex(IDS[::-1], hr_subject_ids=HR_IDS)
+
+
+@pytest.mark.parametrize('prefix', ['1', '10', '12', '100', '1000', '123', '9', '99999', '10000032', '999999999', '5'])
+def test_search_matches_string_prefixes(index, prefix):
+    expected = sorted(matches(IDS, prefix))
+    ids, total = index.search(prefix, limit=10**6)
+    assert ids == expected
+    assert total == len(expected)
+
+
+@pytest.mark.parametrize('prefix', ['1', '12', '99'])
+def test_limit_keeps_the_smallest_ids(index, prefix):
+    expected = sorted(matches(IDS, prefix))
+    ids, total = index.search(prefix, limit=5)
+    assert ids == expected[:5]
+    assert total == len(expected)
+
+
+def test_hr_only(index):
+    ids, _ = index.search('1', limit=10**6, hr_only=True)
+    assert ids == sorted(matches(HR_IDS, '1'))
+    assert index.neighbors(HR_IDS[5], hr_only=True) == (HR_IDS[4], HR_IDS[6])
+
+
+@pytest.mark.parametrize('prefix', ['0', '012', 'abc', '1a'])
+def test_no_matches(index, prefix):
+    assert index.search(prefix) == ([], 0)
+
+
+def test_empty_prefix_lists_the_first_ids(index):
+    assert index.search('', limit=3) == (IDS[:3], len(IDS))
+
+
+def test_neighbors(index):
+    assert index.neighbors(IDS[10]) == (IDS[9], IDS[11])
+    assert index.neighbors(IDS[0]) == (None, IDS[1])
+    assert index.neighbors(IDS[-1]) == (IDS[-2], None)
+    # 11 isn't a subject
+    assert index.neighbors(11) == (10, 12)
@@ -0,0 +1,91 @@
+"""Paging, sorting and type filters of the BPM data table."""
+
+import math
+
+import numpy as np
+import pytest
+
+from apps.bpm.pipeline import ProcessedSeries
+from apps.bpm.table import ROW_TYPES, SORT_COLUMNS, SeriesTable
+
+
+def subject_series(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    times = np.datetime64('2180-01-01T00:00:00', 'ns') + np.cumsum(rng.integers(1, 10, n)) * np.timedelta64(1, 'm')
+    outliers = rng.choice(n, 6, replace=False)
+    return ProcessedSeries(
+        subject_id=1,
+        times=times,
+        # Rounded, so sorting by bpm has ties
+        values=rng.normal(80, 5, n).round(),
+        averaged=rng.random(n) < 0.2,
+        outlier_times=times[outliers] + np.timedelta64(30, 's'),
+        outlier_values=np.full(6, 180.0),
+    )
+
+
+@pytest.fixture
+def table():
+    return SeriesTable.build(subject_series(), 'cubic_spline', bin_size=10)
+
+
+def all_rows(table, **options):
+    """Every row, one page of 37 at a time by following next_cursor."""
+    rows, cursor = [], 0
+    while cursor is not None:
+        page, cursor, total = table.page(cursor=cursor, limit=37, **options)
+        rows.extend(page)
+    assert len(rows) == total
+    return rows
+
+
+def reference_order(table, sort, descending):
+    """Row positions sorted one at a time, ties in time order and bin-average gaps last."""
+    column = table.types if sort == 'type' else getattr(table, sort)
+
+    def key(i):
+        value = float(column[i])
+        if math.isnan(value):
+            return (1, 0.0)
+        return (0, -value if descending else value)
+
+    return sorted(range(len(table)), key=key)
+
+
+def test_rows_of_every_type(table):
+    assert set(table.types.tolist()) == set(range(len(ROW_TYPES)))
+    assert (np.diff(table.hours) >= 0).all()
+
+
+@pytest.mark.parametrize('sort', SORT_COLUMNS)
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_follow_the_sort(table, sort, descending):
+    rows = all_rows(table, sort=sort, descending=descending)
+    expected = reference_order(table, sort, descending)
+    assert [row['hours'] for row in rows] == table.hours[expected].tolist()
+    assert [row['bpm'] for row in rows] == table.bpm[expected].tolist()
+
+
+@pytest.mark.parametrize('types', [['outlier'], ['original', 'averaged'], ['bin_average', 'interpolated']])
+def test_type_filter(table, types):
+    rows = all_rows(table, sort='bpm', descending=True, types=types)
+    names = {table.type_names[ROW_TYPES.index(t)] for t in types}
+    codes = np.isin(table.types, [ROW_TYPES.index(t) for t in types])
+    assert {row['type'] for row in rows} == names
+    assert len(rows) == codes.sum()
+    assert [row['bpm'] for row in rows] == sorted(table.bpm[codes].tolist(), reverse=True)
+
+
+def test_cursor_pages(table):
+    first, cursor, total = table.page(limit=50)
+    second, _, _ = table.page(cursor=cursor, limit=50)
+    assert cursor == 50 and total == len(table)
+    assert first[-1]['hours'] <= second[0]['hours']
+    last, next_cursor, _ = table.page(cursor=total - 10, limit=50)
+    assert len(last) == 10 and next_cursor is None
+    assert table.page(cursor=total, limit=50) == ([], None, total)
+
+
+def test_bin_averages_only_on_bin_rows(table):
+    for row in all_rows(table):
+        assert (row['bin_avg'] is not None) == (row['type'] == 'Bin Average')
@@ -0,0 +1,95 @@
+"""Shared-memory transport of DataFrames between processes."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from conftest import chartevents_frame
+from utils.analysis.filters.subject_filter import Subject_Filter
+from utils.analysis.transport import discard, export_frame, import_frame
+
+
+def shm_blocks():
+    return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+def mixed_frame():
+    return pd.DataFrame({
+        'subject_id': np.arange(5, dtype=np.int64),
+        'valuenum': [1.5, np.nan, 3.0, 4.25, -1.0],
+        'value': ['a', None, 'c', 'd\ne', ''],
+        'charttime': ['2180-01-01 00:00:00'] * 5,
+    })
+
+
+@pytest.fixture
+def no_leaked_blocks():
+    before = shm_blocks()
+    yield
+    assert shm_blocks() - before == set()
+
+
+def test_round_trip(no_leaked_blocks):
+    df = mixed_frame()
+    handle = export_frame(df)
+    assert handle.rows == len(df)
+    pdt.assert_frame_equal(import_frame(handle), df)
+
+
+def test_round_trip_empty_frame(no_leaked_blocks):
+    df = mixed_frame().iloc[0:0]
+    got = import_frame(export_frame(df))
+    assert got.empty
+    assert list(got.columns) == list(df.columns)
+
+
+def test_round_trip_across_processes(no_leaked_blocks):
+    df = mixed_frame()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        handle = pool.submit(export_frame, df).result()
+    pdt.assert_frame_equal(import_frame(handle), df)
+
+
+def test_import_releases_block(no_leaked_blocks):
+    handle = export_frame(mixed_frame())
+    import_frame(handle)
+    with pytest.raises(FileNotFoundError):
+        import_frame(handle)
+
+
+def test_discard_releases_block(no_leaked_blocks):
+    handle = export_frame(mixed_frame())
+    discard(handle)
+    # Discarding twice (e.g. after a partial failure) is harmless
+    discard(handle)
+
+
+def test_cohort_data_through_workers(make_table, no_leaked_blocks):
+    df = chartevents_frame(subjects=[1, 2, 3, 4])
+    ff = make_table(df)
+    sf = Subject_Filter(workers=2)
+    sf.filters = {'chartevents': ff}
+    try:
+        result = sf.get_cohort_data([1, 3, 9], chunk_size=1)
+    finally:
+        sf.close()
+    assert {sid: len(tables['chartevents']) for sid, tables in result.items()} == {1: 50, 3: 50, 9: 0}
+
+
+def test_cohort_data_raises_on_worker_errors(make_table, no_leaked_blocks):
+    ff = make_table(chartevents_frame(subjects=[1, 2, 3, 4]))
+    sf = Subject_Filter(workers=2)
+    sf.filters = {'chartevents': ff}
+    if os.path.exists(ff.file_path + '.idx'):
+        os.remove(ff.file_path + '.idx')
+    with open(ff.file_path, 'wb') as f:
+        f.write(b'not gzip')
+    try:
+        with pytest.raises(RuntimeError):
+            sf.get_cohort_data([1, 2, 3, 4], chunk_size=1)
+    finally:
+        sf.close()
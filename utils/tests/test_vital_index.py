@@ -0,0 +1,74 @@
+"""Per-vital subject availability recorded while indexing chartevents."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+
+from apps.bpm import load_hr_subject_ids
+from conftest import chartevents_frame
+from utils.analysis.filtering import VITALS, vital_column
+
+SUBJECTS = list(range(1, 9))
+CHART_VITALS = [vital for vital, spec in VITALS.items() if spec['file_id'] == 'chartevents']
+
+
+def mixed_vitals(seed=0):
+    """Each subject gets the itemids of a random subset of vitals, plus ones of no vital."""
+    rng = np.random.default_rng(seed)
+    df = chartevents_frame(subjects=SUBJECTS, rows=20)
+    itemids = []
+    for subject_id in SUBJECTS:
+        chosen = [VITALS[v]['itemids'][0] for v in CHART_VITALS if rng.random() < 0.5] + [220046, 226512]
+        itemids.append(rng.choice(chosen, 20))
+    df['itemid'] = np.concatenate(itemids)
+    # Subject 8 has no vital readings at all
+    df.loc[df['subject_id'] == 8, 'itemid'] = 226512
+    return df
+
+
+def expected_flags(df):
+    return {
+        vital: sorted(df.loc[df['itemid'].isin(VITALS[vital]['itemids']), 'subject_id'].unique().tolist())
+        for vital in CHART_VITALS
+    }
+
+
+def test_byte_index_records_vitals(make_table):
+    df = mixed_vitals()
+    ff = make_table(df)
+    for vital, subjects in expected_flags(df).items():
+        assert sorted(ff.subjects_with(vital).tolist()) == subjects
+    assert ff.lookup_df[[vital_column(v) for v in CHART_VITALS]].loc[8].eq(0).all()
+
+
+def test_vital_index_for_an_older_lookup(make_table):
+    df = mixed_vitals(seed=1)
+    ff = make_table(df)
+    # A lookup table indexed before vital availability existed
+    lookup = pd.read_csv(ff.lookup_path)
+    lookup.drop(columns=[vital_column(v) for v in CHART_VITALS]).to_csv(ff.lookup_path, index=False)
+    ff._load_lookup_table()
+    assert ff.subjects_with('heart_rate') is None
+
+    ff.generate_vital_index('chartevents', file_path=ff.file_path, lookup_csv_path=ff.lookup_path)
+    for vital, subjects in expected_flags(df).items():
+        assert sorted(ff.subjects_with(vital).tolist()) == subjects
+    pd.testing.assert_frame_equal(pd.read_csv(ff.lookup_path)[lookup.columns], lookup)
+
+
+@pytest.mark.parametrize('selected, trusted', [
+    (VITALS['heart_rate']['itemids'], True),
+    (VITALS['heart_rate']['itemids'] + [220046], False),
+    ([], False),
+])
+def test_app_only_trusts_matching_availability(make_table, selected, trusted):
+    df = mixed_vitals()
+    ff = make_table(df)
+    app = Flask(__name__)
+    app.config.update(AVAILABILITY_VITAL='heart_rate', VITAL_ITEMIDS={'heart_rate': selected})
+    load_hr_subject_ids(app, pd.read_csv(ff.lookup_path))
+    if trusted:
+        assert app.config['HR_SUBJECT_IDS'] == expected_flags(df)['heart_rate']
+    else:
+        assert 'HR_SUBJECT_IDS' not in app.config